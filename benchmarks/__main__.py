@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+import tempfile
+from itertools import chain
+
+from typing import List
+
+from benchmarks.suite import run_reader_benchmarks, run_composition_benchmarks, read_baseline, write_baseline, \
+    find_regressions, format_bytes, BenchmarkResult
+
+
+def _parse_args(args: List[str]) -> argparse.Namespace:
+    """
+    Parses the given CLI arguments.
+    :param args: CLI arguments
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Benchmarks reading and composing settings (the part of a run before "
+                                                 "GitLab is accessed) with synthetic corpora")
+    parser.add_argument("--keys", nargs="+", type=int, default=[10, 1000, 100000],
+                        help="Numbers of keys in the settings files to read")
+    parser.add_argument("--projects", type=int, default=5000, help="Number of projects to compose the variables of")
+    parser.add_argument("--groups", type=int, default=200, help="Number of settings groups that projects share")
+    parser.add_argument("--groups-per-project", dest="groups_per_project", type=int, default=3,
+                        help="Number of settings groups that each project is set from")
+    parser.add_argument("--keys-per-group", dest="keys_per_group", type=int, default=50,
+                        help="Number of keys in each settings group")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of times to time each benchmark")
+    parser.add_argument("--baseline", type=str,
+                        help="Location of baseline results to compare with, saved on the same machine with "
+                             "--save-baseline (results are not compared if not given)")
+    parser.add_argument("--save-baseline", dest="save_baseline", action="store_true", default=False,
+                        help="Save the results as the baseline at the location given by --baseline, rather than "
+                             "comparing with it")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Fraction by which a result may be slower, or use more memory, than its baseline before "
+                             "it is a regression")
+    arguments = parser.parse_args(args)
+    if arguments.save_baseline and arguments.baseline is None:
+        parser.error("--save-baseline requires the location to save the baseline to (--baseline)")
+    return arguments
+
+
+def _print_result(result: BenchmarkResult):
+    print("%-40s %9d %11.4fs %14.0f/s %12s" % (result.name, result.items, result.seconds, result.throughput,
+                                               format_bytes(result.peak_memory)))
+    sys.stdout.flush()
+
+
+def main():
+    """
+    Main method.
+    """
+    arguments = _parse_args(sys.argv[1:])
+    print("%-40s %9s %12s %16s %12s" % ("benchmark", "items", "time", "throughput", "peak memory"))
+    results = []    # type: List[BenchmarkResult]
+    with tempfile.TemporaryDirectory() as directory:
+        for result in chain(
+                run_reader_benchmarks(directory, arguments.keys, arguments.repeat),
+                run_composition_benchmarks(directory, arguments.projects, arguments.groups,
+                                           arguments.groups_per_project, arguments.keys_per_group, arguments.repeat)):
+            _print_result(result)
+            results.append(result)
+
+    if arguments.baseline is None:
+        return
+    if arguments.save_baseline:
+        write_baseline(results, arguments.baseline)
+        print("Saved baseline to \"%s\"" % arguments.baseline)
+        return
+    if not os.path.exists(arguments.baseline):
+        print("No baseline at \"%s\" to compare with (save one with --save-baseline)" % arguments.baseline,
+              file=sys.stderr)
+        sys.exit(1)
+    regressions = find_regressions(results, read_baseline(arguments.baseline), arguments.tolerance)
+    if len(regressions) > 0:
+        print("Regressions (more than %d%% worse than the baseline):\n  %s"
+              % (arguments.tolerance * 100, "\n  ".join(regressions)), file=sys.stderr)
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
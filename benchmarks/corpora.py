@@ -0,0 +1,99 @@
+import json
+import os
+import random
+
+from typing import Dict, List
+
+JSON_FORMAT = "json"
+INI_FORMAT = "ini"
+SHELL_FORMAT = "shell"
+FORMATS = (JSON_FORMAT, INI_FORMAT, SHELL_FORMAT)
+
+_FILE_EXTENSIONS = {JSON_FORMAT: "json", INI_FORMAT: "ini", SHELL_FORMAT: "sh"}
+_SCOPED_EVERY = 10
+_SCOPE = "production"
+_GROUP_FORMAT = "group-%d"
+_PROJECT_FORMAT = "team-%d/project-%d"
+_PROJECTS_PER_TEAM = 100
+
+
+def generate_settings(keys: int, settings_format: str, seed: int=0) -> str:
+    """
+    Generates the contents of a synthetic settings file. Every tenth variable is also defined in a production scope.
+    :param keys: the number of keys to define
+    :param settings_format: the format of the file (one of `FORMATS`)
+    :param seed: seed of the random values, so the same contents are generated for the same seed
+    :return: the contents of the settings file
+    """
+    rng = random.Random(seed)
+    values = ["%016x" % rng.getrandbits(64) for _ in range(keys)]
+    scoped = range(0, keys, _SCOPED_EVERY)
+    if settings_format == JSON_FORMAT:
+        settings = {"KEY_%d" % i: value for i, value in enumerate(values)}
+        for i in scoped:
+            settings["KEY_%d" % i] = [{"value": values[i]}, {"value": values[i][::-1], "environment_scope": _SCOPE}]
+        return json.dumps(settings, indent=4)
+    if settings_format == INI_FORMAT:
+        lines = ["KEY_%d=%s" % (i, value) for i, value in enumerate(values)]
+        lines.append("[gitlab: scope:%s]" % _SCOPE)
+        lines.extend("KEY_%d=%s" % (i, values[i][::-1]) for i in scoped)
+        return "\n".join(lines) + "\n"
+    if settings_format == SHELL_FORMAT:
+        lines = ["#!/usr/bin/env bash"]
+        lines.extend("export KEY_%d=%s" % (i, value) for i, value in enumerate(values))
+        for i in scoped:
+            lines.append("# gitlab: scope:%s" % _SCOPE)
+            lines.append("export KEY_%d=%s" % (i, values[i][::-1]))
+        return "\n".join(lines) + "\n"
+    raise ValueError("Unknown settings format: \"%s\"" % settings_format)
+
+
+def write_settings(directory: str, name: str, keys: int, settings_format: str, seed: int=0) -> str:
+    """
+    Writes a synthetic settings file (see `generate_settings`) to the given directory.
+    :param directory: the directory to write to
+    :param name: the name of the file, without its extension
+    :param keys: the number of keys to define
+    :param settings_format: the format of the file
+    :param seed: seed of the random values
+    :return: the location of the written file
+    """
+    location = os.path.join(directory, "%s.%s" % (name, _FILE_EXTENSIONS[settings_format]))
+    with open(location, "w") as file:
+        file.write(generate_settings(keys, settings_format, seed))
+    return location
+
+
+def write_projects_corpus(directory: str, projects: int, groups: int, groups_per_project: int,
+                          keys_per_group: int, seed: int=0) -> str:
+    """
+    Writes a synthetic corpus of projects that share settings groups: a JSON settings file for each group and a projects
+    configuration that gives each project a random sequence of the groups (with some sequences shared by many
+    projects, as when projects in a team are set the same way).
+    :param directory: the directory to write to (the settings files are written to its "settings" subdirectory)
+    :param projects: the number of projects to configure
+    :param groups: the number of settings groups
+    :param groups_per_project: the number of settings groups that each project is set from
+    :param keys_per_group: the number of keys that each group defines
+    :param seed: seed of the random choices and values
+    :return: the location of the projects configuration
+    """
+    rng = random.Random(seed)
+    settings_directory = os.path.join(directory, "settings")
+    os.makedirs(settings_directory, exist_ok=True)
+    for group in range(groups):
+        write_settings(settings_directory, _GROUP_FORMAT % group, keys_per_group, JSON_FORMAT, seed + group)
+
+    team_groups = []    # type: List[List[str]]
+    configuration = {}  # type: Dict[str, List[str]]
+    for project in range(projects):
+        team = project // _PROJECTS_PER_TEAM
+        if team == len(team_groups):
+            team_groups.append([_GROUP_FORMAT % group for group in rng.sample(range(groups), groups_per_project - 1)])
+        configuration[_PROJECT_FORMAT % (team, project)] = \
+            team_groups[team] + [_GROUP_FORMAT % rng.randrange(groups)]
+
+    location = os.path.join(directory, "config.json")
+    with open(location, "w") as file:
+        json.dump(configuration, file, indent=4)
+    return location
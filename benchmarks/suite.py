@@ -0,0 +1,201 @@
+import json
+import os
+import time
+import tracemalloc
+
+from typing import Any, Callable, Dict, Iterator, List
+
+from benchmarks.corpora import FORMATS, write_settings, write_projects_corpus
+from gitlabbuildvariables.backends import InMemoryBackend
+from gitlabbuildvariables.reader import read_scoped_variables, _shell_to_ini, _read_ini_config
+from gitlabbuildvariables.update import FileBasedProjectVariablesUpdaterBuilder, read_projects_configuration
+
+Prepare = Callable[[], Callable[[], Any]]
+
+_MINIMUM_TOTAL_SECONDS = 0.5
+_MAXIMUM_RUNS = 1000
+
+
+class BenchmarkResult:
+    """
+    Result of running a benchmark.
+    """
+    def __init__(self, name: str, items: int, seconds: float, peak_memory: int):
+        """
+        Constructor.
+        :param name: the name of the benchmark
+        :param items: the number of items (e.g. keys or projects) that the benchmark processes
+        :param seconds: the fastest time taken to run the benchmark
+        :param peak_memory: the most memory (in bytes) allocated at once while running the benchmark
+        """
+        self.name = name
+        self.items = items
+        self.seconds = seconds
+        self.peak_memory = peak_memory
+
+    @property
+    def throughput(self) -> float:
+        """
+        Gets the number of items processed a second.
+        :return: the throughput
+        """
+        return self.items / self.seconds if self.seconds > 0 else float("inf")
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"name": self.name, "items": self.items, "seconds": self.seconds, "peak_memory": self.peak_memory}
+
+    @staticmethod
+    def from_json(json_result: Dict[str, Any]) -> "BenchmarkResult":
+        return BenchmarkResult(json_result["name"], json_result["items"], json_result["seconds"],
+                               json_result["peak_memory"])
+
+
+def measure(name: str, items: int, prepare: Prepare, repeat: int) -> BenchmarkResult:
+    """
+    Measures the time and memory taken to run a benchmark. The benchmark is prepared afresh for each run (so that
+    nothing is cached between runs) and the fastest run is taken. Quick benchmarks are run more times, so that their
+    fastest run is not just noise. Memory is measured in a separate run, as tracing allocations slows the run down.
+    :param name: the name of the benchmark
+    :param items: the number of items that the benchmark processes
+    :param prepare: preparer of the benchmark, which gives the function to measure
+    :param repeat: the minimum number of times to time the benchmark
+    :return: the result
+    """
+    seconds = float("inf")
+    runs = 0
+    total_seconds = 0.0
+    while runs < max(1, repeat) or (total_seconds < _MINIMUM_TOTAL_SECONDS and runs < _MAXIMUM_RUNS):
+        run = prepare()
+        started = time.perf_counter()
+        run()
+        run_seconds = time.perf_counter() - started
+        seconds = min(seconds, run_seconds)
+        total_seconds += run_seconds
+        runs += 1
+    run = prepare()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(name, items, seconds, peak_memory)
+
+
+def run_reader_benchmarks(directory: str, sizes: List[int], repeat: int) -> Iterator[BenchmarkResult]:
+    """
+    Benchmarks reading settings files of each format, and the conversions of shell and ini files, with synthetic
+    settings of the given sizes.
+    :param directory: directory in which to write the synthetic settings files
+    :param sizes: the numbers of keys in the settings files
+    :param repeat: the number of times to time each benchmark
+    :return: iterator of the results, given as each benchmark is run
+    """
+    for keys in sizes:
+        locations = {settings_format: write_settings(directory, "settings-%d" % keys, keys, settings_format)
+                     for settings_format in FORMATS}
+        for settings_format, location in locations.items():
+            yield measure("read_scoped_variables/%s/%d" % (settings_format, keys), keys,
+                          lambda: lambda: read_scoped_variables(location), repeat)
+        with open(locations["shell"], "r") as file:
+            shell_lines = file.read().splitlines()
+        yield measure("_shell_to_ini/%d" % keys, keys, lambda: lambda: _shell_to_ini(shell_lines), repeat)
+        with open(locations["ini"], "r") as file:
+            ini_contents = file.read()
+        yield measure("_read_ini_config/%d" % keys, keys, lambda: lambda: _read_ini_config(ini_contents, directory),
+                      repeat)
+
+
+def run_composition_benchmarks(directory: str, projects: int, groups: int, groups_per_project: int,
+                               keys_per_group: int, repeat: int) -> Iterator[BenchmarkResult]:
+    """
+    Benchmarks reading a configuration of many projects that share settings groups, checking the groups and composing
+    the variables of every project, with a synthetic corpus.
+    :param directory: directory in which to write the synthetic corpus
+    :param projects: the number of projects to configure
+    :param groups: the number of settings groups
+    :param groups_per_project: the number of settings groups that each project is set from
+    :param keys_per_group: the number of keys that each group defines
+    :param repeat: the number of times to time each benchmark
+    :return: iterator of the results, given as each benchmark is run
+    """
+    config_location = write_projects_corpus(directory, projects, groups, groups_per_project, keys_per_group)
+    setting_repositories = [os.path.join(directory, "settings")]
+    suffix = "%d/%d" % (projects, groups)
+
+    def new_builder() -> FileBasedProjectVariablesUpdaterBuilder:
+        return FileBasedProjectVariablesUpdaterBuilder(setting_repositories, ["json"], precheck_processes=1)
+
+    def prepare_precheck() -> Callable[[], Any]:
+        configuration = read_projects_configuration(config_location)
+        return lambda: new_builder().precheck(configuration.settings_groups())
+
+    def prepare_compose() -> Callable[[], Any]:
+        configuration = read_projects_configuration(config_location)
+        builder = new_builder()
+        backend = InMemoryBackend()
+        updaters = [builder.build(project, project_groups, None, backend=backend)
+                    for project, project_groups in configuration.items()]
+        return lambda: [updater._get_variables() for updater in updaters]
+
+    yield measure("read_projects_configuration/%d" % projects, projects,
+                  lambda: lambda: read_projects_configuration(config_location), repeat)
+    yield measure("precheck/%s" % suffix, groups, prepare_precheck, repeat)
+    yield measure("_get_variables/%s" % suffix, projects, prepare_compose, repeat)
+
+
+def read_baseline(location: str) -> Dict[str, BenchmarkResult]:
+    """
+    Reads saved benchmark results.
+    :param location: the location of the saved results
+    :return: the results, keyed by benchmark name
+    """
+    with open(location, "r") as file:
+        return {result.name: result for result in map(BenchmarkResult.from_json, json.load(file))}
+
+
+def write_baseline(results: List[BenchmarkResult], location: str):
+    """
+    Saves the given benchmark results, to compare later results with.
+    :param results: the results
+    :param location: the location to save the results to
+    """
+    with open(location, "w") as file:
+        json.dump([result.to_json() for result in results], file, indent=4)
+        file.write("\n")
+
+
+def find_regressions(results: List[BenchmarkResult], baseline: Dict[str, BenchmarkResult],
+                     tolerance: float) -> List[str]:
+    """
+    Finds the benchmarks that have become slower or use more memory than in the baseline, by more than the given
+    tolerance. Benchmarks that are not in the baseline are ignored.
+    :param results: the results of the benchmarks
+    :param baseline: the baseline results, keyed by benchmark name
+    :param tolerance: the fraction by which a result may exceed its baseline (e.g. 0.25 for 25%)
+    :return: descriptions of the regressions
+    """
+    regressions = []    # type: List[str]
+    for result in results:
+        if result.name not in baseline:
+            continue
+        expected = baseline[result.name]
+        if result.seconds > expected.seconds * (1 + tolerance):
+            regressions.append("%s: %.4fs (baseline %.4fs)" % (result.name, result.seconds, expected.seconds))
+        if result.peak_memory > expected.peak_memory * (1 + tolerance):
+            regressions.append("%s: peak memory %s (baseline %s)"
+                               % (result.name, format_bytes(result.peak_memory), format_bytes(expected.peak_memory)))
+    return regressions
+
+
+def format_bytes(size: float) -> str:
+    """
+    Formats the given number of bytes to be read by a person.
+    :param size: the number of bytes
+    :return: the formatted size (e.g. "1.5MiB")
+    """
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return "%.1f%s" % (size, unit)
+        size /= 1024
+    return "%.1fGiB" % size
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.suite import BenchmarkResult, find_regressions, read_baseline, write_baseline
+
+
+class TestFindRegressions(unittest.TestCase):
+    """
+    Tests for `find_regressions`.
+    """
+    def setUp(self):
+        self.baseline = {"a": BenchmarkResult("a", 10, 1.0, 1000), "b": BenchmarkResult("b", 10, 2.0, 1000)}
+
+    def test_no_regressions(self):
+        results = [BenchmarkResult("a", 10, 1.4, 1400), BenchmarkResult("b", 10, 1.0, 500)]
+        self.assertEqual([], find_regressions(results, self.baseline, 0.5))
+
+    def test_slower(self):
+        regressions = find_regressions([BenchmarkResult("a", 10, 1.6, 1000)], self.baseline, 0.5)
+        self.assertEqual(1, len(regressions))
+        self.assertTrue(regressions[0].startswith("a: 1.6000s"))
+
+    def test_more_memory(self):
+        regressions = find_regressions([BenchmarkResult("b", 10, 2.0, 1600)], self.baseline, 0.5)
+        self.assertEqual(1, len(regressions))
+        self.assertIn("peak memory", regressions[0])
+
+    def test_not_in_baseline(self):
+        self.assertEqual([], find_regressions([BenchmarkResult("c", 10, 100.0, 10 ** 9)], self.baseline, 0.5))
+
+
+class TestBaseline(unittest.TestCase):
+    """
+    Tests for `write_baseline` and `read_baseline`.
+    """
+    def test_write_and_read(self):
+        results = [BenchmarkResult("a", 10, 1.5, 1000)]
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, "baseline.json")
+            write_baseline(results, location)
+            baseline = read_baseline(location)
+        self.assertEqual({"a": results[0].to_json()}, {name: result.to_json() for name, result in baseline.items()})
+
+
+if __name__ == "__main__":
+    unittest.main()
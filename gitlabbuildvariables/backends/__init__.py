@@ -0,0 +1,53 @@
+from threading import Lock
+
+from typing import Dict, Tuple, Optional
+
+from gitlabbuildvariables.backends._backend import VariablesBackend
+from gitlabbuildvariables.backends._json_file import JsonFileBackend
+from gitlabbuildvariables.backends._memory import InMemoryBackend
+from gitlabbuildvariables.common import GitLabConfig
+
+GITLAB_BACKEND = "gitlab"
+REST_BACKEND = "rest"
+MEMORY_BACKEND = "memory"
+JSON_FILE_BACKEND_PREFIX = "json:"
+
+_backends = {}  # type: Dict[Tuple[str, Optional[str], Optional[str]], VariablesBackend]
+_backends_lock = Lock()
+
+
+def get_backend(specification: str, gitlab_config: GitLabConfig=None) -> VariablesBackend:
+    """
+    Gets the backend with the given specification, which is one of `GITLAB_BACKEND`, `REST_BACKEND` (GitLab, accessed
+    without the GitLab library), `MEMORY_BACKEND` or `JSON_FILE_BACKEND_PREFIX` followed by the location of a JSON file
+    (e.g. "json:variables.json"). The same backend is returned for the same specification (and GitLab configuration),
+    so that it is shared within a run.
+
+    The GitLab library (or `requests`) is only imported when a backend that uses it is required.
+    :param specification: the specification of the backend
+    :param gitlab_config: configuration to access GitLab (required for the GitLab backends)
+    :return: the backend
+    :raises ValueError: if the specification is not valid
+    """
+    if specification in (GITLAB_BACKEND, REST_BACKEND):
+        if gitlab_config is None:
+            raise ValueError("GitLab configuration required to use the \"%s\" backend" % specification)
+        key = (specification, gitlab_config.location, gitlab_config.token)
+    else:
+        key = (specification, None, None)
+    with _backends_lock:
+        if key not in _backends:
+            if specification == GITLAB_BACKEND:
+                from gitlabbuildvariables.backends._gitlab import GitLabBackend
+                backend = GitLabBackend(gitlab_config)
+            elif specification == REST_BACKEND:
+                from gitlabbuildvariables.backends._rest import RestBackend
+                backend = RestBackend(gitlab_config)
+            elif specification == MEMORY_BACKEND:
+                backend = InMemoryBackend()
+            elif specification.startswith(JSON_FILE_BACKEND_PREFIX):
+                backend = JsonFileBackend(specification[len(JSON_FILE_BACKEND_PREFIX):])
+            else:
+                raise ValueError("Unknown backend: \"%s\"" % specification)
+            _backends[key] = backend
+        return _backends[key]
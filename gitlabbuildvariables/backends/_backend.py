@@ -0,0 +1,178 @@
+from abc import ABCMeta, abstractmethod
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from threading import Lock
+
+from typing import Iterator, Mapping, Any, Dict, Callable, Iterable, TypeVar, Deque, Optional
+
+from gitlabbuildvariables.models import Variable, DEFAULT_ENVIRONMENT_SCOPE, ENV_VAR_VARIABLE_TYPE
+
+VARIABLE_KEY_PROPERTY = "key"
+ENVIRONMENT_SCOPE_FILTER_PARAMETER = "filter[environment_scope]"
+PAGE_SIZE = 100
+MIN_ACCESS_LEVEL_PARAMETER = "min_access_level"
+MAINTAINER_ACCESS_LEVEL = 40
+DEFAULT_PAGE_CONCURRENCY = 8
+
+_PAGE_FETCHING_THREADS = 32
+
+PageItem = TypeVar("PageItem")
+
+_page_executor = None   # type: Optional[Executor]
+_page_executor_lock = Lock()
+
+
+class VariablesBackend(metaclass=ABCMeta):
+    """
+    Store of the build variables of projects, which `ProjectVariablesManager` reads and changes. Implementations must
+    be safe to use from multiple threads.
+    """
+    @abstractmethod
+    def list_projects(self, maintained: bool=False) -> Iterator[str]:
+        """
+        Lists the namespaced names of all of the projects in the store.
+        :param maintained: whether to list only the projects that the store's user can manage the variables of (i.e.
+        those it has at least maintainer access to in GitLab), rather than all of those that it can see
+        :return: iterator of project names (e.g. "hgi/my-project")
+        """
+
+    @abstractmethod
+    def check_project(self, project: str):
+        """
+        Checks that the given project exists.
+        :param project: the project of interest
+        :raises ValueError: if the project does not exist
+        """
+
+    def get_project_path(self, project: str) -> str:
+        """
+        Gets the namespaced name of the given project, which may be identified otherwise (e.g. by its numeric ID in
+        GitLab). Stores that only identify projects by their namespaced names give the project as it is.
+        :param project: the project of interest
+        :return: the namespaced name of the project (e.g. "hgi/my-project")
+        :raises ValueError: if the project does not exist
+        """
+        return project
+
+    @abstractmethod
+    def list_variables(self, project: str) -> Iterator[Variable]:
+        """
+        Lists the variables of the given project.
+        :param project: the project of interest
+        :return: iterator of variable models
+        """
+
+    def get_variable(self, project: str, key: str) -> Optional[Variable]:
+        """
+        Gets the variable with the given key in the default environment scope of the given project. Stores that can
+        get a single variable without listing the others should do so.
+        :param project: the project of interest
+        :param key: the key of the variable
+        :return: the variable or `None` if the project does not have it
+        """
+        for variable in self.list_variables(project):
+            if variable.key == key and variable.environment_scope == DEFAULT_ENVIRONMENT_SCOPE:
+                return variable
+        return None
+
+    def list_group_variables(self, group: str) -> Iterator[Variable]:
+        """
+        Lists the variables of the given group, which are inherited by the projects (and subgroups) in it. Stores that
+        do not have groups have no group variables.
+        :param group: the full path of the group of interest (e.g. "hgi/subgroup")
+        :return: iterator of variable models (none if there is no such group, e.g. if it is a user's namespace)
+        """
+        return iter(())
+
+    @abstractmethod
+    def create_variable(self, project: str, variable: Variable):
+        """
+        Creates the given variable in the given project.
+        :param project: the project of interest
+        :param variable: the variable to create
+        """
+
+    @abstractmethod
+    def update_variable(self, project: str, variable: Variable):
+        """
+        Updates the variable with the same identifier as that given (i.e. the same key and environment scope) in the
+        given project to match it.
+        :param project: the project of interest
+        :param variable: the updated variable
+        """
+
+    @abstractmethod
+    def delete_variable(self, project: str, variable: Variable):
+        """
+        Deletes the variable with the same identifier as that given from the given project.
+        :param project: the project of interest
+        :param variable: the variable to delete
+        """
+
+    def flush(self):
+        """
+        Makes sure that all of the changes that have been made are persisted.
+        """
+
+
+def to_variable(attributes: Mapping[str, Any]) -> Variable:
+    """
+    Converts the given attributes of a variable, as represented by the GitLab API, into a variable model. Attributes
+    not supported by the version of GitLab in use are given their defaults.
+    :param attributes: the variable's attributes
+    :return: the variable model
+    """
+    return Variable(
+        key=attributes[VARIABLE_KEY_PROPERTY], value=attributes["value"],
+        environment_scope=attributes.get("environment_scope", DEFAULT_ENVIRONMENT_SCOPE),
+        protected=attributes.get("protected", False), masked=attributes.get("masked", False),
+        variable_type=attributes.get("variable_type", ENV_VAR_VARIABLE_TYPE))
+
+
+def scope_filter(variable: Variable) -> Dict[str, str]:
+    """
+    Gets the request parameters required to target the given variable's environment scope when a key is defined in
+    multiple scopes.
+    :param variable: the variable to target
+    :return: the request parameters
+    """
+    return {ENVIRONMENT_SCOPE_FILTER_PARAMETER: variable.environment_scope}
+
+
+def get_page_executor() -> Executor:
+    """
+    Gets the executor that pages of listings are fetched with, which is shared by all backends so that backends do not
+    each keep threads that are never stopped. Its threads are only started when they are needed, and are stopped when
+    the interpreter exits. At most 32 pages are fetched at once across all backends.
+    :return: the executor
+    """
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            _page_executor = ThreadPoolExecutor(max_workers=_PAGE_FETCHING_THREADS,
+                                                thread_name_prefix="page-fetcher")
+        return _page_executor
+
+
+def fetch_pages(fetch_page: Callable[[int], Iterable[PageItem]], pages: Iterable[int], executor: Executor,
+                window: int) -> Iterator[PageItem]:
+    """
+    Fetches the given pages of a listing concurrently, yielding their items in page order (so the order is the same as
+    if they were fetched one after another). Only a bounded number of pages are fetched ahead of those being consumed.
+    :param fetch_page: fetcher of the items on the page with the given number
+    :param pages: the numbers of the pages to fetch, in order
+    :param executor: executor to fetch the pages with (fetching must not require the same executor)
+    :param window: the maximum number of pages to fetch at once
+    :return: iterator of the items on the pages
+    """
+    pending = deque()   # type: Deque[Future]
+    try:
+        for page in pages:
+            pending.append(executor.submit(fetch_page, page))
+            if len(pending) >= max(1, window):
+                yield from pending.popleft().result()
+        while len(pending) > 0:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,168 @@
+from itertools import islice
+from threading import Lock
+
+from gitlab import Gitlab, GitlabGetError
+from typing import Dict, Iterator, Tuple, Optional
+
+from gitlabbuildvariables.backends._backend import VariablesBackend, VARIABLE_KEY_PROPERTY, to_variable, \
+    scope_filter, fetch_pages, get_page_executor, PAGE_SIZE, DEFAULT_PAGE_CONCURRENCY, \
+    ENVIRONMENT_SCOPE_FILTER_PARAMETER, MIN_ACCESS_LEVEL_PARAMETER, MAINTAINER_ACCESS_LEVEL
+from gitlabbuildvariables.common import GitLabConfig, SSL_VERIFY
+from gitlabbuildvariables.models import Variable, DEFAULT_ENVIRONMENT_SCOPE
+from gitlabbuildvariables.tracing import trace_http_response
+
+_NOT_FOUND_STATUS = 404
+
+
+if not SSL_VERIFY:
+    try:
+        import requests
+        from requests.packages.urllib3.exceptions import InsecureRequestWarning
+        # Silence insecure messages
+        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+    except ImportError:
+        pass
+
+_connectors = {}    # type: Dict[Tuple[str, str], Gitlab]
+_connectors_lock = Lock()
+
+
+def get_connector(gitlab_config: GitLabConfig) -> Gitlab:
+    """
+    Gets an authenticated connector to GitLab. Connectors are shared by everything in the process that uses the same
+    configuration, so authentication happens once and connections are pooled.
+    :param gitlab_config: configuration to access GitLab
+    :return: the connector
+    """
+    key = (gitlab_config.location, gitlab_config.token)
+    with _connectors_lock:
+        if key not in _connectors:
+            connector = Gitlab(gitlab_config.location, gitlab_config.token, ssl_verify=SSL_VERIFY)
+            connector.session.hooks["response"].append(trace_http_response)
+            connector.auth()
+            _connectors[key] = connector
+        return _connectors[key]
+
+
+class GitLabBackend(VariablesBackend):
+    """
+    Store of the build variables of projects in GitLab, accessed through the GitLab library. GitLab is connected to
+    when it is first used. The pages of listings after the first are fetched concurrently.
+    """
+    def __init__(self, gitlab_config: GitLabConfig, page_concurrency: int=DEFAULT_PAGE_CONCURRENCY):
+        """
+        Constructor.
+        :param gitlab_config: configuration to access GitLab
+        :param page_concurrency: maximum number of pages of a listing to fetch at once (pages are fetched one after
+        another if 1)
+        """
+        self.gitlab_config = gitlab_config
+        self._page_concurrency = max(1, page_concurrency)
+        self._projects = {}     # type: Dict[str, object]
+        self._project_locks = {}    # type: Dict[str, Lock]
+        self._lock = Lock()
+
+    def list_projects(self, maintained: bool=False) -> Iterator[str]:
+        parameters = {MIN_ACCESS_LEVEL_PARAMETER: MAINTAINER_ACCESS_LEVEL} if maintained else {}
+        for project in self._list(get_connector(self.gitlab_config).projects, simple=True, **parameters):
+            yield project.path_with_namespace
+
+    def check_project(self, project: str):
+        self._get_project(project)
+
+    def get_project_path(self, project: str) -> str:
+        return self._get_project(project).path_with_namespace
+
+    def list_variables(self, project: str) -> Iterator[Variable]:
+        for gitlab_variable in self._list(self._get_project(project).variables):
+            yield to_variable(gitlab_variable.attributes)
+
+    def get_variable(self, project: str, key: str) -> Optional[Variable]:
+        try:
+            gitlab_variable = self._get_project(project).variables.get(
+                key, **{ENVIRONMENT_SCOPE_FILTER_PARAMETER: DEFAULT_ENVIRONMENT_SCOPE})
+        except GitlabGetError as e:
+            if e.response_code == _NOT_FOUND_STATUS:
+                return None
+            raise
+        return to_variable(gitlab_variable.attributes)
+
+    def list_group_variables(self, group: str) -> Iterator[Variable]:
+        try:
+            gitlab_group = get_connector(self.gitlab_config).groups.get(group)
+        except GitlabGetError as e:
+            if e.response_code == _NOT_FOUND_STATUS:
+                return
+            raise
+        for gitlab_variable in self._list(gitlab_group.variables):
+            yield to_variable(gitlab_variable.attributes)
+
+    def create_variable(self, project: str, variable: Variable):
+        self._get_project(project).variables.create(variable.to_dict())
+
+    def update_variable(self, project: str, variable: Variable):
+        data = variable.to_dict()
+        del data[VARIABLE_KEY_PROPERTY]
+        self._get_project(project).variables.update(variable.key, data, **scope_filter(variable))
+
+    def delete_variable(self, project: str, variable: Variable):
+        self._get_project(project).variables.delete(variable.key, **scope_filter(variable))
+
+    def _list(self, manager, **parameters) -> Iterator:
+        """
+        Lists the GitLab library models of the given manager. The first page is fetched to find how many pages there
+        are, then the rest are fetched concurrently (or lazily, one after another, if GitLab does not give the number of
+        pages, as for very large collections). Models are given in the order of the pages.
+        :param manager: the GitLab library manager of the models (e.g. the variables of a project)
+        :param parameters: query parameters for the listing
+        :return: iterator of the models
+        """
+        first_page = manager.list(as_list=False, per_page=PAGE_SIZE, **parameters)
+        total_pages = _get_total_pages(first_page)
+        if total_pages is None or total_pages <= 1 or self._page_concurrency <= 1:
+            yield from first_page
+            return
+        # Taking no more than a page's worth stops the list from lazily fetching the next page itself
+        yield from islice(first_page, first_page.per_page)
+        yield from fetch_pages(lambda page: manager.list(page=page, per_page=PAGE_SIZE, **parameters),
+                               range(2, total_pages + 1), get_page_executor(), self._page_concurrency)
+
+    def _get_project(self, project: str):
+        """
+        Gets the GitLab library model of the given project, which is fetched from GitLab only once.
+        :param project: the project of interest
+        :return: the GitLab library model
+        :raises ValueError: if the project does not exist
+        """
+        with self._lock:
+            if project in self._projects:
+                return self._projects[project]
+            project_lock = self._project_locks.setdefault(project, Lock())
+        # Only the project is locked while it is fetched, so other projects can be fetched (and used) meanwhile
+        with project_lock:
+            with self._lock:
+                if project in self._projects:
+                    return self._projects[project]
+            try:
+                gitlab_project = get_connector(self.gitlab_config).projects.get(project)
+            except GitlabGetError as e:
+                if "Project Not Found" in e.error_message:
+                    raise ValueError("Project '%s' not found" % project)
+                raise
+            with self._lock:
+                self._projects[project] = gitlab_project
+                del self._project_locks[project]
+            return gitlab_project
+
+
+def _get_total_pages(gitlab_list) -> Optional[int]:
+    """
+    Gets the number of pages of the given listing, which GitLab leaves out for very large collections. Older versions
+    of the GitLab library fail to convert the missing number, rather than giving `None`.
+    :param gitlab_list: the GitLab library's lazy list of the first page of the listing
+    :return: the number of pages, or `None` if it is not known
+    """
+    try:
+        return gitlab_list.total_pages
+    except (TypeError, ValueError):
+        return None
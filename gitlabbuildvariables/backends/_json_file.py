@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+
+from typing import Dict, List
+
+from gitlabbuildvariables.backends._memory import InMemoryBackend
+from gitlabbuildvariables.models import Variable
+
+
+class JsonFileBackend(InMemoryBackend):
+    """
+    Store of the build variables of projects in a JSON file, where each project's name is mapped to a list of its
+    variables (e.g. `{"hgi/my-project": [{"key": "KEY", "value": "value", "environment_scope": "*"}]}`).
+
+    The file is read when the store is created and is rewritten (atomically) when the store is flushed, if the
+    variables have changed.
+    """
+    def __init__(self, location: str):
+        """
+        Constructor.
+        :param location: the location of the JSON file (which is created if it does not exist)
+        """
+        self.location = location
+        projects_variables = {}     # type: Dict[str, List[Variable]]
+        if os.path.exists(location):
+            with open(location, "r") as file:
+                projects_variables = {project: [Variable(**json_variable) for json_variable in json_variables]
+                                      for project, json_variables in json.load(file).items()}
+        super().__init__(projects_variables)
+        self._modified = False
+
+    def create_variable(self, project: str, variable: Variable):
+        super().create_variable(project, variable)
+        self._modified = True
+
+    def update_variable(self, project: str, variable: Variable):
+        super().update_variable(project, variable)
+        self._modified = True
+
+    def delete_variable(self, project: str, variable: Variable):
+        super().delete_variable(project, variable)
+        self._modified = True
+
+    def flush(self):
+        with self._lock:
+            if not self._modified:
+                return
+            json_projects_variables = {project: [variable.to_dict() for variable in variables.values()]
+                                       for project, variables in sorted(self._projects_variables.items())}
+            self._modified = False
+        directory = os.path.dirname(os.path.abspath(self.location))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as file:
+            json.dump(json_projects_variables, file, indent=4, sort_keys=True)
+        os.replace(file.name, self.location)
@@ -0,0 +1,74 @@
+from threading import Lock
+
+from typing import Dict, Iterable, Iterator, Union, Optional
+
+from gitlabbuildvariables.backends._backend import VariablesBackend
+from gitlabbuildvariables.models import Variable, VariableMap, to_variables, DEFAULT_ENVIRONMENT_SCOPE
+
+
+class InMemoryBackend(VariablesBackend):
+    """
+    Store of the build variables of projects in memory, for use in tests and to simulate changes. Projects are created
+    when variables are first created in them, so any project is taken to exist.
+    """
+    def __init__(self, projects_variables: Dict[str, Union[Dict[str, str], Iterable[Variable]]]=None,
+                 groups_variables: Dict[str, Union[Dict[str, str], Iterable[Variable]]]=None):
+        """
+        Constructor.
+        :param projects_variables: the initial variables of projects (as key-value pairs or variable models), keyed by
+        project name
+        :param groups_variables: the variables of groups (as key-value pairs or variable models), keyed by group path
+        """
+        self._projects_variables = {project: to_variables(variables) for project, variables
+                                    in (projects_variables or {}).items()}    # type: Dict[str, VariableMap]
+        self._groups_variables = {group: to_variables(variables) for group, variables
+                                  in (groups_variables or {}).items()}  # type: Dict[str, VariableMap]
+        self._lock = Lock()
+
+    def list_projects(self, maintained: bool=False) -> Iterator[str]:
+        with self._lock:
+            return iter(sorted(self._projects_variables.keys()))
+
+    def check_project(self, project: str):
+        pass
+
+    def list_variables(self, project: str) -> Iterator[Variable]:
+        with self._lock:
+            return iter(list(self._projects_variables.get(project, {}).values()))
+
+    def get_variable(self, project: str, key: str) -> Optional[Variable]:
+        with self._lock:
+            return self._projects_variables.get(project, {}).get((key, DEFAULT_ENVIRONMENT_SCOPE))
+
+    def list_group_variables(self, group: str) -> Iterator[Variable]:
+        with self._lock:
+            return iter(list(self._groups_variables.get(group, {}).values()))
+
+    def create_variable(self, project: str, variable: Variable):
+        with self._lock:
+            variables = self._projects_variables.setdefault(project, {})
+            if variable.identifier in variables:
+                raise ValueError("Variable %s already exists in project '%s'" % (variable.identifier, project))
+            variables[variable.identifier] = variable
+
+    def update_variable(self, project: str, variable: Variable):
+        with self._lock:
+            self._get_existing(project, variable)[variable.identifier] = variable
+
+    def delete_variable(self, project: str, variable: Variable):
+        with self._lock:
+            del self._get_existing(project, variable)[variable.identifier]
+
+    def _get_existing(self, project: str, variable: Variable) -> VariableMap:
+        """
+        Gets the variables of the given project, which must include one with the given variable's identifier. Must be
+        called with the lock held.
+        :param project: the project of interest
+        :param variable: the variable that must exist
+        :return: the project's variables
+        :raises ValueError: if the variable does not exist
+        """
+        variables = self._projects_variables.get(project, {})
+        if variable.identifier not in variables:
+            raise ValueError("Variable %s does not exist in project '%s'" % (variable.identifier, project))
+        return variables
@@ -0,0 +1,162 @@
+from threading import Lock
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Iterator, Dict, Any, Optional
+
+from gitlabbuildvariables.backends._backend import VariablesBackend, VARIABLE_KEY_PROPERTY, to_variable, \
+    scope_filter, fetch_pages, get_page_executor, PAGE_SIZE, DEFAULT_PAGE_CONCURRENCY, \
+    ENVIRONMENT_SCOPE_FILTER_PARAMETER, MIN_ACCESS_LEVEL_PARAMETER, MAINTAINER_ACCESS_LEVEL
+from gitlabbuildvariables.common import GitLabConfig, SSL_VERIFY
+from gitlabbuildvariables.models import Variable, DEFAULT_ENVIRONMENT_SCOPE
+from gitlabbuildvariables.tracing import trace_http_response
+
+DEFAULT_POOL_SIZE = 32
+
+_API_PATH = "/api/v4"
+_TOKEN_HEADER = "PRIVATE-TOKEN"
+_NEXT_PAGE_HEADER = "X-Next-Page"
+_TOTAL_PAGES_HEADER = "X-Total-Pages"
+_NOT_FOUND_STATUS = 404
+
+if not SSL_VERIFY:
+    from requests.packages.urllib3.exceptions import InsecureRequestWarning
+    # Silence insecure messages
+    requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+
+class RestBackend(VariablesBackend):
+    """
+    Store of the build variables of projects in GitLab, accessed directly through the few endpoints of the GitLab API
+    that are required. Responses are parsed straight into variable models (avoiding the overhead of the GitLab
+    library's models) and connections are pooled in a single session, which is safe to share between threads. The pages
+    of listings after the first are fetched concurrently.
+    """
+    def __init__(self, gitlab_config: GitLabConfig, pool_size: int=DEFAULT_POOL_SIZE,
+                 page_concurrency: int=DEFAULT_PAGE_CONCURRENCY):
+        """
+        Constructor.
+        :param gitlab_config: configuration to access GitLab
+        :param pool_size: maximum number of connections to GitLab to keep open (should be at least the number of
+        concurrent requests that are made)
+        :param page_concurrency: maximum number of pages of a listing to fetch at once (pages are fetched one after
+        another if 1)
+        """
+        self.gitlab_config = gitlab_config
+        self._api_location = gitlab_config.location.rstrip("/") + _API_PATH
+        self._session = requests.Session()
+        self._session.headers[_TOKEN_HEADER] = gitlab_config.token
+        self._session.verify = SSL_VERIFY
+        self._session.hooks["response"].append(trace_http_response)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._page_concurrency = max(1, min(page_concurrency, pool_size))
+        self._project_paths = {}    # type: Dict[str, str]
+        self._lock = Lock()
+
+    def list_projects(self, maintained: bool=False) -> Iterator[str]:
+        parameters = {MIN_ACCESS_LEVEL_PARAMETER: str(MAINTAINER_ACCESS_LEVEL)} if maintained else {}
+        for project in self._get_pages("/projects", simple="true", **parameters):
+            yield project["path_with_namespace"]
+
+    def check_project(self, project: str):
+        self.get_project_path(project)
+
+    def get_project_path(self, project: str) -> str:
+        with self._lock:
+            if project in self._project_paths:
+                return self._project_paths[project]
+        response = self._session.get(self._project_location(project))
+        if response.status_code == _NOT_FOUND_STATUS:
+            raise ValueError("Project '%s' not found" % project)
+        response.raise_for_status()
+        path = response.json()["path_with_namespace"]
+        with self._lock:
+            self._project_paths[project] = path
+        return path
+
+    def list_variables(self, project: str) -> Iterator[Variable]:
+        for attributes in self._get_pages(self._project_path(project) + "/variables"):
+            yield to_variable(attributes)
+
+    def get_variable(self, project: str, key: str) -> Optional[Variable]:
+        response = self._session.get(
+            "%s/variables/%s" % (self._project_location(project), quote(key, safe="")),
+            params={ENVIRONMENT_SCOPE_FILTER_PARAMETER: DEFAULT_ENVIRONMENT_SCOPE})
+        if response.status_code == _NOT_FOUND_STATUS:
+            return None
+        response.raise_for_status()
+        return to_variable(response.json())
+
+    def list_group_variables(self, group: str) -> Iterator[Variable]:
+        try:
+            for attributes in self._get_pages(self._group_path(group) + "/variables"):
+                yield to_variable(attributes)
+        except requests.HTTPError as e:
+            if e.response.status_code != _NOT_FOUND_STATUS:
+                raise
+
+    def create_variable(self, project: str, variable: Variable):
+        self._session.post(self._project_location(project) + "/variables",
+                           json=variable.to_dict()).raise_for_status()
+
+    def update_variable(self, project: str, variable: Variable):
+        data = variable.to_dict()
+        del data[VARIABLE_KEY_PROPERTY]
+        self._session.put(self._variable_location(project, variable), params=scope_filter(variable),
+                          json=data).raise_for_status()
+
+    def delete_variable(self, project: str, variable: Variable):
+        self._session.delete(self._variable_location(project, variable),
+                             params=scope_filter(variable)).raise_for_status()
+
+    def _get_pages(self, path: str, **parameters: str) -> Iterator[Dict[str, Any]]:
+        """
+        Gets the items at the given (paginated) API path. The first page is fetched to find how many pages there are,
+        then the rest are fetched concurrently (or one after another, following the next page header, if GitLab does
+        not give the number of pages, as for very large collections). Items are given in the order of the pages.
+        :param path: the path, relative to the API
+        :param parameters: query parameters for the request
+        :return: iterator of the items, as parsed from JSON
+        """
+        response = self._get_page(path, 1, parameters)
+        yield from response.json()
+        total_pages = response.headers.get(_TOTAL_PAGES_HEADER, "")
+        if total_pages and self._page_concurrency > 1:
+            yield from fetch_pages(lambda page: self._get_page(path, page, parameters).json(),
+                                   range(2, int(total_pages) + 1), get_page_executor(), self._page_concurrency)
+            return
+        page = response.headers.get(_NEXT_PAGE_HEADER, "")
+        while page:
+            response = self._get_page(path, page, parameters)
+            yield from response.json()
+            page = response.headers.get(_NEXT_PAGE_HEADER, "")
+
+    def _get_page(self, path: str, page: Any, parameters: Dict[str, str]) -> requests.Response:
+        """
+        Gets a page of the items at the given (paginated) API path.
+        :param path: the path, relative to the API
+        :param page: the number of the page
+        :param parameters: query parameters for the request
+        :return: the (successful) response
+        :raises requests.HTTPError: if the request failed
+        """
+        response = self._session.get(self._api_location + path, params=dict(parameters, page=page, per_page=PAGE_SIZE))
+        response.raise_for_status()
+        return response
+
+    def _project_location(self, project: str) -> str:
+        return self._api_location + self._project_path(project)
+
+    def _variable_location(self, project: str, variable: Variable) -> str:
+        return "%s/variables/%s" % (self._project_location(project), quote(variable.key, safe=""))
+
+    @staticmethod
+    def _project_path(project: str) -> str:
+        return "/projects/%s" % quote(project, safe="")
+
+    @staticmethod
+    def _group_path(group: str) -> str:
+        return "/groups/%s" % quote(group, safe="")
@@ -1,3 +1,7 @@
+SSL_VERIFY = False
+DEFAULT_MAX_CONCURRENCY = 8
+
+
 class GitLabConfig:
     """
     TODO
@@ -10,4 +14,27 @@ class GitLabConfig:
         :param token: GitLab access token
         """
         self.location = location
-        self.token = token
\ No newline at end of file
+        self.token = token
+
+
+class ApplyConfig:
+    """
+    Configuration of how changes to a project's build variables are applied.
+    """
+    def __init__(self, max_concurrency: int=DEFAULT_MAX_CONCURRENCY, journal_directory: str=None,
+                 rollback_on_failure: bool=True, resume: bool=False, fingerprint: bool=False):
+        """
+        Constructor.
+        :param max_concurrency: the maximum number of changes to a project's variables that are made concurrently
+        :param journal_directory: directory in which to keep journals of the changes being applied, so that failed
+        applies can be resumed (journals are not kept if `None`)
+        :param rollback_on_failure: whether to undo the changes that were made if applying changes fails
+        :param resume: whether to complete any unfinished applies recorded in the journal directory
+        :param fingerprint: whether to keep a fingerprint of the variables that are set in a reserved variable, so that
+        whether they are up to date can be checked without listing them
+        """
+        self.max_concurrency = max_concurrency
+        self.journal_directory = journal_directory
+        self.rollback_on_failure = rollback_on_failure
+        self.resume = resume
+        self.fingerprint = fingerprint
@@ -0,0 +1,77 @@
+from threading import Lock
+
+from typing import Dict, Iterable, List
+
+from gitlabbuildvariables.backends import VariablesBackend
+from gitlabbuildvariables.models import Variable, VariableMap, to_variables
+from gitlabbuildvariables.tracing import tracer, GROUP_CATEGORY
+
+_NAMESPACE_SEPARATOR = "/"
+
+
+def get_namespaces(project: str) -> List[str]:
+    """
+    Gets the chain of namespaces that the given project is in, from the outermost group inwards.
+    :param project: the namespaced name of the project (e.g. "hgi/subgroup/my-project")
+    :return: the full paths of the namespaces (e.g. `["hgi", "hgi/subgroup"]`)
+    """
+    parts = project.split(_NAMESPACE_SEPARATOR)[:-1]
+    return [_NAMESPACE_SEPARATOR.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+class EffectiveVariablesResolver:
+    """
+    Resolves the variables that a project's jobs effectively get, which are its own variables along with those that it
+    inherits from the groups that it is in. A project's variables take precedence over those of its groups, and those
+    of a subgroup take precedence over those of its parent group.
+
+    The variables of each group are fetched once and cached, so resolving the variables of many projects in the same
+    groups does not fetch the groups' variables again. Safe to use from multiple threads.
+    """
+    def __init__(self, backend: VariablesBackend):
+        """
+        Constructor.
+        :param backend: the store of the projects' and groups' variables
+        """
+        self.backend = backend
+        self._groups_variables = {}     # type: Dict[str, VariableMap]
+        self._group_locks = {}          # type: Dict[str, Lock]
+        self._lock = Lock()
+
+    def resolve(self, project: str, project_variables: Iterable[Variable]) -> VariableMap:
+        """
+        Resolves the effective variables of the given project.
+        :param project: the project, by its namespaced name or otherwise (e.g. by its numeric ID in GitLab, in which
+        case its namespaced name is got from the store)
+        :param project_variables: the project's own variables
+        :return: the effective variables, keyed by their identifiers
+        """
+        if _NAMESPACE_SEPARATOR not in project:
+            project = self.backend.get_project_path(project)
+        variables = {}  # type: VariableMap
+        for namespace in get_namespaces(project):
+            variables.update(self.get_group_variables(namespace))
+        variables.update(to_variables(project_variables))
+        return variables
+
+    def get_group_variables(self, group: str) -> VariableMap:
+        """
+        Gets the variables of the given group, which are only fetched if they are not cached.
+        :param group: the full path of the group
+        :return: the group's variables, keyed by their identifiers (empty if there is no such group)
+        """
+        with self._lock:
+            if group in self._groups_variables:
+                return self._groups_variables[group]
+            group_lock = self._group_locks.setdefault(group, Lock())
+        # Held while the variables are fetched so that concurrent resolutions wait for them rather than fetching them
+        with group_lock:
+            with self._lock:
+                if group in self._groups_variables:
+                    return self._groups_variables[group]
+            with tracer.span(group, GROUP_CATEGORY):
+                variables = to_variables(self.backend.list_group_variables(group))
+            with self._lock:
+                self._groups_variables[group] = variables
+                del self._group_locks[group]
+            return variables
@@ -1,14 +1,42 @@
-from argparse import ArgumentParser
+import cProfile
+import sys
+from argparse import ArgumentParser, Namespace
+
+from typing import Callable, Any
+
+from gitlabbuildvariables.backends import VariablesBackend, get_backend, GITLAB_BACKEND, REST_BACKEND, \
+    MEMORY_BACKEND, JSON_FILE_BACKEND_PREFIX
+from gitlabbuildvariables.common import ApplyConfig, DEFAULT_MAX_CONCURRENCY, GitLabConfig
+from gitlabbuildvariables.models import FINGERPRINT_KEY
+from gitlabbuildvariables.tracing import tracer
+
+_PROFILE_SUMMARY_LENGTH = 20
 
 
 class RunConfig:
     """
     Run configuration for use against GitLab.
     """
-    def __init__(self, url: str, token: str, debug: bool=False):
+    def __init__(self, url: str, token: str, debug: bool=False, apply_config: ApplyConfig=None,
+                 trace_location: str=None, profile: str=None, backend: str=GITLAB_BACKEND):
+        """
+        Constructor.
+        :param url: location of GitLab
+        :param token: GitLab access token
+        :param debug: whether debugging is turned on
+        :param apply_config: configuration of how changes are applied
+        :param trace_location: location to write a Chrome trace of the run to (not traced if `None`)
+        :param profile: location to write a cProfile dump of the run to, or an empty string to just summarise where
+        time was spent (not profiled if `None`)
+        :param backend: specification of the backend that stores variables (see `get_backend`)
+        """
         self.url = url
         self.token = token
         self.debug = debug
+        self.apply_config = apply_config if apply_config is not None else ApplyConfig()
+        self.trace_location = trace_location
+        self.profile = profile
+        self.backend = backend
 
 
 class ProjectRunConfig(RunConfig):
@@ -20,16 +48,89 @@ class ProjectRunConfig(RunConfig):
         self.project = project
 
 
-def add_common_arguments(parser: ArgumentParser, project: bool=False):
+def add_common_arguments(parser: ArgumentParser, project: bool=False, apply: bool=False):
     """
     Adds common arguments to the given argument parser.
     :param parser: argument parser
     :param url: whether the URL named argument should be added
     :param token: whether the access token named argument should be added
     :param project: whether the project positional argument should be added
+    :param apply: whether the named arguments that configure how changes are applied should be added
     """
     parser.add_argument("--url", type=str, help="Location of GitLab")
     parser.add_argument("--token", type=str, help="GitLab access token")
     parser.add_argument("--debug", action="store_true", default=False, help="Turns on debugging")
+    parser.add_argument("--trace", dest="trace_location", type=str,
+                        help="Location to write a trace of the time spent on each project, stage and HTTP call to (in "
+                             "the Chrome trace event format)")
+    parser.add_argument("--profile", nargs="?", const="", type=str, metavar="PROFILE_LOCATION",
+                        help="Summarise where time was spent, optionally writing a cProfile dump to the given location")
+    parser.add_argument("--backend", type=str, default=GITLAB_BACKEND,
+                        help="Where variables are stored: \"%s\" (default), \"%s\" (GitLab, through a lean API "
+                             "client), \"%s\" (to simulate changes) or \"%s<location>\" (a JSON file)"
+                             % (GITLAB_BACKEND, REST_BACKEND, MEMORY_BACKEND, JSON_FILE_BACKEND_PREFIX))
+    if apply:
+        parser.add_argument("--max-concurrency", dest="max_concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                            help="Maximum number of changes to a project's variables to make concurrently")
+        parser.add_argument("--journal-directory", dest="journal_directory", type=str,
+                            help="Directory in which to journal changes before they are applied, so that failed "
+                                 "applies can be resumed")
+        parser.add_argument("--no-rollback", dest="rollback", action="store_false", default=True,
+                            help="Do not undo the changes made to a project if applying them fails")
+        parser.add_argument("--resume", action="store_true", default=False,
+                            help="Complete unfinished applies recorded in the journal directory (and skip projects "
+                                 "that an interrupted run has already updated with the same settings); requires "
+                                 "--journal-directory")
+        parser.add_argument("--fingerprint", action="store_true", default=False,
+                            help="Keep a fingerprint of the variables that are set in the reserved %s variable, so "
+                                 "checking whether projects are up to date only fetches that variable"
+                                 % FINGERPRINT_KEY)
     if project:
         parser.add_argument("project", type=str, help="The GitLab project to set the build variables for")
+
+
+def get_apply_config(parser: ArgumentParser, arguments: Namespace) -> ApplyConfig:
+    """
+    Gets the configuration of how changes are applied from the given parsed arguments.
+    :param parser: the parser that parsed the arguments, which had the apply arguments added to it (used to report
+    arguments that cannot be used together)
+    :param arguments: the parsed arguments
+    :return: the apply configuration
+    """
+    if arguments.resume and arguments.journal_directory is None:
+        parser.error("--resume requires --journal-directory (where the applies to resume are recorded)")
+    return ApplyConfig(max_concurrency=arguments.max_concurrency, journal_directory=arguments.journal_directory,
+                       rollback_on_failure=arguments.rollback, resume=arguments.resume,
+                       fingerprint=arguments.fingerprint)
+
+
+def get_run_backend(run_config: RunConfig) -> VariablesBackend:
+    """
+    Gets the backend that stores variables, as set in the given run configuration.
+    :param run_config: the run configuration
+    :return: the backend
+    """
+    return get_backend(run_config.backend, GitLabConfig(run_config.url, run_config.token))
+
+
+def run_instrumented(run_config: RunConfig, function: Callable[[], Any]) -> Any:
+    """
+    Runs the given function, tracing and profiling it as set in the given run configuration.
+    :param run_config: the run configuration
+    :param function: the function to run
+    :return: the return value of the function
+    """
+    tracer.enabled = run_config.trace_location is not None or run_config.profile is not None
+    profiler = cProfile.Profile() if run_config.profile else None
+    try:
+        if profiler is not None:
+            return profiler.runcall(function)
+        return function()
+    finally:
+        if run_config.trace_location is not None:
+            tracer.write(run_config.trace_location)
+        if profiler is not None:
+            profiler.dump_stats(run_config.profile)
+        if run_config.profile is not None:
+            for category, name, count, duration in tracer.summarise()[:_PROFILE_SUMMARY_LENGTH]:
+                print("%10.3fs %6d  %s: %s" % (duration, count, category, name), file=sys.stderr)
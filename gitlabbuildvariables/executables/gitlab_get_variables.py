@@ -1,14 +1,30 @@
 import argparse
 import json
 import sys
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
 
-from gitlabbuildvariables.common import GitLabConfig
-from gitlabbuildvariables.executables._common import add_common_arguments, ProjectRunConfig
+from gitlabbuildvariables.backends import VariablesBackend
+from gitlabbuildvariables.common import GitLabConfig, DEFAULT_MAX_CONCURRENCY
+from gitlabbuildvariables.effective import EffectiveVariablesResolver
+from gitlabbuildvariables.executables._common import add_common_arguments, RunConfig, run_instrumented, \
+    get_run_backend
 from gitlabbuildvariables.manager import ProjectVariablesManager
+from gitlabbuildvariables.models import to_key_values
+from gitlabbuildvariables.tracing import tracer, PROJECT_CATEGORY
 
 
-def _parse_args(args: List[str]) -> ProjectRunConfig:
+class _GetArgumentsRunConfig(RunConfig):
+    """
+    Run configuration for getting variables.
+    """
+    def __init__(self, projects: List[str], *args, effective: bool=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.projects = projects
+        self.effective = effective
+
+
+def _parse_args(args: List[str]) -> _GetArgumentsRunConfig:
     """
     Parses the given CLI arguments to get a run configuration.
     :param args: CLI arguments
@@ -16,9 +32,50 @@ def _parse_args(args: List[str]) -> ProjectRunConfig:
     """
     parser = argparse.ArgumentParser(prog="gitlab-get-variables", description="Tool for getting a GitLab project's "
                                                                               "build variables")
-    add_common_arguments(parser, project=True)
+    add_common_arguments(parser)
+    parser.add_argument("projects", nargs="+", type=str, metavar="project",
+                        help="The GitLab project to get the build variables of (the variables of each project are "
+                             "given by name if multiple projects are given)")
+    parser.add_argument("--effective", action="store_true", default=False,
+                        help="Include the variables inherited from the project's groups (those of the project take "
+                             "precedence, followed by those of the innermost group)")
     arguments = parser.parse_args(args)
-    return ProjectRunConfig(project=arguments.project, url=arguments.url, token=arguments.token, debug=arguments.debug)
+    return _GetArgumentsRunConfig(arguments.projects, url=arguments.url, token=arguments.token, debug=arguments.debug,
+                                  trace_location=arguments.trace_location, profile=arguments.profile,
+                                  backend=arguments.backend, effective=arguments.effective)
+
+
+def _get_variables(project: str, gitlab_config: GitLabConfig, backend: VariablesBackend,
+                   resolver: EffectiveVariablesResolver=None) -> Dict[str, str]:
+    """
+    Gets the variables of the given project.
+    :param project: the project of interest
+    :param gitlab_config: the configuration required to access GitLab
+    :param backend: the store of the project's variables
+    :param resolver: resolver of the variables inherited from the project's groups (only the project's own variables
+    are got if `None`)
+    :return: the variables
+    """
+    with tracer.span(project, PROJECT_CATEGORY):
+        manager = ProjectVariablesManager(gitlab_config, project, backend=backend)
+        if resolver is None:
+            return manager.get()
+        return to_key_values(resolver.resolve(project, manager.get_variables().values()).values())
+
+
+def _run(run_config: _GetArgumentsRunConfig):
+    """
+    Gets and prints the variables of the projects in the given run configuration.
+    :param run_config: the run configuration
+    """
+    gitlab_config = GitLabConfig(run_config.url, run_config.token)
+    backend = get_run_backend(run_config)
+    resolver = EffectiveVariablesResolver(backend) if run_config.effective else None
+    with ThreadPoolExecutor(max_workers=DEFAULT_MAX_CONCURRENCY) as executor:
+        projects_variables = dict(zip(run_config.projects, executor.map(
+            lambda project: _get_variables(project, gitlab_config, backend, resolver), run_config.projects)))
+    output = projects_variables[run_config.projects[0]] if len(run_config.projects) == 1 else projects_variables
+    print(json.dumps(output, sort_keys=True, indent=4, separators=(",", ": ")))
 
 
 def main():
@@ -26,10 +83,7 @@ def main():
     Main method.
     """
     run_config = _parse_args(sys.argv[1:])
-    gitlab_config = GitLabConfig(run_config.url, run_config.token)
-    manager = ProjectVariablesManager(gitlab_config, run_config.project)
-    output = json.dumps(manager.get(), sort_keys=True, indent=4, separators=(",", ": "))
-    print(output)
+    run_instrumented(run_config, lambda: _run(run_config))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,43 @@
+import argparse
+import json
+import sys
+from typing import List
+
+from gitlabbuildvariables.update import UpdateResults, merge_results
+
+
+def _parse_args(args: List[str]) -> argparse.Namespace:
+    """
+    Parses the given CLI arguments.
+    :param args: CLI arguments
+    :return: the parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="gitlab-merge-update-results",
+        description="Tool for combining the results of updating shards of projects (written by gitlab-update-variables "
+                    "--result-file) into one report. Exits with a non-zero status if any project failed to update or "
+                    "any shard's results are missing")
+    parser.add_argument("result_locations", nargs="+", type=str, metavar="result_location",
+                        help="Location of the results of a shard")
+    parser.add_argument("--output", type=str, help="Location to write the report to (printed if not given)")
+    return parser.parse_args(args)
+
+
+def main():
+    """
+    Main method.
+    """
+    arguments = _parse_args(sys.argv[1:])
+    report = merge_results(UpdateResults.read(location) for location in arguments.result_locations)
+    output = json.dumps(report, sort_keys=True, indent=4, separators=(",", ": "))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+    if not report["succeeded"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import logging
+import sys
+from typing import List, Dict
+
+from gitlabbuildvariables.common import DEFAULT_MAX_CONCURRENCY
+from gitlabbuildvariables.executables._common import add_common_arguments, RunConfig, run_instrumented, \
+    get_run_backend
+from gitlabbuildvariables.index import VariablesIndex, get_default_index_location, DEFAULT_MAX_AGE
+from gitlabbuildvariables.models import VariableIdentifier
+from gitlabbuildvariables.update import logger
+
+_READ_STDIN = "-"
+
+
+class _SearchArgumentsRunConfig(RunConfig):
+    """
+    Run configuration for searching variables.
+    """
+    def __init__(self, index_location: str, *args, refresh: bool=False, full: bool=False,
+                 max_age: float=DEFAULT_MAX_AGE, max_concurrency: int=DEFAULT_MAX_CONCURRENCY, key: str=None,
+                 value: str=None, digest: str=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index_location = index_location
+        self.refresh = refresh
+        self.full = full
+        self.max_age = max_age
+        self.max_concurrency = max_concurrency
+        self.key = key
+        self.value = value
+        self.digest = digest
+
+
+def _parse_args(args: List[str]) -> _SearchArgumentsRunConfig:
+    """
+    Parses the given CLI arguments to get a run configuration.
+    :param args: CLI arguments
+    :return: run configuration derived from the given CLI arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="gitlab-search-variables",
+        description="Tool for finding the projects that have a build variable with a given key or value, using a local "
+                    "index of the variables of every project (GitLab is only accessed to refresh the index)")
+    add_common_arguments(parser)
+    parser.add_argument("--index", dest="index_location", type=str,
+                        help="Location of the index (default: within $XDG_CACHE_HOME, named after the URL of GitLab)")
+    parser.add_argument("--refresh", action="store_true", default=False,
+                        help="Refresh the index with the projects that the access token maintains before searching it, "
+                             "only listing the variables of projects whose fingerprints have changed since they were "
+                             "last indexed (or that do not have them, or were last indexed too long ago)")
+    parser.add_argument("--full", action="store_true", default=False,
+                        help="List the variables of every project when refreshing the index")
+    parser.add_argument("--max-age", dest="max_age", type=float, default=DEFAULT_MAX_AGE, metavar="SECONDS",
+                        help="Time after which the variables of a project are listed again when refreshing the index, "
+                             "even if its fingerprint has not changed (default: %(default)s)")
+    parser.add_argument("--max-concurrency", dest="max_concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="Maximum number of projects to list the variables of concurrently")
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument("--key", type=str, help="Find the projects that have a variable with the given key")
+    query.add_argument("--value", type=str,
+                       help="Find the projects that have a variable with the given value (read exactly as given on "
+                            "stdin if \"%s\", so that the value is not given on the command line)" % _READ_STDIN)
+    query.add_argument("--digest", type=str,
+                       help="Find the projects that have a variable whose value has the given SHA-256 hex digest")
+    arguments = parser.parse_args(args)
+    if not arguments.refresh and arguments.key is None and arguments.value is None and arguments.digest is None:
+        parser.error("either --refresh or a search (--key, --value or --digest) is required")
+    index_location = arguments.index_location or get_default_index_location(arguments.url)
+    return _SearchArgumentsRunConfig(
+        index_location, url=arguments.url, token=arguments.token, debug=arguments.debug,
+        trace_location=arguments.trace_location, profile=arguments.profile, backend=arguments.backend,
+        refresh=arguments.refresh, full=arguments.full, max_age=arguments.max_age,
+        max_concurrency=arguments.max_concurrency, key=arguments.key, value=arguments.value, digest=arguments.digest)
+
+
+def _to_json(matches: Dict[str, List[VariableIdentifier]]) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Converts the given matching variables to JSON.
+    :param matches: the identifiers of the matching variables of each project
+    :return: JSON representation of the matches
+    """
+    return {project: [{"key": key, "environment_scope": environment_scope} for key, environment_scope in identifiers]
+            for project, identifiers in matches.items()}
+
+
+def _run(run_config: _SearchArgumentsRunConfig) -> bool:
+    """
+    Refreshes and/or searches the variables index, as set in the given run configuration.
+    :param run_config: the run configuration
+    :return: whether the index could be fully refreshed (if refreshed)
+    """
+    logger.setLevel(logging.DEBUG if run_config.debug else logging.INFO)
+    index = VariablesIndex(run_config.index_location, run_config.url)
+    index.load()
+    succeeded = True
+    if run_config.refresh:
+        backend = get_run_backend(run_config)
+        refresh = index.refresh(backend, run_config.max_concurrency, full=run_config.full, max_age=run_config.max_age)
+        index.save()
+        succeeded = len(refresh.failed) == 0
+        if run_config.key is None and run_config.value is None and run_config.digest is None:
+            print(json.dumps(refresh.to_json(), sort_keys=True, indent=4, separators=(",", ": ")))
+            return succeeded
+    elif not index.exists():
+        logger.error("There is no index at \"%s\" (create it with --refresh)" % run_config.index_location)
+        return False
+
+    if run_config.key is not None:
+        matches = index.find_key(run_config.key)
+    elif run_config.digest is not None:
+        matches = index.find_digest(run_config.digest.lower())
+    else:
+        value = sys.stdin.read() if run_config.value == _READ_STDIN else run_config.value
+        matches = index.find_value(value)
+    print(json.dumps(_to_json(matches), sort_keys=True, indent=4, separators=(",", ": ")))
+    return succeeded
+
+
+def main():
+    """
+    Main method.
+    """
+    run_config = _parse_args(sys.argv[1:])
+    if not run_instrumented(run_config, lambda: _run(run_config)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,36 @@
 import argparse
+import json
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 
-from typing import List, Dict
+from typing import List, Iterable, Set, TextIO, Tuple
 
-from gitlabbuildvariables.common import GitLabConfig
-from gitlabbuildvariables.executables._common import add_common_arguments, ProjectRunConfig
+from gitlabbuildvariables.backends import VariablesBackend
+from gitlabbuildvariables.common import GitLabConfig, ApplyConfig, DEFAULT_MAX_CONCURRENCY
+from gitlabbuildvariables.executables._common import add_common_arguments, ProjectRunConfig, get_apply_config, \
+    run_instrumented, get_run_backend
+from gitlabbuildvariables.interpolation import interpolate
 from gitlabbuildvariables.manager import ProjectVariablesManager
-from gitlabbuildvariables.reader import read_variables
+from gitlabbuildvariables.models import VariableMap, to_key_values
+from gitlabbuildvariables.reader import read_scoped_variables, json_to_variables
+from gitlabbuildvariables.tracing import tracer, PROJECT_CATEGORY
+from gitlabbuildvariables.update import ProjectUpdateResult, FAILED_STATUS
+
+_PROJECT_PROPERTY = "project"
+_VARIABLES_PROPERTY = "variables"
 
 
 class _SetArgumentsRunConfig(ProjectRunConfig):
     """
     Run configuration for setting arguments.
     """
-    def __init__(self, source: List[str], *args, **kwargs):
+    def __init__(self, source: List[str], *args, batch: bool=False, batch_concurrency: int=DEFAULT_MAX_CONCURRENCY,
+                 **kwargs):
         super().__init__(*args, **kwargs)
         self.source = source
+        self.batch = batch
+        self.batch_concurrency = batch_concurrency
 
 
 def _parse_args(args: List[str]) -> _SetArgumentsRunConfig:
@@ -26,13 +41,134 @@ def _parse_args(args: List[str]) -> _SetArgumentsRunConfig:
     """
     parser = argparse.ArgumentParser(
         prog="gitlab-set-variables", description="Tool for setting a GitLab project's build variables")
-    add_common_arguments(parser, project=True)
-    parser.add_argument("source", nargs="+", type=str,
+    add_common_arguments(parser, apply=True)
+    parser.add_argument("project", nargs="?", type=str,
+                        help="The GitLab project to set the build variables for (not given in batch mode)")
+    parser.add_argument("source", nargs="*", type=str,
                         help="File to source build variables from. Can be a ini file, JSON file or a shell script "
                              "containing 'export' statements")
+    parser.add_argument("--batch", action="store_true", default=False,
+                        help="Read the projects to set and their variables from stdin, as lines of JSON (e.g. "
+                             "{\"project\": \"group/project\", \"variables\": {\"KEY\": \"value\"}}), where variables "
+                             "are given as in a JSON source file. A line of JSON giving the result is written for each "
+                             "project as it is set")
+    parser.add_argument("--batch-concurrency", dest="batch_concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="Maximum number of projects to set concurrently in batch mode")
 
     arguments = parser.parse_args(args)
-    return _SetArgumentsRunConfig(arguments.source, arguments.project, arguments.url, arguments.token, arguments.debug)
+    if arguments.batch and arguments.project is not None:
+        parser.error("a project cannot be given in batch mode")
+    if not arguments.batch and (arguments.project is None or len(arguments.source) == 0):
+        parser.error("the project and at least one source are required (unless in batch mode)")
+    return _SetArgumentsRunConfig(arguments.source, arguments.project, arguments.url, arguments.token, arguments.debug,
+                                  get_apply_config(parser, arguments), trace_location=arguments.trace_location,
+                                  profile=arguments.profile, backend=arguments.backend, batch=arguments.batch,
+                                  batch_concurrency=arguments.batch_concurrency)
+
+
+def _run(run_config: _SetArgumentsRunConfig) -> bool:
+    """
+    Sets the variables of the project in the given run configuration, or those of the projects read from stdin in batch
+    mode.
+    :param run_config: the run configuration
+    :return: whether the variables of all of the projects were set
+    """
+    gitlab_config = GitLabConfig(run_config.url, run_config.token)
+    backend = get_run_backend(run_config)
+    try:
+        if run_config.batch:
+            return _run_batch(sys.stdin, sys.stdout, gitlab_config, backend, run_config.apply_config,
+                              run_config.batch_concurrency)
+        with tracer.span(run_config.project, PROJECT_CATEGORY):
+            manager = ProjectVariablesManager(gitlab_config, run_config.project, run_config.apply_config,
+                                              backend=backend)
+            variables = {}  # type: VariableMap
+            with tracer.span("compose", project=run_config.project):
+                for source in run_config.source:
+                    with tracer.span("read files", location=source):
+                        variables.update(read_scoped_variables(source))
+                variables = interpolate(variables)
+            manager.set(variables.values())
+    finally:
+        backend.flush()
+    print("Variables for project \"%s\" set to: %s"
+          % (run_config.project, to_key_values(manager.get_variables().values(), summarise=True)))
+    return True
+
+
+def _run_batch(records: TextIO, output: TextIO, gitlab_config: GitLabConfig, backend: VariablesBackend,
+               apply_config: ApplyConfig, concurrency: int) -> bool:
+    """
+    Sets the variables of the projects in the given lines of JSON records, concurrently. Records are read as they are
+    required, so only a bounded number are held in memory at once.
+    :param records: lines of JSON objects with the project and its variables
+    :param output: where to write the result of setting each project's variables (as a line of JSON), as each completes
+    :param gitlab_config: the configuration required to access GitLab
+    :param backend: the store of the projects' variables, shared by all of the projects
+    :param apply_config: the configuration of how changes are applied
+    :param concurrency: the maximum number of projects to set concurrently
+    :return: whether the variables of all of the projects were set
+    """
+    succeeded = True
+
+    def write_results(futures: Iterable[Future]):
+        nonlocal succeeded
+        for future in futures:
+            result = future.result()    # type: ProjectUpdateResult
+            succeeded = succeeded and result.status != FAILED_STATUS
+            output.write(json.dumps(result.to_json()) + "\n")
+            output.flush()
+
+    concurrency = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()     # type: Set[Future]
+        for line_number, line in enumerate(records, 1):
+            if line.strip() == "":
+                continue
+            if len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write_results(done)
+            pending.add(executor.submit(_set_record, line, line_number, gitlab_config, backend, apply_config))
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            write_results(done)
+    return succeeded
+
+
+def _set_record(line: str, line_number: int, gitlab_config: GitLabConfig, backend: VariablesBackend,
+                apply_config: ApplyConfig) -> ProjectUpdateResult:
+    """
+    Sets the variables of the project in the given JSON record.
+    :param line: the JSON record
+    :param line_number: the line number of the record (used to identify a record that does not have a project)
+    :param gitlab_config: the configuration required to access GitLab
+    :param backend: the store of the project's variables
+    :param apply_config: the configuration of how changes are applied
+    :return: the result of setting the project's variables (failed if the record is not valid)
+    """
+    project = "line %d" % line_number
+    try:
+        project, variables = _parse_record(line)
+        with tracer.span(project, PROJECT_CATEGORY):
+            manager = ProjectVariablesManager(gitlab_config, project, apply_config, backend=backend)
+            return ProjectUpdateResult.from_changes(project, manager.set(variables.values()))
+    except Exception as e:
+        return ProjectUpdateResult.from_error(project, e)
+
+
+def _parse_record(line: str) -> Tuple[str, VariableMap]:
+    """
+    Parses the given JSON record of a project and its variables.
+    :param line: the JSON record
+    :return: tuple of the project and its variables (with references between them resolved)
+    :raises ValueError: if the record is not valid
+    """
+    record = json.loads(line, parse_int=lambda num_str: str(num_str), parse_float=lambda float_str: str(float_str))
+    if not isinstance(record, dict) or not isinstance(record.get(_PROJECT_PROPERTY), str) \
+            or not isinstance(record.get(_VARIABLES_PROPERTY), dict):
+        raise ValueError("Expected a JSON object with a \"%s\" string and a \"%s\" object"
+                         % (_PROJECT_PROPERTY, _VARIABLES_PROPERTY))
+    return record[_PROJECT_PROPERTY], interpolate(json_to_variables(record[_VARIABLES_PROPERTY], os.getcwd()))
 
 
 def main():
@@ -40,13 +176,8 @@ def main():
     Main method.
     """
     run_config = _parse_args(sys.argv[1:])
-    gitlab_config = GitLabConfig(run_config.url, run_config.token)
-    manager = ProjectVariablesManager(gitlab_config, run_config.project)
-    variables = {}  # type: Dict[str, str]
-    for source in run_config.source:
-        variables.update(read_variables(source))
-    manager.set(variables)
-    print("Variables for project \"%s\" set to: %s" % (run_config.project, manager.get()))
+    if not run_instrumented(run_config, lambda: _run(run_config)):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,19 @@
 import argparse
 import logging
+import os
 import sys
+import threading
+import time
 from typing import List
 
-from gitlabbuildvariables.common import GitLabConfig
-from gitlabbuildvariables.executables._common import add_common_arguments, RunConfig
+from gitlabbuildvariables.common import GitLabConfig, DEFAULT_MAX_CONCURRENCY
+from gitlabbuildvariables.journal import RunCheckpoint
+from gitlabbuildvariables.repositories import close_settings_repositories
+from gitlabbuildvariables.executables._common import add_common_arguments, RunConfig, get_apply_config, \
+    run_instrumented, get_run_backend
 from gitlabbuildvariables.update import logger, FileBasedProjectVariablesUpdaterBuilder, \
-    FileBasedProjectsVariablesUpdater
+    FileBasedProjectsVariablesUpdater, Shard, UpdateResults, PrecheckError, DriftReport
+from gitlabbuildvariables.webhooks import WebhookReconciler, WebhookServer
 
 
 class _UpdateArgumentsRunConfig(RunConfig):
@@ -14,11 +21,22 @@ class _UpdateArgumentsRunConfig(RunConfig):
     Run configuration for setting arguments.
     """
     def __init__(self, config_location: str, setting_repositories: List[str],
-                 default_setting_extensions: List[str], *args, **kwargs):
+                 default_setting_extensions: List[str], *args, shard: Shard=None, result_location: str=None,
+                 monitor_interval: float=None, metrics_location: str=None,
+                 monitor_concurrency: int=DEFAULT_MAX_CONCURRENCY, serve_address: str=None, webhook_token: str=None,
+                 webhook_ref: str=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.config_location = config_location
         self.setting_repositories = setting_repositories
         self.default_setting_extensions = default_setting_extensions
+        self.shard = shard
+        self.result_location = result_location
+        self.monitor_interval = monitor_interval
+        self.metrics_location = metrics_location
+        self.monitor_concurrency = monitor_concurrency
+        self.serve_address = serve_address
+        self.webhook_token = webhook_token
+        self.webhook_ref = webhook_ref
 
 
 def _parse_args(args: List[str]) -> _UpdateArgumentsRunConfig:
@@ -29,24 +47,62 @@ def _parse_args(args: List[str]) -> _UpdateArgumentsRunConfig:
     """
     parser = argparse.ArgumentParser(
         prog="gitlab-update-variables", description="Tool for setting a GitLab project's build variables")
-    add_common_arguments(parser)
+    add_common_arguments(parser, apply=True)
     parser.add_argument("config_location", type=str, help="Location of the configuration file")
     parser.add_argument("--setting-repository", dest="setting_repository", nargs="+", type=str,
-                        help="Directory from which variable settings groups may be sourced")
+                        help="Directory from which variable settings groups may be sourced, or a git repository to "
+                             "read them from without a checkout, given as git:<git directory>[#<ref>]")
     parser.add_argument("--default-setting-extension", dest="default_setting_extensions",nargs="+", type=str,
                         help="Extensions to try adding to the variable to source location if it does not exist")
+    parser.add_argument("--shard", type=Shard.parse, metavar="INDEX/COUNT",
+                        help="Only update the projects in the given shard of the configured projects, e.g. 1/4 for the "
+                             "first of four shards (projects are assigned to shards by a stable hash of their names)")
+    parser.add_argument("--result-file", dest="result_location", type=str,
+                        help="Location to write the result of updating each project to (as JSON), carrying on if a "
+                             "project fails to update; results of shards can be combined with "
+                             "gitlab-merge-update-results")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--monitor", dest="monitor_interval", type=float, metavar="INTERVAL",
+                      help="Instead of updating the projects, check whether their variables have drifted from their "
+                           "settings every INTERVAL seconds (or just once if 0)")
+    parser.add_argument("--metrics-file", dest="metrics_location", type=str,
+                        help="Location to write Prometheus metrics of the drift found by --monitor to (e.g. in the "
+                             "node exporter's textfile directory)")
+    parser.add_argument("--monitor-concurrency", dest="monitor_concurrency", type=int,
+                        default=DEFAULT_MAX_CONCURRENCY,
+                        help="Maximum number of projects to check for drift concurrently")
+    mode.add_argument("--serve", dest="serve_address", type=str, metavar="[HOST:]PORT",
+                      help="Instead of updating the projects once, run a service that receives push webhooks from "
+                           "the settings repository and updates only the projects affected by each push")
+    parser.add_argument("--webhook-token", dest="webhook_token", type=str,
+                        help="Secret token that webhooks must give (required with --serve)")
+    parser.add_argument("--webhook-ref", dest="webhook_ref", type=str,
+                        help="Only apply pushes to the given ref (e.g. refs/heads/master)")
 
     arguments = parser.parse_args(args)
+    if arguments.serve_address is not None and arguments.webhook_token is None:
+        parser.error("a webhook token is required to serve webhooks")
+    daemon = arguments.serve_address is not None or (arguments.monitor_interval or 0) > 0
+    if daemon and (arguments.trace_location is not None or arguments.profile is not None):
+        # Spans are kept until the run ends, so they would build up for as long as the service runs
+        parser.error("--trace and --profile cannot be used when serving or monitoring periodically")
     return _UpdateArgumentsRunConfig(
         arguments.config_location, arguments.setting_repository, arguments.default_setting_extensions,
-        url=arguments.url, token=arguments.token, debug=arguments.debug)
+        url=arguments.url, token=arguments.token, debug=arguments.debug,
+        apply_config=get_apply_config(parser, arguments), trace_location=arguments.trace_location,
+        profile=arguments.profile, backend=arguments.backend,
+        shard=arguments.shard, result_location=arguments.result_location,
+        monitor_interval=arguments.monitor_interval, metrics_location=arguments.metrics_location,
+        monitor_concurrency=arguments.monitor_concurrency, serve_address=arguments.serve_address,
+        webhook_token=arguments.webhook_token, webhook_ref=arguments.webhook_ref)
 
 
-def main():
+def _run(run_config: _UpdateArgumentsRunConfig) -> bool:
     """
-    Main method.
+    Updates the variables of the projects in the given run configuration.
+    :param run_config: the run configuration
+    :return: whether all of the projects were updated successfully
     """
-    run_config = _parse_args(sys.argv[1:])
     if run_config.debug:
         logger.setLevel(logging.DEBUG)
     else:
@@ -57,9 +113,103 @@ def main():
         setting_repositories=run_config.setting_repositories,
         default_setting_extensions=run_config.default_setting_extensions)
 
+    checkpoint = None
+    if run_config.apply_config.journal_directory is not None:
+        run = os.path.abspath(run_config.config_location)
+        if run_config.shard is not None:
+            run += "#%s" % run_config.shard
+        checkpoint = RunCheckpoint(RunCheckpoint.location_for(run_config.apply_config.journal_directory, run))
+
+    backend = get_run_backend(run_config)
     updater = FileBasedProjectsVariablesUpdater(config_location=run_config.config_location, gitlab_config=gitlab_config,
-                                                project_variables_updater_builder=project_updater_builder)
-    updater.update()
+                                                project_variables_updater_builder=project_updater_builder,
+                                                apply_config=run_config.apply_config, backend=backend,
+                                                shard=run_config.shard, checkpoint=checkpoint)
+    try:
+        if run_config.monitor_interval is not None:
+            return _monitor(updater, run_config)
+        if run_config.serve_address is not None:
+            return _serve(updater, run_config)
+        try:
+            updater.precheck()
+        except PrecheckError as e:
+            logger.error(e)
+            return False
+        if run_config.result_location is None:
+            updater.update()
+            return True
+        results = UpdateResults(updater.update_projects(), str(run_config.shard) if run_config.shard else None)
+        results.write(run_config.result_location)
+        return results.succeeded
+    finally:
+        backend.flush()
+        close_settings_repositories()
+
+
+def _monitor(updater: FileBasedProjectsVariablesUpdater, run_config: _UpdateArgumentsRunConfig) -> bool:
+    """
+    Checks whether the variables of the projects have drifted from their settings, periodically (or once if the
+    interval is 0), writing metrics of the drift after each check (if configured). The configuration and settings are
+    read again for each check. A check that fails as a whole (e.g. because the settings cannot be read) is logged and
+    recorded in the metrics, and checking carries on.
+    :param updater: updater of the projects
+    :param run_config: the run configuration
+    :return: whether the last check succeeded for all projects
+    """
+    while True:
+        started = time.monotonic()
+        try:
+            report = updater.check_drift(run_config.monitor_concurrency)
+        except Exception as e:
+            logger.error("Failed to check for drift: %s" % e)
+            report = DriftReport([], time.monotonic() - started, time.time(), error="%s: %s" % (type(e).__name__, e))
+        else:
+            for drift in report.drifted:
+                logger.warning("Variables of \"%s\" have drifted (added: %s, changed: %s, removed: %s)"
+                               % (drift.project, drift.added, drift.changed, drift.removed))
+            logger.info("Checked %d projects in %.1fs: %d drifted, %d failed" % (
+                len(report.drifts), report.duration, len(report.drifted), len(report.failed)))
+        if run_config.metrics_location is not None:
+            try:
+                report.write_prometheus(run_config.metrics_location)
+            except OSError as e:
+                logger.error("Failed to write metrics to \"%s\": %s" % (run_config.metrics_location, e))
+        succeeded = report.error is None and len(report.failed) == 0
+        if run_config.monitor_interval <= 0:
+            return succeeded
+        time.sleep(max(0.0, run_config.monitor_interval - (time.monotonic() - started)))
+        updater.refresh()
+
+
+def _serve(updater: FileBasedProjectsVariablesUpdater, run_config: _UpdateArgumentsRunConfig) -> bool:
+    """
+    Serves webhooks from the settings repository, updating the projects affected by each push, until interrupted.
+    :param updater: updater of the projects, which is kept (along with what it has read) between pushes
+    :param run_config: the run configuration
+    :return: whether the service stopped cleanly
+    """
+    host, _, port = run_config.serve_address.rpartition(":")
+    reconciler = WebhookReconciler(updater, ref=run_config.webhook_ref)
+    server = WebhookServer((host, int(port)), reconciler, run_config.webhook_token)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving webhooks on %s:%d" % server.server_address[:2])
+    try:
+        reconciler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+    return True
+
+
+def main():
+    """
+    Main method.
+    """
+    run_config = _parse_args(sys.argv[1:])
+    if not run_instrumented(run_config, lambda: _run(run_config)):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
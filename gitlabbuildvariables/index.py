@@ -0,0 +1,331 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Any, Callable
+
+from gitlabbuildvariables.backends import VariablesBackend
+from gitlabbuildvariables.common import DEFAULT_MAX_CONCURRENCY
+from gitlabbuildvariables.models import Variable, VariableIdentifier, FINGERPRINT_KEY, DEFAULT_ENVIRONMENT_SCOPE, \
+    value_digest
+from gitlabbuildvariables.tracing import tracer, PROJECT_CATEGORY
+from gitlabbuildvariables.update import logger
+
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+_FORMAT_VERSION = 2
+_VERSION_PROPERTY = "version"
+_URL_PROPERTY = "url"
+_REFRESHED_PROPERTY = "refreshed"
+_PROJECTS_PROPERTY = "projects"
+_FINGERPRINT_PROPERTY = "fingerprint"
+_LISTED_PROPERTY = "listed"
+_VARIABLES_PROPERTY = "variables"
+_URL_DIGEST_LENGTH = 16
+
+# Key, environment scope and value digest of an indexed variable
+IndexedVariable = Tuple[str, str, str]
+
+
+def get_default_index_location(url: Optional[str]) -> str:
+    """
+    Gets the default location of the index of the variables in the store at the given URL (within `$XDG_CACHE_HOME`,
+    or `~/.cache` if it is not set). Stores at different URLs have different indexes.
+    :param url: the location of the store (e.g. GitLab), or `None` if it does not have one
+    :return: the default location
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    if url is None:
+        name = "index.json"
+    else:
+        name = "index-%s.json" % hashlib.sha256(url.encode("utf-8")).hexdigest()[:_URL_DIGEST_LENGTH]
+    return os.path.join(cache_home, "gitlabbuildvariables", name)
+
+
+class IndexedProject:
+    """
+    The variables of a project, as recorded in the index.
+    """
+    __slots__ = ("fingerprint", "listed", "variables")
+
+    def __init__(self, fingerprint: Optional[str], listed: float, variables: Iterable[IndexedVariable]):
+        """
+        Constructor.
+        :param fingerprint: the fingerprint that the project had when its variables were listed (see
+        `ProjectVariablesManager`), or `None` if it did not have one
+        :param listed: when the project's variables were listed (seconds since the epoch)
+        :param variables: the key, environment scope and value digest of each of the project's variables
+        """
+        self.fingerprint = fingerprint
+        self.listed = listed
+        self.variables = sorted(variables)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {_FINGERPRINT_PROPERTY: self.fingerprint, _LISTED_PROPERTY: self.listed,
+                _VARIABLES_PROPERTY: [list(variable) for variable in self.variables]}
+
+    @staticmethod
+    def from_json(json_project: Dict[str, Any]) -> "IndexedProject":
+        return IndexedProject(json_project[_FINGERPRINT_PROPERTY], json_project[_LISTED_PROPERTY],
+                              (tuple(variable) for variable in json_project[_VARIABLES_PROPERTY]))
+
+    @staticmethod
+    def from_variables(variables: Iterable[Variable]) -> "IndexedProject":
+        """
+        Creates the index entry of a project with the given variables, as they have just been listed from a backend.
+        :param variables: the project's variables (including the variable that holds its fingerprint, if it has one)
+        :return: the index entry
+        """
+        fingerprint = None
+        indexed_variables = []  # type: List[IndexedVariable]
+        for variable in variables:
+            if variable.key != FINGERPRINT_KEY:
+                indexed_variables.append((variable.key, variable.environment_scope, variable.digest))
+            elif variable.environment_scope == DEFAULT_ENVIRONMENT_SCOPE:
+                fingerprint = variable.value
+        return IndexedProject(fingerprint, time.time(), indexed_variables)
+
+
+class IndexRefresh:
+    """
+    Summary of a refresh of the variables index.
+    """
+    def __init__(self):
+        self.listed = []    # type: List[str]
+        self.unchanged = []     # type: List[str]
+        self.removed = []   # type: List[str]
+        self.failed = []    # type: List[str]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"listed": len(self.listed), "unchanged": len(self.unchanged), "removed": len(self.removed),
+                "failed": sorted(self.failed)}
+
+
+class VariablesIndex:
+    """
+    Local index of the variables of every project in a store (e.g. a GitLab instance), for finding the projects that
+    have a variable with a given key, or with a value that has a given digest, without accessing the store.
+
+    Only the digests of values are indexed, never the values themselves. The index is refreshed incrementally: a
+    project that has a fingerprint (see `ProjectVariablesManager`) is only listed again if its fingerprint has changed
+    since it was last listed, or if it was last listed longer ago than a maximum age. Projects without fingerprints
+    are listed on every refresh. Changes made by this package remove fingerprints that they invalidate, but changes
+    made by hand (e.g. in GitLab) leave them in place, so they are only picked up once the project's entry reaches the
+    maximum age, or by a full refresh.
+    """
+    def __init__(self, location: str, url: Optional[str]=None):
+        """
+        Constructor.
+        :param location: the location of the index file
+        :param url: the location of the store that is indexed (e.g. GitLab), or `None` if it does not have one or it
+        is to be that of the index that is loaded
+        """
+        self.location = location
+        self.url = url
+        self.refreshed = None   # type: Optional[float]
+        self._projects = {}     # type: Dict[str, IndexedProject]
+        self._projects_by_key = {}  # type: Dict[str, Set[str]]
+        self._projects_by_digest = {}   # type: Dict[str, Set[str]]
+
+    @property
+    def projects(self) -> List[str]:
+        """
+        Gets the projects in the index.
+        :return: the names of the projects, in order
+        """
+        return sorted(self._projects.keys())
+
+    def exists(self) -> bool:
+        """
+        Whether the index file exists.
+        :return: whether the index has been saved
+        """
+        return os.path.exists(self.location)
+
+    def load(self):
+        """
+        Loads the index from its file (if it exists).
+        :raises ValueError: if the file is not an index of a supported version, or is the index of a store at another
+        URL
+        """
+        self._projects = {}
+        self._projects_by_key = {}
+        self._projects_by_digest = {}
+        self.refreshed = None
+        if not self.exists():
+            return
+        with open(self.location, "r") as file:
+            json_index = json.load(file)
+        if json_index.get(_VERSION_PROPERTY) != _FORMAT_VERSION:
+            raise ValueError("Unsupported variables index version in \"%s\": %s"
+                             % (self.location, json_index.get(_VERSION_PROPERTY)))
+        if self.url is None:
+            self.url = json_index[_URL_PROPERTY]
+        elif json_index[_URL_PROPERTY] != self.url:
+            raise ValueError("Variables index in \"%s\" is of %s, not %s"
+                             % (self.location, json_index[_URL_PROPERTY], self.url))
+        self.refreshed = json_index[_REFRESHED_PROPERTY]
+        for project, json_project in json_index[_PROJECTS_PROPERTY].items():
+            self._set_project(project, IndexedProject.from_json(json_project))
+
+    def save(self):
+        """
+        Saves the index to its file, which is replaced atomically so that it is never seen partly written. The file is
+        only readable by its owner, as it holds digests of secret values.
+        """
+        directory = os.path.dirname(os.path.abspath(self.location))
+        os.makedirs(directory, exist_ok=True)
+        json_index = {
+            _VERSION_PROPERTY: _FORMAT_VERSION,
+            _URL_PROPERTY: self.url,
+            _REFRESHED_PROPERTY: self.refreshed,
+            _PROJECTS_PROPERTY: {project: self._projects[project].to_json() for project in self.projects}
+        }
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as file:
+            json.dump(json_index, file, separators=(",", ":"))
+        os.chmod(file.name, 0o600)
+        os.replace(file.name, self.location)
+
+    def find_key(self, key: str) -> Dict[str, List[VariableIdentifier]]:
+        """
+        Finds the projects that have a variable with the given key.
+        :param key: the key of the variable
+        :return: the identifiers of the matching variables of each project that has any
+        """
+        return self._find(self._projects_by_key.get(key, ()), lambda variable: variable[0] == key)
+
+    def find_digest(self, digest: str) -> Dict[str, List[VariableIdentifier]]:
+        """
+        Finds the projects that have a variable whose value has the given digest.
+        :param digest: the hex digest of the value (see `value_digest`)
+        :return: the identifiers of the matching variables of each project that has any
+        """
+        return self._find(self._projects_by_digest.get(digest, ()), lambda variable: variable[2] == digest)
+
+    def find_value(self, value: str) -> Dict[str, List[VariableIdentifier]]:
+        """
+        Finds the projects that have a variable with the given value, by its digest.
+        :param value: the value of the variable
+        :return: the identifiers of the matching variables of each project that has any
+        """
+        return self.find_digest(value_digest(value))
+
+    def refresh(self, backend: VariablesBackend, max_concurrency: int=DEFAULT_MAX_CONCURRENCY,
+                full: bool=False, max_age: float=DEFAULT_MAX_AGE) -> IndexRefresh:
+        """
+        Refreshes the index with the variables of the projects in the given store whose variables can be managed (i.e.
+        those that the store's user maintains), listing the variables of projects concurrently. Projects that are no
+        longer in the store (or can no longer be managed) are removed from the index. Projects that could not be listed
+        keep the variables that they were last indexed with.
+        :param backend: the store of the projects' variables
+        :param max_concurrency: the maximum number of projects to list the variables of concurrently
+        :param full: whether to list the variables of every project, rather than just those whose fingerprints have
+        changed (or that do not have fingerprints)
+        :param max_age: the number of seconds after which a project is listed again, even if its fingerprint has not
+        changed
+        :return: summary of the refresh
+        """
+        started = time.monotonic()
+        refresh = IndexRefresh()
+        with tracer.span("list projects"):
+            projects = list(backend.list_projects(maintained=True))
+        for project in set(self._projects.keys()).difference(projects):
+            self._remove_project(project)
+            refresh.removed.append(project)
+
+        def index_project(project: str) -> Tuple[str, Optional[IndexedProject], bool]:
+            with tracer.span(project, PROJECT_CATEGORY):
+                return _index_project(backend, project, None if full else self._projects.get(project), max_age)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            for project, indexed_project, failed in executor.map(index_project, projects):
+                if failed:
+                    refresh.failed.append(project)
+                elif indexed_project is None:
+                    refresh.unchanged.append(project)
+                else:
+                    self._set_project(project, indexed_project)
+                    refresh.listed.append(project)
+
+        self.refreshed = time.time()
+        logger.info("Refreshed index of %d project(s) in %.1fs: %d listed, %d unchanged, %d removed, %d failed" % (
+            len(projects), time.monotonic() - started, len(refresh.listed), len(refresh.unchanged),
+            len(refresh.removed), len(refresh.failed)))
+        return refresh
+
+    def _find(self, projects: Iterable[str], matches: Callable[[IndexedVariable], bool]) \
+            -> Dict[str, List[VariableIdentifier]]:
+        """
+        Finds the matching variables of the given projects.
+        :param projects: the projects that have matching variables
+        :param matches: predicate of whether an indexed variable matches
+        :return: the identifiers of the matching variables of each project
+        """
+        return {project: [(variable[0], variable[1]) for variable in self._projects[project].variables
+                          if matches(variable)]
+                for project in sorted(projects)}
+
+    def _set_project(self, project: str, indexed_project: IndexedProject):
+        """
+        Sets the index entry of the given project, replacing any that it had.
+        :param project: the project
+        :param indexed_project: the project's index entry
+        """
+        self._remove_project(project)
+        self._projects[project] = indexed_project
+        for key, _, digest in indexed_project.variables:
+            self._projects_by_key.setdefault(key, set()).add(project)
+            self._projects_by_digest.setdefault(digest, set()).add(project)
+
+    def _remove_project(self, project: str):
+        """
+        Removes the given project from the index, if it is in it.
+        :param project: the project
+        """
+        indexed_project = self._projects.pop(project, None)
+        if indexed_project is None:
+            return
+        for key, _, digest in indexed_project.variables:
+            _discard(self._projects_by_key, key, project)
+            _discard(self._projects_by_digest, digest, project)
+
+
+def _index_project(backend: VariablesBackend, project: str, indexed_project: Optional[IndexedProject],
+                   max_age: float) -> Tuple[str, Optional[IndexedProject], bool]:
+    """
+    Lists the variables of the given project to index them, unless the project's fingerprint shows that they have not
+    changed since it was last indexed (and it was indexed recently enough).
+    :param backend: the store of the project's variables
+    :param project: the project
+    :param indexed_project: the project's current index entry (`None` if it must be listed)
+    :param max_age: the number of seconds after which the project is listed again, even if its fingerprint has not
+    changed
+    :return: tuple of the project, its new index entry (`None` if it has not changed) and whether listing it failed
+    """
+    try:
+        if indexed_project is not None and indexed_project.fingerprint is not None \
+                and time.time() - indexed_project.listed < max_age:
+            fingerprint = backend.get_variable(project, FINGERPRINT_KEY)
+            if fingerprint is not None and fingerprint.value == indexed_project.fingerprint:
+                return project, None, False
+        return project, IndexedProject.from_variables(backend.list_variables(project)), False
+    except Exception as e:
+        logger.error("Failed to index variables of \"%s\": %s" % (project, e))
+        return project, None, True
+
+
+def _discard(projects_by_property: Dict[str, Set[str]], value: str, project: str):
+    """
+    Discards the given project from those with the given property value, forgetting the value if no projects have it.
+    :param projects_by_property: projects, keyed by property value
+    :param value: the property value
+    :param project: the project
+    """
+    projects = projects_by_property.get(value)
+    if projects is not None:
+        projects.discard(project)
+        if len(projects) == 0:
+            del projects_by_property[value]
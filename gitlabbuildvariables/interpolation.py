@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
+from typing import Mapping, Tuple, Optional, Dict, List, Union
+
+from gitlabbuildvariables.models import Variable, VariableIdentifier, DEFAULT_ENVIRONMENT_SCOPE
+
+_REFERENCE = re.compile(r"\$(?P<escape>\$?)\{(?P<name>[A-Za-z_][A-Za-z0-9_]*)\}")
+_TEMPLATE_CACHE_SIZE = 65536
+
+# A compiled template is a sequence of literal strings and (single element tuple) references to variable names
+Template = Tuple[Union[str, Tuple[str]], ...]
+
+
+class InterpolationError(ValueError):
+    """
+    Raised when variables cannot be interpolated.
+    """
+
+
+@lru_cache(maxsize=_TEMPLATE_CACHE_SIZE)
+def compile_template(value: str) -> Optional[Template]:
+    """
+    Compiles the given variable value into a template of the literal parts and references (e.g. `${OTHER_VAR}`) in it.
+    `$${OTHER_VAR}` is an escaped reference, which is kept as the literal `${OTHER_VAR}`.
+    :param value: the variable value
+    :return: the compiled template or `None` if the value contains no references
+    """
+    if "${" not in value:
+        return None
+    parts = []      # type: List[Union[str, Tuple[str]]]
+    references = False
+    position = 0
+    for match in _REFERENCE.finditer(value):
+        parts.append(value[position:match.start()])
+        if match.group("escape"):
+            parts.append("${%s}" % match.group("name"))
+        else:
+            parts.append((match.group("name"), ))
+            references = True
+        position = match.end()
+    parts.append(value[position:])
+    if not references and len(parts) == 1:
+        return None
+    return tuple(part for part in parts if part != "")
+
+
+def interpolate(variables: Mapping[VariableIdentifier, Variable]) -> Mapping[VariableIdentifier, Variable]:
+    """
+    Resolves references to other variables (e.g. `${OTHER_VAR}`) in the values of the given variables.
+
+    A reference from a variable resolves to the variable with the referenced key in the same environment scope or,
+    failing that, in the default scope. References to variables that are not given are kept as they are, so they can
+    be expanded by GitLab CI. Each variable is resolved once, following its dependencies first.
+    :param variables: the variables to interpolate, keyed by their identifiers
+    :return: read-only mapping of the interpolated variables (variables without references are unchanged)
+    :raises InterpolationError: if variables reference each other in a cycle
+    """
+    templates = {}  # type: Dict[VariableIdentifier, Template]
+    for identifier, variable in variables.items():
+        # Values in files are not templates (so they are not read until they are written)
+        template = compile_template(variable.value) \
+            if variable.value_location is None and variable.value is not None else None
+        if template is not None:
+            templates[identifier] = template
+    if len(templates) == 0:
+        return variables
+    resolved = dict(variables)
+    _Resolver(variables, templates, resolved).resolve_all()
+    return MappingProxyType(resolved)
+
+
+class _Resolver:
+    """
+    Resolves templated variables in dependency order, detecting cycles.
+    """
+    def __init__(self, variables: Mapping[VariableIdentifier, Variable],
+                 templates: Dict[VariableIdentifier, Template], resolved: Dict[VariableIdentifier, Variable]):
+        self._variables = variables
+        self._templates = templates
+        self._resolved = resolved
+        self._done = set()
+        self._in_progress = []  # type: List[VariableIdentifier]
+
+    def resolve_all(self):
+        for identifier in self._templates:
+            self._resolve(identifier)
+
+    def _resolve(self, identifier: VariableIdentifier) -> str:
+        """
+        Resolves the value of the variable with the given identifier, resolving the variables it references first.
+        :param identifier: the identifier of the variable to resolve
+        :return: the resolved value
+        """
+        if identifier in self._done or identifier not in self._templates:
+            return self._resolved[identifier].value
+        if identifier in self._in_progress:
+            cycle = self._in_progress[self._in_progress.index(identifier):] + [identifier]
+            raise InterpolationError("Variables reference each other in a cycle: %s"
+                                     % " -> ".join("%s (%s)" % referenced for referenced in cycle))
+        self._in_progress.append(identifier)
+        parts = []  # type: List[str]
+        for part in self._templates[identifier]:
+            if isinstance(part, str):
+                parts.append(part)
+                continue
+            referenced = self._find(part[0], identifier[1])
+            parts.append(self._resolve(referenced) if referenced is not None else "${%s}" % part[0])
+        self._in_progress.pop()
+
+        variable = self._variables[identifier]
+        self._resolved[identifier] = Variable(
+            variable.key, "".join(parts), variable.environment_scope, variable.protected, variable.masked,
+            variable.variable_type)
+        self._done.add(identifier)
+        return self._resolved[identifier].value
+
+    def _find(self, key: str, environment_scope: str) -> Optional[VariableIdentifier]:
+        """
+        Finds the variable that a reference to the given key, from the given environment scope, resolves to.
+        :param key: the referenced key
+        :param environment_scope: the environment scope of the referencing variable
+        :return: identifier of the referenced variable or `None` if there is no such variable
+        """
+        for identifier in ((key, environment_scope), (key, DEFAULT_ENVIRONMENT_SCOPE)):
+            if identifier in self._variables:
+                return identifier
+        return None
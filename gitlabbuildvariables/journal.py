@@ -0,0 +1,270 @@
+import json
+import os
+from threading import Lock
+from urllib.parse import quote
+
+from typing import List, Optional, Set, Dict, Any, TextIO
+
+from gitlabbuildvariables.models import Variable
+
+CREATE_ACTION = "create"
+UPDATE_ACTION = "update"
+DELETE_ACTION = "delete"
+
+_JOURNAL_FILE_EXTENSION = "journal"
+_CHECKPOINT_FILE_EXTENSION = "checkpoint"
+_PROJECT_PROPERTY = "project"
+_OPERATIONS_PROPERTY = "operations"
+_ACTION_PROPERTY = "action"
+_VARIABLE_PROPERTY = "variable"
+_PRIOR_PROPERTY = "prior"
+_COMPLETED_PROPERTY = "completed"
+_ROLLING_BACK_PROPERTY = "rolling_back"
+_INPUTS_DIGEST_PROPERTY = "inputs"
+_FILE_MODE = 0o600
+
+
+class Operation:
+    """
+    A single change to one of a project's variables.
+    """
+    __slots__ = ("action", "variable", "prior")
+
+    def __init__(self, action: str, variable: Variable, prior: Optional[Variable]):
+        """
+        Constructor.
+        :param action: the action to take (one of `CREATE_ACTION`, `UPDATE_ACTION` or `DELETE_ACTION`)
+        :param variable: the variable to create or update, or the variable to delete
+        :param prior: the variable before the operation (`None` if the variable did not exist)
+        """
+        self.action = action
+        self.variable = variable
+        self.prior = prior
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            _ACTION_PROPERTY: self.action,
+            _VARIABLE_PROPERTY: self.variable.to_dict(),
+            _PRIOR_PROPERTY: self.prior.to_dict() if self.prior is not None else None
+        }
+
+    @staticmethod
+    def from_json(json_operation: Dict[str, Any]) -> "Operation":
+        prior = json_operation[_PRIOR_PROPERTY]
+        return Operation(json_operation[_ACTION_PROPERTY], Variable(**json_operation[_VARIABLE_PROPERTY]),
+                         Variable(**prior) if prior is not None else None)
+
+
+class ApplyJournal:
+    """
+    Write-ahead journal of the changes being applied to a project's variables, which records the prior value of each
+    variable before any change is made so that a failed apply can be rolled back or resumed.
+
+    The journal is stored as lines of JSON: the first holds the planned operations and the following ones record the
+    index of each operation as it completes, or that the apply is being rolled back. The journal is removed once the
+    apply has finished (or been undone). It is only readable by its owner, as it holds the values of variables.
+    """
+    @staticmethod
+    def location_for(journal_directory: str, project: str) -> str:
+        """
+        Gets the location of the journal for the given project.
+        :param journal_directory: directory in which journals are kept
+        :param project: the project that the journal is for
+        :return: the location of the project's journal
+        """
+        return os.path.join(journal_directory, "%s.%s" % (quote(project, safe=""), _JOURNAL_FILE_EXTENSION))
+
+    def __init__(self, location: str):
+        """
+        Constructor.
+        :param location: the location of the journal file
+        """
+        self.location = location
+        self.operations = []    # type: List[Operation]
+        self.completed = set()  # type: Set[int]
+        self.rolling_back = False
+        self._lock = Lock()
+
+    def exists(self) -> bool:
+        """
+        Whether there is an unfinished apply recorded in the journal.
+        :return: whether the journal exists
+        """
+        return os.path.exists(self.location)
+
+    def begin(self, project: str, operations: List[Operation]):
+        """
+        Durably records the given operations, which are about to be applied.
+        :param project: the project that the operations are for
+        :param operations: the operations that are about to be applied
+        """
+        self.operations = operations
+        self.completed = set()
+        self.rolling_back = False
+        with _open_private(self.location, os.O_TRUNC) as file:
+            file.write(json.dumps({
+                _PROJECT_PROPERTY: project,
+                _OPERATIONS_PROPERTY: [operation.to_json() for operation in operations]
+            }) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def record_completed(self, index: int):
+        """
+        Records that the operation with the given index has been applied.
+        :param index: the index of the completed operation
+        """
+        with self._lock:
+            self.completed.add(index)
+            with _open_private(self.location, os.O_APPEND) as file:
+                file.write(json.dumps({_COMPLETED_PROPERTY: index}) + "\n")
+
+    def record_rolling_back(self):
+        """
+        Durably records that the apply is being rolled back, so that it is not resumed if the rollback is interrupted.
+        """
+        with self._lock:
+            self.rolling_back = True
+            with _open_private(self.location, os.O_APPEND) as file:
+                file.write(json.dumps({_ROLLING_BACK_PROPERTY: True}) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def load(self):
+        """
+        Loads the operations, which of them have completed and whether the apply is being rolled back, from the
+        journal file.
+        """
+        with open(self.location, "r") as file:
+            lines = [line for line in file.read().splitlines() if line.strip() != ""]
+        self.operations = [Operation.from_json(operation) for operation in json.loads(lines[0])[_OPERATIONS_PROPERTY]]
+        completed = set()
+        rolling_back = False
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final write means that the operation is treated as outstanding, which is safe to redo
+                continue
+            if record.get(_ROLLING_BACK_PROPERTY, False):
+                rolling_back = True
+            else:
+                completed.add(record[_COMPLETED_PROPERTY])
+        self.completed = completed
+        self.rolling_back = rolling_back
+
+    def outstanding(self) -> List[Operation]:
+        """
+        Gets the operations that have not yet completed.
+        :return: the outstanding operations
+        """
+        return [operation for index, operation in enumerate(self.operations) if index not in self.completed]
+
+    def finish(self):
+        """
+        Removes the journal, as the apply that it records has finished.
+        """
+        if os.path.exists(self.location):
+            os.remove(self.location)
+
+
+class RunCheckpoint:
+    """
+    Checkpoint of a run that updates the variables of many projects, which records each project as it is updated along
+    with a digest of the variables that it was updated to, so that an interrupted run can be resumed without updating
+    those projects again.
+
+    The checkpoint is stored as lines of JSON, one per updated project. It is removed once the run has finished.
+    """
+    @staticmethod
+    def location_for(journal_directory: str, run: str) -> str:
+        """
+        Gets the location of the checkpoint for the given run.
+        :param journal_directory: directory in which journals are kept
+        :param run: identifier of the run (e.g. the location of its configuration)
+        :return: the location of the run's checkpoint
+        """
+        return os.path.join(journal_directory, "%s.%s" % (quote(run, safe=""), _CHECKPOINT_FILE_EXTENSION))
+
+    def __init__(self, location: str):
+        """
+        Constructor.
+        :param location: the location of the checkpoint file
+        """
+        self.location = location
+        self.completed = {}     # type: Dict[str, str]
+        self._lock = Lock()
+
+    def exists(self) -> bool:
+        """
+        Whether there is an unfinished run recorded in the checkpoint.
+        :return: whether the checkpoint exists
+        """
+        return os.path.exists(self.location)
+
+    def load(self):
+        """
+        Loads the projects that have been updated, and the digests of the variables that they were updated to, from the
+        checkpoint file (if it exists).
+        """
+        completed = {}  # type: Dict[str, str]
+        if self.exists():
+            with open(self.location, "r") as file:
+                for line in file:
+                    try:
+                        json_completed = json.loads(line)
+                    except ValueError:
+                        # A torn final write means that the project is updated again, which is safe
+                        continue
+                    completed[json_completed[_PROJECT_PROPERTY]] = json_completed[_INPUTS_DIGEST_PROPERTY]
+        with self._lock:
+            self.completed = completed
+
+    def is_completed(self, project: str, inputs_digest: str) -> bool:
+        """
+        Whether the given project has been updated to variables with the given digest.
+        :param project: the project of interest
+        :param inputs_digest: digest of the variables that the project is to be updated to
+        :return: whether the project has been updated to those variables
+        """
+        with self._lock:
+            return self.completed.get(project) == inputs_digest
+
+    def record_completed(self, project: str, inputs_digest: str):
+        """
+        Durably records that the given project has been updated to variables with the given digest.
+        :param project: the project that was updated
+        :param inputs_digest: digest of the variables that the project was updated to
+        """
+        with self._lock:
+            self.completed[project] = inputs_digest
+            with _open_private(self.location, os.O_APPEND) as file:
+                file.write(json.dumps({_PROJECT_PROPERTY: project, _INPUTS_DIGEST_PROPERTY: inputs_digest}) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def finish(self):
+        """
+        Removes the checkpoint, as the run that it records has finished.
+        """
+        with self._lock:
+            self.completed = {}
+            if os.path.exists(self.location):
+                os.remove(self.location)
+
+
+def _open_private(location: str, flags: int) -> TextIO:
+    """
+    Opens the file at the given location for writing, creating it (if it does not exist) so that it is only readable
+    and writable by its owner.
+    :param location: the location of the file
+    :param flags: the flags to open the file with, as well as those to write and create it (e.g. `os.O_APPEND`)
+    :return: the opened file
+    """
+    descriptor = os.open(location, os.O_WRONLY | os.O_CREAT | flags, _FILE_MODE)
+    try:
+        os.fchmod(descriptor, _FILE_MODE)
+        return os.fdopen(descriptor, "a" if flags & os.O_APPEND else "w")
+    except BaseException:
+        os.close(descriptor)
+        raise
@@ -1,104 +1,423 @@
-from dictdiffer import DictDiffer
-from gitlab import Gitlab, GitlabGetError
-from typing import Dict, Iterable, Union
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
 
-from gitlabbuildvariables.common import GitLabConfig
+from typing import Dict, Iterable, Union, List, Optional, Iterator
 
-SSL_VERIFY = False
+from gitlabbuildvariables.backends import VariablesBackend, get_backend, GITLAB_BACKEND
+from gitlabbuildvariables.common import GitLabConfig, ApplyConfig
+from gitlabbuildvariables.journal import ApplyJournal, Operation, CREATE_ACTION, UPDATE_ACTION, DELETE_ACTION
+from gitlabbuildvariables.models import Variable, VariableMap, VariableChanges, VariableIdentifier, to_variables, \
+    to_key_values, diff_variables, digest_variables, FINGERPRINT_KEY, DEFAULT_ENVIRONMENT_SCOPE
+from gitlabbuildvariables.tracing import tracer
 
-_VARIABLE_KEY_PROPERTY = "key"
-_VARIABLE_VALUE_PROPERTY = "value"
+logger = logging.getLogger(__name__)
 
 
-if not SSL_VERIFY:
-    try:
-        import requests
-        from requests.packages.urllib3.exceptions import InsecureRequestWarning
-        # Silence insecure messages
-        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-    except ImportError:
-        pass
+class VariablesCache:
+    """
+    Read-through cache of the variables that projects have in a backend, which is kept up to date with the changes that
+    are made through it. Intended to last for a single run, during which variables are not changed by others.
+    """
+    def __init__(self):
+        self._projects_variables = {}   # type: Dict[str, VariableMap]
+        self._lock = Lock()
+
+    def get(self, project: str) -> Optional[VariableMap]:
+        """
+        Gets the cached variables of the given project.
+        :param project: the project of interest
+        :return: snapshot of the project's variables or `None` if they are not cached
+        """
+        with self._lock:
+            variables = self._projects_variables.get(project)
+            return dict(variables) if variables is not None else None
+
+    def set(self, project: str, variables: VariableMap):
+        """
+        Caches the given variables of the given project.
+        :param project: the project that the variables belong to
+        :param variables: all of the project's variables
+        """
+        with self._lock:
+            self._projects_variables[project] = variables
+
+    def apply(self, project: str, operation: Operation):
+        """
+        Updates the cached variables of the given project with an operation that has been made in the backend.
+        :param project: the project that the operation was made to
+        :param operation: the completed operation
+        """
+        with self._lock:
+            variables = self._projects_variables.get(project)
+            if variables is None:
+                return
+            if operation.action == DELETE_ACTION:
+                variables.pop(operation.variable.identifier, None)
+            else:
+                variables[operation.variable.identifier] = operation.variable
+
+    def invalidate(self, project: str=None):
+        """
+        Removes the cached variables of the given project.
+        :param project: the project of interest (all projects if `None`)
+        """
+        with self._lock:
+            if project is None:
+                self._projects_variables.clear()
+            else:
+                self._projects_variables.pop(project, None)
 
 
 class ProjectVariablesManager:
     """
     Manages the build variables used by a project.
+
+    Variables are stored in a backend (GitLab, unless another is given). The project's variables are listed from the
+    backend at most once, after which reads are served from a cache that is kept up to date with the changes made by
+    the manager (see `refresh` to list them again).
+
+    If configured, each time the variables are set a fingerprint of them is written to a reserved variable
+    (`FINGERPRINT_KEY`), so whether they are up to date can be checked by fetching just that variable. The reserved
+    variable is never given as one of the project's variables. Adding, removing or clearing variables, or changing them
+    by setting them without fingerprints configured, removes any fingerprint, as the variables are then no longer
+    those that it was written for.
     """
-    def __init__(self, gitlab_config: GitLabConfig, project: str):
+    def __init__(self, gitlab_config: Optional[GitLabConfig], project: str, apply_config: ApplyConfig=None,
+                 cache: VariablesCache=None, backend: VariablesBackend=None):
         """
         Constructor.
-        :param gitlab_config: configuration to access GitLab
+        :param gitlab_config: configuration to access GitLab (only required if the GitLab backend is used)
         :param project: the project of interest (preferably namespaced, e.g. "hgi/my-project")
+        :param apply_config: configuration of how changes are applied (defaults used if `None`)
+        :param cache: cache of projects' variables, which may be shared between managers in the same run (a cache
+        private to this manager is used if `None`)
+        :param backend: store of the project's variables (the GitLab backend is used if `None`)
+        :raises ValueError: if the project does not exist
         """
-        self._connector = Gitlab(gitlab_config.location, gitlab_config.token, ssl_verify=SSL_VERIFY)
-        self._connector.auth()
-        try:
-            self._project = self._connector.projects.get(project)
-        except GitlabGetError as e:
-            if "Project Not Found" in e.error_message:
-                raise ValueError("Project '%s' not found. Valid projects are: %s"
-                                 % (project,
-                                    [project.path_with_namespace for project in self._connector.projects.list()]))
+        self.project = project
+        self.apply_config = apply_config if apply_config is not None else ApplyConfig()
+        self._cache = cache if cache is not None else VariablesCache()
+        self._backend = backend if backend is not None else get_backend(GITLAB_BACKEND, gitlab_config)
+        self._backend.check_project(project)
+        self._fingerprint = None    # type: Optional[Variable]
+        self._fingerprint_known = False
 
     def get(self) -> Dict[str, str]:
         """
-        Gets the build variables for the project.
+        Gets the build variables for the project. Variables defined in multiple environment scopes are collapsed to a
+        single value (see `get_variables` for the full variable models).
         :return: the build variables
         """
-        variables = self._project.variables.list(all=True)
-        return {variable.key: variable.value for variable in variables}
+        return to_key_values(self.get_variables().values())
+
+    def get_variables(self) -> VariableMap:
+        """
+        Gets the build variables for the project, along with their environment scopes and attributes.
+        :return: map of variable models, keyed by their identifiers
+        """
+        variables = self._cache.get(self.project)
+        if variables is None or any(not variable.has_value for variable in variables.values()):
+            variables = to_variables(self._list_variables())
+            self._cache.set(self.project, variables)
+        return variables
+
+    def iterate_variables(self, digests_only: bool=False) -> Iterator[Variable]:
+        """
+        Iterates through the build variables for the project, lazily fetching a page of variables at a time if they are
+        not cached.
+        :param digests_only: whether the variables should hold only the digests of their values, rather than the values
+        :return: iterator of variable models
+        """
+        variables = self._cache.get(self.project)
+        for variable in (variables.values() if variables is not None else self._list_variables()):
+            yield variable.without_value() if digests_only and variable.has_value else variable
+
+    def diff(self, variables: Union[Dict[str, str], Iterable[Variable]]) -> VariableChanges:
+        """
+        Works out the changes required to set the build variables to those given, without making them. Only the remote
+        variables that differ from those given are held in memory.
+        :param variables: the build variables to compare against
+        :return: the required changes
+        """
+        with tracer.span("diff", project=self.project):
+            target = to_variables(variables)
+            if any(key == FINGERPRINT_KEY for key, _ in target):
+                raise ValueError("Variable key \"%s\" is reserved" % FINGERPRINT_KEY)
+            cached_variables = self._cache.get(self.project)
+            if cached_variables is not None:
+                return diff_variables(target, cached_variables.values())
+
+            changes = diff_variables(target, self._list_variables())
+            # Remote variables that match their target are cached as the target, so their values are not held twice
+            current_variables = dict(target)
+            for variable in changes.added:
+                del current_variables[variable.identifier]
+            current_variables.update(changes.previous)
+            current_variables.update((variable.identifier, variable) for variable in changes.removed)
+            self._cache.set(self.project, current_variables)
+            return changes
+
+    def get_fingerprint(self) -> Optional[str]:
+        """
+        Gets the fingerprint written when the variables were last set, fetching just the reserved variable that holds
+        it from the backend.
+        :return: the fingerprint or `None` if there is not one
+        """
+        with tracer.span("get fingerprint", project=self.project):
+            self._fingerprint = self._backend.get_variable(self.project, FINGERPRINT_KEY)
+        self._fingerprint_known = True
+        return self._fingerprint.value if self._fingerprint is not None else None
+
+    def fingerprint_matches(self, variables: Union[Dict[str, str], Iterable[Variable]]) -> bool:
+        """
+        Checks whether the fingerprint written when the variables were last set is that of the given variables, without
+        listing the project's variables. Changes made by others without updating the fingerprint are not seen.
+        :param variables: the build variables to compare against
+        :return: whether the fingerprint matches (false if there is no fingerprint)
+        """
+        return self.get_fingerprint() == digest_variables(to_variables(variables).values())
+
+    def refresh(self):
+        """
+        Discards the cached variables, so that they are listed from the backend when next required.
+        """
+        self._cache.invalidate(self.project)
+        self._fingerprint_known = False
 
     def clear(self):
         """
         Clears all of the build variables.
         """
-        for variable in self._project.variables.list(all=True):
-            variable.delete()
+        self._recover()
+        self._apply(VariableChanges(removed=list(self.iterate_variables())))
+        self._cache.set(self.project, {})
+        self._remove_fingerprint()
 
-    def remove(self, variables: Union[Iterable[str], Dict[str, str]]=None):
+    def remove(self, variables: Union[Iterable[str], Dict[str, str], Iterable[Variable]]=None):
         """
         Removes the given variables. Will only remove a key if it has the given value if the value has been defined.
+        Keys are removed from all the environment scopes that they are defined in, whereas variable models are removed
+        only from their own scope.
         :param variables: the variables to remove
         """
-        keys = list(variables.keys()) if isinstance(variables, Dict) else variables     # type: Iterable[str]
-        for key in keys:
-            variable = self._project.variables.get(key)
-            if isinstance(variables, Dict):
-                if variables[key] != variable.value:
-                    continue
-            variable.delete()
+        self._recover()
+        if isinstance(variables, Dict):
+            removed = [variable for variable in self.iterate_variables()
+                       if variable.key in variables and variables[variable.key] == variable.value]
+        else:
+            variables = list(variables)
+            identifiers = {variable.identifier for variable in variables if isinstance(variable, Variable)}
+            keys = {variable for variable in variables if not isinstance(variable, Variable)}
+            removed = [variable for variable in self.iterate_variables()
+                       if variable.identifier in identifiers or variable.key in keys]
+        self._apply(VariableChanges(removed=removed))
+        if len(removed) > 0:
+            self._remove_fingerprint()
 
-    def set(self, variables: Dict[str, str]):
+    def set(self, variables: Union[Dict[str, str], Iterable[Variable]]) -> VariableChanges:
         """
-        Sets the build variables (i.e. removes old ones, adds new ones)
+        Sets the build variables (i.e. removes old ones, adds new ones and updates changed ones in place)
         :param variables: the build variables to set
+        :return: the changes that were made
         """
-        current_variables = self.get()
-        difference = DictDiffer(variables, current_variables)
-
-        removed_keys = difference.removed()
-        self.remove(removed_keys)
+        self._recover()
+        variables = to_variables(variables)
+        changes = self.diff(variables.values())
+        self._apply(changes)
+        if self.apply_config.fingerprint:
+            self._write_fingerprint(digest_variables(variables.values()))
+        elif len(changes) > 0:
+            self._remove_fingerprint()
+        return changes
 
-        changed_keys = difference.added() | difference.changed()
-        changed = {key: variables[key] for key in changed_keys}
-        self.add(changed, overwrite=True)
-
-    def add(self, variables: Dict[str, str], overwrite: bool=False):
+    def add(self, variables: Union[Dict[str, str], Iterable[Variable]], overwrite: bool=False):
         """
         Adds the given build variables to those that already exist.
         :param variables: the build variables to add
         :param overwrite: whether the old variable should be overwritten in the case of a redefinition
         """
-        preset_variables = self._project.variables.list()
-        preset_variable_keys = [variable.key for variable in preset_variables]
+        self._recover()
+        changes = self.diff(variables)
+        changes.removed.clear()
+        if not overwrite:
+            changes.changed.clear()
+        self._apply(changes)
+        if len(changes) > 0:
+            self._remove_fingerprint()
+
+    def _apply(self, changes: VariableChanges):
+        """
+        Applies the given changes to the project's variables, concurrently. Changed variables are updated in place
+        with a single request each.
+
+        The prior values of the variables are journaled (if configured) before any change is made. If applying the
+        changes fails, the variables are rolled back to their prior values (if configured) before the error is raised.
+        If the rollback fails too, the error from applying the changes is still raised, caused by that of the rollback
+        (and the journal is kept, so that the rollback can be finished by resuming).
+        :param changes: the changes to apply
+        """
+        operations = _to_operations(changes)
+        if len(operations) == 0:
+            return
+        with tracer.span("apply", project=self.project, operations=len(operations)):
+            journal = self._get_journal()
+            if journal is not None:
+                journal.begin(self.project, operations)
+            try:
+                self._execute(operations, journal)
+            except Exception as e:
+                self.refresh()
+                if self.apply_config.rollback_on_failure:
+                    try:
+                        if journal is not None:
+                            journal.record_rolling_back()
+                        self._reconcile({operation.variable.identifier: operation.prior for operation in operations})
+                    except Exception as rollback_error:
+                        logger.error("Failed to roll back the variables of \"%s\" after failing to change them: %s"
+                                     % (self.project, rollback_error))
+                        raise e from rollback_error
+                    if journal is not None:
+                        journal.finish()
+                raise
+            if journal is not None:
+                journal.finish()
+
+    def _execute(self, operations: List[Operation], journal: ApplyJournal=None):
+        """
+        Executes the given operations, with bounded concurrency. Operations that have not started are cancelled if any
+        operation fails.
+        :param operations: the operations to execute
+        :param journal: journal to record the completion of each operation in
+        """
+        with ThreadPoolExecutor(max_workers=max(1, self.apply_config.max_concurrency)) as executor:
+            futures = {executor.submit(self._execute_operation, operation): index
+                       for index, operation in enumerate(operations)}
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    if journal is not None:
+                        journal.record_completed(futures[future])
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def _execute_operation(self, operation: Operation):
+        """
+        Executes the given operation against the backend.
+        :param operation: the operation to execute
+        """
+        if operation.action == DELETE_ACTION:
+            self._backend.delete_variable(self.project, operation.variable)
+        elif operation.action == UPDATE_ACTION:
+            self._backend.update_variable(self.project, operation.variable)
+        else:
+            self._backend.create_variable(self.project, operation.variable)
+        self._cache.apply(self.project, operation)
 
-        for key, value in variables.items():
-            if key in preset_variable_keys:
-                if overwrite:
-                    variable = preset_variables[preset_variable_keys.index(key)]
-                    variable.value = value
-                    variable.save()
+    def _reconcile(self, targets: Dict[VariableIdentifier, Optional[Variable]]):
+        """
+        Makes the given variables match their targets, based on their current state in the backend. Used to roll back
+        and to resume applies, where it is not known which in-flight operations took effect.
+        :param targets: the target of each variable, where `None` denotes that the variable should not exist
+        """
+        current_variables = {variable.identifier: variable for variable in self.iterate_variables()
+                             if variable.identifier in targets}
+        changes = VariableChanges()
+        for identifier, target in targets.items():
+            current_variable = current_variables.get(identifier)
+            if target is None:
+                if current_variable is not None:
+                    changes.removed.append(current_variable)
+            elif current_variable is None:
+                changes.added.append(target)
+            elif current_variable != target:
+                changes.changed.append(target)
+                changes.previous[identifier] = current_variable
+        self._execute(_to_operations(changes))
+
+    def _recover(self):
+        """
+        Completes any unfinished apply recorded in the project's journal (or, if the apply was being rolled back,
+        finishes undoing it), if resuming is configured.
+        :raises ValueError: if there is an unfinished apply and resuming is not configured
+        """
+        journal = self._get_journal()
+        if journal is None or not journal.exists():
+            return
+        if not self.apply_config.resume:
+            raise ValueError("Unfinished changes to the variables of project '%s' are recorded in \"%s\": resume them "
+                             "or remove the journal" % (self.project, journal.location))
+        journal.load()
+        self.refresh()
+        if journal.rolling_back:
+            # Any of the operations may have taken effect before the rollback was interrupted
+            self._reconcile({operation.variable.identifier: operation.prior for operation in journal.operations})
+        else:
+            self._reconcile({operation.variable.identifier: operation.variable if operation.action != DELETE_ACTION
+                             else None for operation in journal.outstanding()})
+        journal.finish()
+
+    def _list_variables(self) -> Iterator[Variable]:
+        """
+        Lists the project's variables from the backend (lazily fetching a page of variables at a time from GitLab).
+        :return: iterator of variable models
+        """
+        fingerprint = None     # type: Optional[Variable]
+        for variable in tracer.iterate(self._backend.list_variables(self.project), "list", project=self.project):
+            if variable.key != FINGERPRINT_KEY:
+                yield variable
+            elif variable.environment_scope == DEFAULT_ENVIRONMENT_SCOPE:
+                fingerprint = variable
+        self._fingerprint = fingerprint
+        self._fingerprint_known = True
+
+    def _write_fingerprint(self, fingerprint: str):
+        """
+        Writes the given fingerprint to the reserved variable, if it does not already hold it.
+        :param fingerprint: the fingerprint of the variables that have been set
+        """
+        if not self._fingerprint_known:
+            self.get_fingerprint()
+        if self._fingerprint is not None and self._fingerprint.value == fingerprint:
+            return
+        variable = Variable(FINGERPRINT_KEY, fingerprint)
+        with tracer.span("write fingerprint", project=self.project):
+            if self._fingerprint is None:
+                self._backend.create_variable(self.project, variable)
             else:
-                variable = self._project.variables.create({
-                    _VARIABLE_KEY_PROPERTY: key, _VARIABLE_VALUE_PROPERTY: value})
-                variable.save()
+                self._backend.update_variable(self.project, variable)
+        self._fingerprint = variable
+
+    def _remove_fingerprint(self):
+        """
+        Removes the fingerprint (if there is one, even if fingerprints are not configured), as the variables have been
+        changed other than by setting them with a fingerprint. If the project's variables have not been listed, the
+        fingerprint is looked up with a single request.
+        """
+        if not self._fingerprint_known:
+            self.get_fingerprint()
+        if self._fingerprint is not None:
+            self._backend.delete_variable(self.project, self._fingerprint)
+            self._fingerprint = None
+
+    def _get_journal(self) -> Optional[ApplyJournal]:
+        """
+        Gets the journal for this project's applies.
+        :return: the journal or `None` if journaling is not configured
+        """
+        if self.apply_config.journal_directory is None:
+            return None
+        return ApplyJournal(ApplyJournal.location_for(self.apply_config.journal_directory, self.project))
+
+
+def _to_operations(changes: VariableChanges) -> List[Operation]:
+    """
+    Converts the given changes into operations.
+    :param changes: the changes to convert
+    :return: the equivalent operations
+    """
+    return [Operation(DELETE_ACTION, variable, variable) for variable in changes.removed] \
+        + [Operation(UPDATE_ACTION, variable, changes.previous[variable.identifier]) for variable in changes.changed] \
+        + [Operation(CREATE_ACTION, variable, None) for variable in changes.added]
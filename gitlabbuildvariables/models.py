@@ -0,0 +1,302 @@
+import hashlib
+import os
+from threading import Lock
+
+from typing import Dict, Iterable, List, Tuple, Union, Any, Mapping, Optional
+
+DEFAULT_ENVIRONMENT_SCOPE = "*"
+ENV_VAR_VARIABLE_TYPE = "env_var"
+FILE_VARIABLE_TYPE = "file"
+
+# Key of the variable in which a fingerprint of the variables that were last set in a project is kept (if configured)
+FINGERPRINT_KEY = "GITLAB_BUILD_VARIABLES_FINGERPRINT"
+
+VariableIdentifier = Tuple[str, str]
+
+_ATTRIBUTES = ("key", "value", "environment_scope", "protected", "masked", "variable_type")
+_ENCODING = "utf-8"
+_READ_CHUNK_SIZE = 64 * 1024
+
+# Values longer than this are summarised by their digest when displayed
+LARGE_VALUE_LENGTH = 256
+
+_file_digests = {}  # type: Dict[Tuple[str, int, int], str]
+_file_digests_lock = Lock()
+
+
+def value_digest(value: str) -> str:
+    """
+    Gets the digest of the given variable value.
+    :param value: the value to get the digest of
+    :return: the hex digest of the value
+    """
+    return hashlib.sha256(value.encode(_ENCODING)).hexdigest()
+
+
+def file_digest(location: str) -> str:
+    """
+    Gets the digest of the contents of the given file, as a variable value (i.e. the same as `value_digest` of the
+    file's contents). The file is streamed rather than read into memory, and its digest is cached until the file's
+    modification time or size changes.
+    :param location: the location of the file
+    :return: the hex digest of the file's contents
+    """
+    status = os.stat(location)
+    key = (location, status.st_mtime_ns, status.st_size)
+    with _file_digests_lock:
+        digest = _file_digests.get(key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(location, "rb") as file:
+            for chunk in iter(lambda: file.read(_READ_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with _file_digests_lock:
+            _file_digests[key] = digest
+    return digest
+
+
+def read_value_file(location: str) -> str:
+    """
+    Reads the variable value in the given file, exactly as it is (e.g. without line endings being translated).
+    :param location: the location of the file
+    :return: the value
+    """
+    with open(location, "r", encoding=_ENCODING, newline="") as file:
+        return file.read()
+
+
+class Variable:
+    """
+    Model of a GitLab CI build variable, identified by its key and environment scope.
+
+    Variables are treated as immutable. A variable may be held as just a digest of its value (with a `None` value), so
+    that it can be compared without holding the value in memory. A variable's value may instead be in a file (e.g. a
+    large certificate), in which case the value is only read when it is required (e.g. to write it) and is compared by
+    the digest of the file.
+    """
+    __slots__ = ("key", "_value", "environment_scope", "protected", "masked", "variable_type", "value_location",
+                 "_digest")
+
+    def __init__(self, key: str, value: Optional[str], environment_scope: str=DEFAULT_ENVIRONMENT_SCOPE,
+                 protected: bool=False, masked: bool=False, variable_type: str=ENV_VAR_VARIABLE_TYPE,
+                 digest: str=None, value_location: str=None):
+        """
+        Constructor.
+        :param key: the variable's name
+        :param value: the variable's value (`None` if only the digest of the value is known or if the value is in a
+        file)
+        :param environment_scope: the environments that the variable is available in ("*" for all)
+        :param protected: whether the variable is only exposed to protected branches and tags
+        :param masked: whether the variable's value is masked in job logs
+        :param variable_type: the type of the variable (either "env_var" or "file")
+        :param digest: the digest of the variable's value (calculated when required if `None`)
+        :param value_location: the location of the file that holds the variable's value (if `value` is `None`)
+        """
+        if value is None and digest is None and value_location is None:
+            raise ValueError("Either the value, the digest of the value or the location of the value of variable "
+                             "\"%s\" must be given" % key)
+        self.key = key
+        self._value = value
+        self.environment_scope = environment_scope
+        self.protected = protected
+        self.masked = masked
+        self.variable_type = variable_type
+        self.value_location = value_location if value is None else None
+        self._digest = digest
+
+    @property
+    def value(self) -> Optional[str]:
+        """
+        Gets the variable's value. The value of a variable that is in a file is read from the file each time it is got,
+        so it is not held in memory for longer than required.
+        :return: the value or `None` if only the digest of the value is known
+        """
+        if self._value is None and self.value_location is not None:
+            return read_value_file(self.value_location)
+        return self._value
+
+    @property
+    def has_value(self) -> bool:
+        """
+        Whether the variable's value (rather than just its digest) is known, either in memory or in a file.
+        :return: whether the value is known
+        """
+        return self._value is not None or self.value_location is not None
+
+    @property
+    def digest(self) -> str:
+        """
+        Gets the digest of the variable's value.
+        :return: the hex digest of the value
+        """
+        if self._digest is not None:
+            return self._digest
+        if self._value is None:
+            return file_digest(self.value_location)
+        self._digest = value_digest(self._value)
+        return self._digest
+
+    @property
+    def identifier(self) -> VariableIdentifier:
+        """
+        Gets the identifier of the variable, which is unique within a project.
+        :return: tuple of the variable's key and environment scope
+        """
+        return self.key, self.environment_scope
+
+    def same_attributes(self, other: "Variable") -> bool:
+        """
+        Whether the given variable has the same attributes (excluding the value) as this one.
+        :param other: the variable to compare with
+        :return: whether the attributes match
+        """
+        return self.identifier == other.identifier and self.protected == other.protected \
+            and self.masked == other.masked and self.variable_type == other.variable_type
+
+    def same_value(self, other: "Variable") -> bool:
+        """
+        Whether the given variable has the same value as this one. Digests are compared if either value is not held in
+        memory.
+        :param other: the variable to compare with
+        :return: whether the values match
+        """
+        if self._value is not None and other._value is not None:
+            return self._value == other._value
+        return self.digest == other.digest
+
+    def without_value(self) -> "Variable":
+        """
+        Gets a copy of this variable that holds only the digest of its value.
+        :return: the digest-only variable
+        """
+        return Variable(self.key, None, self.environment_scope, self.protected, self.masked, self.variable_type,
+                        digest=self.digest)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Gets a dictionary representation of the variable, as used by the GitLab API.
+        :return: the dictionary representation
+        """
+        return {attribute: getattr(self, attribute) for attribute in _ATTRIBUTES}
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Variable) and self.same_attributes(other) and self.same_value(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        attributes = ["%s=%r" % (attribute, getattr(self, attribute)) for attribute in _ATTRIBUTES
+                      if attribute != "value" or self.value_location is None]
+        if self.value_location is not None:
+            attributes.insert(1, "value_location=%r" % self.value_location)
+        return "%s(%s)" % (type(self).__name__, ", ".join(attributes))
+
+
+VariableMap = Dict[VariableIdentifier, Variable]
+
+
+class VariableChanges:
+    """
+    Changes required to get from one set of a project's variables to another.
+    """
+    __slots__ = ("added", "changed", "removed", "previous")
+
+    def __init__(self, added: List[Variable]=None, changed: List[Variable]=None, removed: List[Variable]=None,
+                 previous: VariableMap=None):
+        """
+        Constructor.
+        :param added: variables that are to be created
+        :param changed: variables that exist but are to be updated to the given value and attributes
+        :param removed: variables that are to be deleted
+        :param previous: the variables that are to be changed, as they were before the change (removed variables are
+        their own previous state)
+        """
+        self.added = added if added is not None else []
+        self.changed = changed if changed is not None else []
+        self.removed = removed if removed is not None else []
+        self.previous = previous if previous is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def __repr__(self) -> str:
+        return "%s(added=%r, changed=%r, removed=%r)" % (type(self).__name__, self.added, self.changed, self.removed)
+
+
+def to_variables(variables: Union[Mapping[str, Union[str, Variable]], Iterable[Variable]]) -> VariableMap:
+    """
+    Converts the given variables into a map of variable models, keyed by their identifiers.
+    :param variables: either key-value pairs (where values may be plain strings, which are given the default
+    attributes, or variable models) or an iterable of variable models
+    :return: map of variable models
+    """
+    if isinstance(variables, Mapping):
+        variables = (value if isinstance(value, Variable) else Variable(key, value) for key, value in variables.items())
+    return {variable.identifier: variable for variable in variables}
+
+
+def to_key_values(variables: Iterable[Variable], summarise: bool=False) -> Dict[str, str]:
+    """
+    Collapses the given variables into key-value pairs. If a key is defined in multiple environment scopes, the value
+    for the default scope takes preference.
+    :param variables: the variables to collapse
+    :param summarise: whether values that are in files or are large (see `LARGE_VALUE_LENGTH`) should be given as
+    their digests (e.g. "<sha256:...>"), for display
+    :return: dictionary where the variable names are key and their values are the values
+    """
+    key_values = {}     # type: Dict[str, str]
+    for variable in variables:
+        if variable.key not in key_values or variable.environment_scope == DEFAULT_ENVIRONMENT_SCOPE:
+            key_values[variable.key] = variable.value if not summarise else _summarise_value(variable)
+    return key_values
+
+
+def _summarise_value(variable: Variable) -> str:
+    """
+    Gets the value of the given variable for display, which is its digest if it is in a file or is large.
+    :param variable: the variable
+    :return: the value or its digest
+    """
+    if variable.value_location is None and variable.value is not None and len(variable.value) <= LARGE_VALUE_LENGTH:
+        return variable.value
+    return "<sha256:%s>" % variable.digest
+
+
+def diff_variables(target: VariableMap, current: Iterable[Variable]) -> VariableChanges:
+    """
+    Works out the changes required to get from the current variables to the target variables. A variable that differs
+    only in its value or attributes is reported as changed, so it can be updated in place.
+
+    The current variables are consumed as a stream: only those that differ from their target are kept.
+    :param target: the variables that should exist
+    :param current: the variables that currently exist
+    :return: the required changes
+    """
+    changes = VariableChanges()
+    seen = set()
+    for current_variable in current:
+        identifier = current_variable.identifier
+        seen.add(identifier)
+        variable = target.get(identifier)
+        if variable is None:
+            changes.removed.append(current_variable)
+        elif current_variable != variable:
+            changes.changed.append(variable)
+            changes.previous[identifier] = current_variable
+    changes.added.extend(variable for identifier, variable in target.items() if identifier not in seen)
+    return changes
+
+
+def digest_variables(variables: Iterable[Variable]) -> str:
+    """
+    Gets a digest of the given variables (including their attributes), which does not depend on their order.
+    :param variables: the variables to get the digest of
+    :return: the hex digest of the variables
+    """
+    digest = hashlib.sha256()
+    for variable in sorted(variables, key=lambda variable: variable.identifier):
+        attributes = (variable.key, variable.environment_scope, str(variable.protected), str(variable.masked),
+                      variable.variable_type, variable.digest)
+        digest.update(("\0".join(attributes) + "\n").encode(_ENCODING))
+    return digest.hexdigest()
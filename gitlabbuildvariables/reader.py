@@ -1,13 +1,32 @@
 import configparser
 import json
+import os
+import re
 from json import JSONDecodeError
 
-from typing import Dict, List
+from typing import Dict, List, Any, Optional
+
+from gitlabbuildvariables.models import Variable, VariableMap, to_key_values, DEFAULT_ENVIRONMENT_SCOPE, \
+    ENV_VAR_VARIABLE_TYPE
 
 _FAKE_SECTION_NAME = "all"
 _FAKE_SECTION = "[%s]\n" % _FAKE_SECTION_NAME
 _EXPORT_COMMAND = "export "
 
+_ATTRIBUTES_SECTION_PREFIX = "gitlab:"
+_SCOPE_ATTRIBUTE_PREFIX = "scope:"
+_TYPE_ATTRIBUTE_PREFIX = "type:"
+_PROTECTED_ATTRIBUTE = "protected"
+_MASKED_ATTRIBUTE = "masked"
+_FROM_FILE_ATTRIBUTE = "from-file"
+_FROM_FILE_ARGUMENT = "from_file"
+_SHELL_ATTRIBUTES_DIRECTIVE = re.compile(r"^#\s*%s\s*(?P<attributes>.+)$" % _ATTRIBUTES_SECTION_PREFIX)
+_INI_SECTION_HEADER = re.compile(r"^\[.+\]$")
+
+_JSON_VALUE_PROPERTY = "value"
+_JSON_FILE_PROPERTY = "file"
+_JSON_ATTRIBUTE_PROPERTIES = ("environment_scope", "protected", "masked", "variable_type")
+
 
 def read_variables(config_location: str) -> Dict[str, str]:
     """
@@ -16,47 +35,211 @@ def read_variables(config_location: str) -> Dict[str, str]:
     :param config_location: the location of the config file
     :return: dictionary where the variable names are key and their values are the values
     """
+    return to_key_values(read_scoped_variables(config_location).values())
+
+
+def read_scoped_variables(config_location: str) -> VariableMap:
+    """
+    Reads variables, along with their environment scopes and attributes, out of a config file.
+
+    In JSON, a variable's value may be given as an object with a "value" property and any of the "environment_scope",
+    "protected", "masked" and "variable_type" properties, or as a list of such objects to define the variable in many
+    scopes. Other values (including lists of anything else) are given as they are written in JSON. In ini files,
+    variables in a section named `gitlab:` followed by attributes (e.g. `[gitlab: scope:production protected masked]`
+    or `[gitlab: type:file]`) are given those attributes; other sections are plain. In shell files, a
+    `# gitlab: <attributes>` comment gives the attributes to the export that follows it.
+
+    Large values (e.g. certificates) can be kept in their own files, which are only read when the values are written. In
+    JSON, such a value is given as an object with a "file" property (instead of "value") that is the file's location. In
+    ini and shell files, the values of variables with the `from-file` attribute are the files' locations. Relative
+    locations are relative to the directory of the config file.
+    :param config_location: the location of the config file
+    :return: map of variable models, keyed by their identifiers
+    :raises ValueError: if a variable's definition is malformed or a file that holds a value does not exist
+    """
     with open(config_location, "r") as config_file:
-        config_lines = config_file.readlines()
+        return parse_scoped_variables(config_file.read(), os.path.dirname(os.path.abspath(config_location)))
+
+
+def parse_scoped_variables(contents: str, directory: str=None) -> VariableMap:
+    """
+    Parses variables, along with their environment scopes and attributes, out of the contents of a config file (see
+    `read_scoped_variables`).
+    :param contents: the contents of the config file
+    :param directory: the directory that locations of files that hold values are relative to (only absolute locations
+    are allowed if `None`, e.g. if the config file is not in a directory)
+    :return: map of variable models, keyed by their identifiers
+    :raises ValueError: if a variable's definition is malformed, or a file that holds a value does not exist or its
+    location cannot be resolved
+    """
     try:
-        return json.loads("".join(config_lines), parse_int=lambda num_str: str(num_str),
-                          parse_float=lambda float_str: str(float_str))
+        return json_to_variables(json.loads(contents, parse_int=lambda num_str: str(num_str),
+                                            parse_float=lambda float_str: str(float_str)), directory)
     except JSONDecodeError:
         pass
-    config_lines = _shell_to_ini(config_lines)
-    return _read_ini_config("\n".join(config_lines))
+    config_lines = _shell_to_ini(contents.splitlines())
+    return _read_ini_config("\n".join(config_lines), directory)
+
+
+def json_to_variables(config: Dict[str, Any], directory: str=None) -> VariableMap:
+    """
+    Converts the given parsed JSON config (in the format of a JSON config file, see `read_scoped_variables`) to variable
+    models.
+    :param config: the parsed JSON config
+    :param directory: see `parse_scoped_variables`
+    :return: map of variable models, keyed by their identifiers
+    :raises ValueError: if the config is not an object or a variable's definition is malformed, or a file that holds a
+    value does not exist or its location cannot be resolved
+    """
+    if not isinstance(config, dict):
+        raise ValueError("JSON config must be an object of variables, not: %s" % type(config).__name__)
+    variables = {}  # type: VariableMap
+    for key, value in config.items():
+        if isinstance(value, list) and len(value) > 0 and all(_is_json_definition(element) for element in value):
+            definitions = value
+        else:
+            definitions = [value]
+        for definition in definitions:
+            if isinstance(definition, dict):
+                variable = _json_definition_to_variable(key, definition, directory)
+            else:
+                variable = Variable(key, _json_value_to_string(definition))
+            variables[variable.identifier] = variable
+    return variables
+
+
+def _is_json_definition(value: Any) -> bool:
+    """
+    Whether the given value from a JSON config is the definition of a variable (i.e. an object with a value or file).
+    :param value: the parsed JSON value
+    :return: whether the value is a definition
+    """
+    return isinstance(value, dict) and (_JSON_VALUE_PROPERTY in value or _JSON_FILE_PROPERTY in value)
+
+
+def _json_definition_to_variable(key: str, definition: Dict[str, Any], directory: Optional[str]) -> Variable:
+    """
+    Converts the given definition of a variable from a JSON config to a variable model.
+    :param key: the variable's key
+    :param definition: the parsed JSON definition
+    :param directory: see `parse_scoped_variables`
+    :return: the variable model
+    :raises ValueError: if the definition has neither a value nor a file, or the file cannot be resolved
+    """
+    if not _is_json_definition(definition):
+        raise ValueError("The definition of \"%s\" must have a \"%s\" or \"%s\" property: %s"
+                         % (key, _JSON_VALUE_PROPERTY, _JSON_FILE_PROPERTY, json.dumps(definition)))
+    attributes = {name: definition[name] for name in _JSON_ATTRIBUTE_PROPERTIES if name in definition}
+    if _JSON_VALUE_PROPERTY not in definition:
+        return Variable(key, None, value_location=_resolve_value_location(
+            key, definition[_JSON_FILE_PROPERTY], directory), **attributes)
+    return Variable(key, _json_value_to_string(definition[_JSON_VALUE_PROPERTY]), **attributes)
 
 
-def _read_ini_config(ini_file_contents: str) -> Dict[str, str]:
+def _json_value_to_string(value: Any) -> str:
     """
-    Parses the given ini file contents and converts to a dictionary of key/value pairs.
+    Converts the given value from a JSON config to a variable value. Values that are not strings are given as they are
+    written in JSON (e.g. `true` rather than Python's `True`), which is how GitLab CI and shells expect them.
+    :param value: the parsed JSON value
+    :return: the variable value
+    """
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _read_ini_config(ini_file_contents: str, directory: Optional[str]) -> VariableMap:
+    """
+    Parses the given ini file contents and converts to variable models.
     :param ini_file_contents: the contents of the ini file
-    :return: dictionary where the variable names are key and their values are the values
+    :param directory: see `parse_scoped_variables`
+    :return: map of variable models, keyed by their identifiers
     """
-    config = configparser.ConfigParser()
+    config = configparser.ConfigParser(strict=False)
     config.optionxform = str
     config.read_string(_FAKE_SECTION + ini_file_contents)
 
-    items = {}
+    variables = {}  # type: VariableMap
     for section in config.sections():
-        items.update(dict(config[section].items()))
+        attributes = _parse_attributes(section) if section.startswith(_ATTRIBUTES_SECTION_PREFIX) else {}
+        from_file = attributes.pop(_FROM_FILE_ARGUMENT, False)
+        for key, value in config[section].items():
+            if from_file:
+                variable = Variable(key, None, value_location=_resolve_value_location(key, value, directory),
+                                    **attributes)
+            else:
+                variable = Variable(key, value, **attributes)
+            variables[variable.identifier] = variable
 
-    return items
+    return variables
+
+
+def _parse_attributes(specification: str) -> Dict[str, Any]:
+    """
+    Parses the given specification of variable attributes (e.g. "gitlab: scope:production protected masked").
+    :param specification: the attributes specification, marked with `_ATTRIBUTES_SECTION_PREFIX`
+    :return: the variable attributes, as named arguments for `Variable`
+    :raises ValueError: if the specification has an unrecognised attribute
+    """
+    attributes = {}     # type: Dict[str, Any]
+    for part in specification[len(_ATTRIBUTES_SECTION_PREFIX):].split():
+        if part.startswith(_SCOPE_ATTRIBUTE_PREFIX):
+            attributes["environment_scope"] = part[len(_SCOPE_ATTRIBUTE_PREFIX):] or DEFAULT_ENVIRONMENT_SCOPE
+        elif part.startswith(_TYPE_ATTRIBUTE_PREFIX):
+            attributes["variable_type"] = part[len(_TYPE_ATTRIBUTE_PREFIX):] or ENV_VAR_VARIABLE_TYPE
+        elif part == _PROTECTED_ATTRIBUTE:
+            attributes["protected"] = True
+        elif part == _MASKED_ATTRIBUTE:
+            attributes["masked"] = True
+        elif part == _FROM_FILE_ATTRIBUTE:
+            attributes[_FROM_FILE_ARGUMENT] = True
+        else:
+            raise ValueError("Unrecognised variable attribute \"%s\" in: %s" % (part, specification))
+    return attributes
+
+
+def _resolve_value_location(key: str, location: str, directory: Optional[str]) -> str:
+    """
+    Resolves the location of the file that holds the value of the variable with the given key.
+    :param key: the variable's key
+    :param location: the location of the file, as given
+    :param directory: see `parse_scoped_variables`
+    :return: the absolute location of the file
+    :raises ValueError: if the location cannot be resolved or the file does not exist
+    """
+    location = os.path.expanduser(location)
+    if not os.path.isabs(location):
+        if directory is None:
+            raise ValueError("The location of the file holding the value of \"%s\" must be absolute: %s"
+                             % (key, location))
+        location = os.path.join(directory, location)
+    if not os.path.isfile(location):
+        raise ValueError("The file holding the value of \"%s\" does not exist: %s" % (key, location))
+    return location
 
 
 def _shell_to_ini(shell_file_contents: List[str]) -> List[str]:
     """
-    Converts a shell file, which just contains comments and "export *" statements into an ini file.
+    Converts a shell file, which just contains comments and "export *" statements into an ini file. Attribute
+    directives (i.e. `# gitlab: <attributes>` comments) are converted into ini sections that hold just the following
+    variable. Existing ini section headers are kept.
     :param shell_file_contents: the contents of the shell file
     :return: lines of an equivalent ini file
     """
-    line_number = 0
-    while line_number < len(shell_file_contents):
-        line = shell_file_contents[line_number].strip()
-        if "=" not in line:
-            del shell_file_contents[line_number]
-        else:
-            if line.strip().startswith(_EXPORT_COMMAND):
-                shell_file_contents[line_number] = line.replace(_EXPORT_COMMAND, "").strip()
-            line_number += 1
-    return shell_file_contents
+    ini_lines = []  # type: List[str]
+    in_attributes_section = False
+    for line in shell_file_contents:
+        line = line.strip()
+        directive = _SHELL_ATTRIBUTES_DIRECTIVE.match(line)
+        if directive is not None:
+            ini_lines.append("[%s %s]" % (_ATTRIBUTES_SECTION_PREFIX, directive.group("attributes").strip()))
+            in_attributes_section = True
+        elif _INI_SECTION_HEADER.match(line) is not None:
+            ini_lines.append(line)
+            in_attributes_section = False
+        elif "=" in line:
+            if line.startswith(_EXPORT_COMMAND):
+                line = line.replace(_EXPORT_COMMAND, "").strip()
+            ini_lines.append(line)
+            if in_attributes_section:
+                ini_lines.append(_FAKE_SECTION.strip())
+                in_attributes_section = False
+    return ini_lines
@@ -0,0 +1,352 @@
+import json
+import logging
+import os
+import posixpath
+import subprocess
+import tempfile
+from abc import ABCMeta, abstractmethod
+from threading import Lock
+
+from typing import Dict, Optional, IO
+
+from gitlabbuildvariables.models import Variable, VariableMap
+from gitlabbuildvariables.reader import read_scoped_variables, parse_scoped_variables
+from gitlabbuildvariables.tracing import tracer
+
+GIT_REPOSITORY_PREFIX = "git:"
+DEFAULT_GIT_REF = "HEAD"
+
+_GIT_REF_SEPARATOR = "#"
+_GIT_EXECUTABLE = "git"
+_BLOB_OBJECT_TYPE = "blob"
+_MISSING_OBJECT = "missing"
+_CACHE_FORMAT_VERSION = "v1"
+_CACHE_FILE_EXTENSION = ".json"
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsRepository(metaclass=ABCMeta):
+    """
+    Repository of settings files, identified by their paths relative to the repository.
+    """
+    @abstractmethod
+    def contains(self, path: str) -> bool:
+        """
+        Gets whether the repository contains a settings file at the given path.
+        :param path: the path of the settings file
+        :return: whether the settings file exists
+        """
+
+    @abstractmethod
+    def read(self, path: str) -> VariableMap:
+        """
+        Reads the variables in the settings file at the given path.
+        :param path: the path of the settings file
+        :return: map of variable models, keyed by their identifiers
+        """
+
+    @abstractmethod
+    def locate(self, path: str) -> str:
+        """
+        Gets a description of where the settings file at the given path is (e.g. for logging).
+        :param path: the path of the settings file
+        :return: the location of the settings file
+        """
+
+    def refresh(self):
+        """
+        Makes sure that changes to the settings files are seen when they are next read.
+        """
+
+    def fetch(self):
+        """
+        Fetches the latest settings files from where they are published, if the repository tracks somewhere, and makes
+        sure that they are seen when they are next read.
+        """
+        self.refresh()
+
+    def close(self):
+        """
+        Releases any resources that the repository holds (it can still be read afterwards).
+        """
+
+    def __enter__(self) -> "SettingsRepository":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DirectorySettingsRepository(SettingsRepository):
+    """
+    Repository of settings files in a directory.
+    """
+    def __init__(self, directory: str):
+        """
+        Constructor.
+        :param directory: the directory containing the settings files
+        """
+        self.directory = directory
+
+    def contains(self, path: str) -> bool:
+        return os.path.exists(self.locate(path))
+
+    def read(self, path: str) -> VariableMap:
+        return read_scoped_variables(self.locate(path))
+
+    def locate(self, path: str) -> str:
+        return os.path.join(self.directory, path)
+
+
+class GitSettingsRepository(SettingsRepository):
+    """
+    Repository of settings files in a (possibly bare) git repository at a given ref, which are read straight from the
+    object store without a checkout.
+
+    The tree at the ref is listed once and blobs are read through a single `git cat-file --batch` process. Parsed
+    settings are cached by blob SHA in memory and, if a cache directory is given, on disk, so settings files that have
+    not changed are not parsed again (even in later runs).
+    """
+    def __init__(self, git_directory: str, ref: str=DEFAULT_GIT_REF, cache_directory: str=None):
+        """
+        Constructor.
+        :param git_directory: the git directory of the repository (e.g. "settings.git" or "settings/.git")
+        :param ref: the ref to read settings at (e.g. a branch, tag or commit)
+        :param cache_directory: directory in which to cache parsed settings (not cached on disk if `None`)
+        """
+        self.git_directory = git_directory
+        self.ref = ref
+        self.cache_directory = cache_directory
+        self._tree = None  # type: Optional[Dict[str, str]]
+        self._blob_variables = {}   # type: Dict[str, VariableMap]
+        self._cat_file = None   # type: Optional[subprocess.Popen]
+        self._lock = Lock()
+
+    def contains(self, path: str) -> bool:
+        return _normalise_path(path) in self._get_tree()
+
+    def read(self, path: str) -> VariableMap:
+        blob = self._get_tree()[_normalise_path(path)]
+        with self._lock:
+            if blob not in self._blob_variables:
+                variables = self._read_cached(blob)
+                if variables is None:
+                    variables = parse_scoped_variables(self._read_blob(blob).decode())
+                    self._write_cached(blob, variables)
+                self._blob_variables[blob] = variables
+            return dict(self._blob_variables[blob])
+
+    def locate(self, path: str) -> str:
+        return "%s%s%s%s:%s" % (GIT_REPOSITORY_PREFIX, self.git_directory, _GIT_REF_SEPARATOR, self.ref,
+                                _normalise_path(path))
+
+    def refresh(self):
+        """
+        Lists the tree at the ref again when it is next needed (e.g. after the ref has moved).
+        """
+        with self._lock:
+            self._tree = None
+
+    def fetch(self):
+        """
+        Fetches from the repository's remotes (e.g. to move the ref of a mirror to a commit that has just been pushed),
+        then lists the tree at the ref again when it is next needed.
+        :raises ValueError: if fetching fails
+        """
+        with tracer.span("fetch", location=self.locate("")):
+            self._run_git("fetch", "--quiet", "--all", "--prune")
+        self.refresh()
+
+    def close(self):
+        """
+        Stops the process used to read blobs (which is started again if another blob needs to be read).
+        """
+        with self._lock:
+            if self._cat_file is not None:
+                self._cat_file.stdin.close()
+                self._cat_file.wait()
+                self._cat_file.stdout.close()
+                self._cat_file = None
+
+    def _get_tree(self) -> Dict[str, str]:
+        """
+        Gets the paths of the files in the tree at the ref, listing them if they have not been listed before.
+        :return: dictionary where the keys are file paths and the values are the SHAs of their blobs
+        :raises ValueError: if the tree cannot be listed
+        """
+        with self._lock:
+            if self._tree is None:
+                with tracer.span("list tree", location=self.locate("")):
+                    output = self._run_git("ls-tree", "-r", "-z", "--full-tree", self.ref)
+                tree = {}   # type: Dict[str, str]
+                for entry in output.split(b"\0"):
+                    if entry == b"":
+                        continue
+                    details, path = entry.split(b"\t", 1)
+                    _, object_type, sha = details.decode().split(" ")
+                    if object_type == _BLOB_OBJECT_TYPE:
+                        tree[path.decode()] = sha
+                self._tree = tree
+            return self._tree
+
+    def _read_blob(self, blob: str) -> bytes:
+        """
+        Reads the contents of the given blob from the object store.
+        :param blob: the SHA of the blob
+        :return: the blob's contents
+        :raises ValueError: if the blob does not exist
+        """
+        if self._cat_file is None:
+            self._cat_file = subprocess.Popen(
+                [_GIT_EXECUTABLE, "--git-dir", self.git_directory, "cat-file", "--batch"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._cat_file.stdin.write(("%s\n" % blob).encode())
+        self._cat_file.stdin.flush()
+        header = self._cat_file.stdout.readline().decode().split()
+        if len(header) != 3 or header[1] == _MISSING_OBJECT:
+            raise ValueError("Could not read blob %s from git repository \"%s\"" % (blob, self.git_directory))
+        contents = _read_exactly(self._cat_file.stdout, int(header[2]))
+        self._cat_file.stdout.read(1)
+        return contents
+
+    def _read_cached(self, blob: str) -> Optional[VariableMap]:
+        """
+        Reads the variables parsed from the given blob from the cache directory.
+        :param blob: the SHA of the blob
+        :return: the cached variables or `None` if they have not been cached
+        """
+        location = self._get_cache_location(blob)
+        if location is None or not os.path.exists(location):
+            return None
+        try:
+            with open(location, "r") as cache_file:
+                variables = [Variable(**json_variable) for json_variable in json.load(cache_file)]
+        except (OSError, ValueError, TypeError) as e:
+            logger.debug("Ignoring unreadable cached settings \"%s\": %s" % (location, e))
+            return None
+        return {variable.identifier: variable for variable in variables}
+
+    def _write_cached(self, blob: str, variables: VariableMap):
+        """
+        Writes the variables parsed from the given blob to the cache directory. Failures to write are not errors.
+        Variables with values in (absolute) files are not cached, as the files may change.
+        :param blob: the SHA of the blob
+        :param variables: the parsed variables
+        """
+        location = self._get_cache_location(blob)
+        if location is None or any(variable.value_location is not None for variable in variables.values()):
+            return
+        try:
+            os.makedirs(os.path.dirname(location), exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(location), delete=False) as cache_file:
+                json.dump([variable.to_dict() for variable in variables.values()], cache_file)
+            os.replace(cache_file.name, location)
+        except OSError as e:
+            logger.debug("Could not cache settings \"%s\": %s" % (location, e))
+
+    def _get_cache_location(self, blob: str) -> Optional[str]:
+        """
+        Gets the location in the cache directory of the variables parsed from the given blob.
+        :param blob: the SHA of the blob
+        :return: the location or `None` if there is no cache directory
+        """
+        if self.cache_directory is None:
+            return None
+        return os.path.join(self.cache_directory, _CACHE_FORMAT_VERSION, blob[:2], blob[2:] + _CACHE_FILE_EXTENSION)
+
+    def _run_git(self, *arguments: str) -> bytes:
+        """
+        Runs the given git command against the repository.
+        :param arguments: the git command and its arguments
+        :return: the command's output
+        :raises ValueError: if the command fails
+        """
+        process = subprocess.run([_GIT_EXECUTABLE, "--git-dir", self.git_directory] + list(arguments),
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            raise ValueError("Could not run \"git %s\" in git repository \"%s\": %s"
+                             % (" ".join(arguments), self.git_directory, process.stderr.decode().strip()))
+        return process.stdout
+
+
+_repositories = {}  # type: Dict[str, SettingsRepository]
+_repositories_lock = Lock()
+
+
+def get_settings_repository(specification: str) -> SettingsRepository:
+    """
+    Gets the settings repository with the given specification, which is either a directory or a git repository given
+    as `git:<git directory>` or `git:<git directory>#<ref>` (e.g. "git:/srv/settings.git#production"). The same
+    repository is returned for the same specification.
+    :param specification: the specification of the repository
+    :return: the settings repository
+    """
+    with _repositories_lock:
+        if specification not in _repositories:
+            if specification.startswith(GIT_REPOSITORY_PREFIX):
+                git_directory, _, ref = specification[len(GIT_REPOSITORY_PREFIX):].partition(_GIT_REF_SEPARATOR)
+                repository = GitSettingsRepository(git_directory, ref or DEFAULT_GIT_REF, get_cache_directory())
+            else:
+                repository = DirectorySettingsRepository(specification)
+            _repositories[specification] = repository
+        return _repositories[specification]
+
+
+def close_settings_repositories():
+    """
+    Closes the settings repositories that have been got with `get_settings_repository` and forgets them, so that they
+    are opened again if they are needed again.
+    """
+    with _repositories_lock:
+        repositories = list(_repositories.values())
+        _repositories.clear()
+    for repository in repositories:
+        repository.close()
+
+
+def forget_settings_repositories():
+    """
+    Forgets the settings repositories that have been got with `get_settings_repository` without closing them, so that
+    they are opened again if they are needed again (e.g. in a forked process, where they belong to the parent process).
+    """
+    global _repositories_lock
+    _repositories_lock = Lock()
+    _repositories.clear()
+
+
+def get_cache_directory() -> str:
+    """
+    Gets the directory in which parsed settings are cached (within `$XDG_CACHE_HOME`, or `~/.cache` if it is not set).
+    :return: the cache directory
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "gitlabbuildvariables", "settings")
+
+
+def _normalise_path(path: str) -> str:
+    """
+    Normalises the given path of a file in a git tree.
+    :param path: the path, relative to the root of the tree
+    :return: the normalised path
+    """
+    return posixpath.normpath(path.replace(os.sep, posixpath.sep)).lstrip(posixpath.sep)
+
+
+def _read_exactly(stream: IO[bytes], size: int) -> bytes:
+    """
+    Reads the given number of bytes from the given stream.
+    :param stream: the stream to read from
+    :param size: the number of bytes to read
+    :return: the bytes read
+    :raises ValueError: if the stream ends before the bytes have been read
+    """
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if len(chunk) == 0:
+            raise ValueError("Unexpected end of git object")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
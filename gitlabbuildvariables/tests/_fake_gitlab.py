@@ -0,0 +1,143 @@
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs, unquote
+
+from typing import Dict, List, Any, Tuple, Set
+
+_API_PATH = "/api/v4/projects"
+_GROUPS_API_PATH = "/api/v4/groups"
+_DEFAULT_PAGE_SIZE = 20
+_MAINTAINER_ACCESS_LEVEL = 40
+
+
+class FakeGitLab(ThreadingMixIn, HTTPServer):
+    """
+    Fake of the parts of the GitLab API that are used to manage project variables, served on a local port.
+    """
+    daemon_threads = True
+
+    def __init__(self, token: str="token"):
+        """
+        Constructor.
+        :param token: the access token that requests must give
+        """
+        super().__init__(("127.0.0.1", 0), _FakeGitLabRequestHandler)
+        self.token = token
+        self.projects = {}  # type: Dict[str, Dict[Tuple[str, str], Dict[str, Any]]]
+        self.groups = {}    # type: Dict[str, List[Dict[str, Any]]]
+        # Projects that the token can see but not maintain
+        self.guest_projects = set()     # type: Set[str]
+        self.requests = []  # type: List[Tuple[str, str]]
+        self.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    @property
+    def location(self) -> str:
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def __enter__(self) -> "FakeGitLab":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class _FakeGitLabRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles requests to `FakeGitLab`.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server = None   # type: FakeGitLab
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method: str):
+        url = urlparse(self.path)
+        parameters = {name: values[0] for name, values in parse_qs(url.query).items()}
+        with self.server.lock:
+            self.server.requests.append((method, url.path))
+        if self.headers.get("PRIVATE-TOKEN") != self.server.token:
+            return self._respond(401, {"message": "401 Unauthorized"})
+        if url.path.startswith(_GROUPS_API_PATH) and method == "GET":
+            return self._handle_group(url.path, parameters)
+        if not url.path.startswith(_API_PATH):
+            return self._respond(404, {"message": "404 Not Found"})
+        parts = [unquote(part) for part in url.path[len(_API_PATH):].split("/") if part != ""]
+        with self.server.lock:
+            if len(parts) == 0:
+                maintained = int(parameters.get("min_access_level", 0)) >= _MAINTAINER_ACCESS_LEVEL
+                projects = [{"path_with_namespace": project} for project in sorted(self.server.projects)
+                            if not maintained or project not in self.server.guest_projects]
+                return self._respond_page(projects, parameters)
+            if parts[0] not in self.server.projects:
+                return self._respond(404, {"message": "404 Project Not Found"})
+            variables = self.server.projects[parts[0]]
+            if len(parts) == 1:
+                return self._respond(200, {"path_with_namespace": parts[0]})
+            if len(parts) == 2 and method == "GET":
+                return self._respond_page(list(variables.values()), parameters)
+            if len(parts) == 2 and method == "POST":
+                variable = dict(self._read_json())
+                variable.setdefault("environment_scope", "*")
+                identifier = (variable["key"], variable["environment_scope"])
+                if identifier in variables:
+                    return self._respond(400, {"message": {"key": ["has already been taken"]}})
+                variables[identifier] = variable
+                return self._respond(201, variable)
+            identifier = (parts[2], parameters.get("filter[environment_scope]", "*"))
+            if identifier not in variables:
+                return self._respond(404, {"message": "404 Variable Not Found"})
+            if method == "GET":
+                return self._respond(200, variables[identifier])
+            if method == "PUT":
+                variables[identifier].update(self._read_json())
+                return self._respond(200, variables[identifier])
+            del variables[identifier]
+            return self._respond(204, None)
+
+    def _handle_group(self, path: str, parameters: Dict[str, str]):
+        parts = [unquote(part) for part in path[len(_GROUPS_API_PATH):].split("/") if part != ""]
+        with self.server.lock:
+            if len(parts) != 2 or parts[1] != "variables" or parts[0] not in self.server.groups:
+                return self._respond(404, {"message": "404 Group Not Found"})
+            return self._respond_page(list(self.server.groups[parts[0]]), parameters)
+
+    def _read_json(self) -> Dict[str, Any]:
+        return json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode())
+
+    def _respond_page(self, items: List[Dict[str, Any]], parameters: Dict[str, str]):
+        page = int(parameters.get("page", 1))
+        page_size = int(parameters.get("per_page", _DEFAULT_PAGE_SIZE))
+        total_pages = max(1, math.ceil(len(items) / page_size))
+        headers = {"X-Page": str(page), "X-Per-Page": str(page_size), "X-Total": str(len(items)),
+                   "X-Total-Pages": str(total_pages), "X-Next-Page": str(page + 1) if page < total_pages else ""}
+        self._respond(200, items[(page - 1) * page_size:page * page_size], headers)
+
+    def _respond(self, status: int, body: Any, headers: Dict[str, str]=None):
+        contents = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(contents)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(contents)
@@ -0,0 +1,59 @@
+import random
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import List
+
+from gitlabbuildvariables.backends._backend import fetch_pages, get_page_executor
+
+
+class TestFetchPages(unittest.TestCase):
+    """
+    Tests for `fetch_pages`.
+    """
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.fetched = []   # type: List[int]
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def _fetch_page(self, page: int) -> List[str]:
+        time.sleep(random.random() * 0.01)
+        self.fetched.append(page)
+        return ["%d-%d" % (page, i) for i in range(3)]
+
+    def test_fetch_in_order(self):
+        items = list(fetch_pages(self._fetch_page, range(1, 21), self.executor, 4))
+        self.assertEqual(["%d-%d" % (page, i) for page in range(1, 21) for i in range(3)], items)
+
+    def test_fetch_none(self):
+        self.assertEqual([], list(fetch_pages(self._fetch_page, [], self.executor, 4)))
+
+    def test_fetch_bounded(self):
+        items = fetch_pages(self._fetch_page, range(1, 21), self.executor, 2)
+        next(items)
+        time.sleep(0.05)
+        self.assertLessEqual(len(self.fetched), 3)
+
+    def test_fetch_error(self):
+        def fetch_page(page: int) -> List[str]:
+            if page == 3:
+                raise IOError()
+            return [str(page)]
+        items = fetch_pages(fetch_page, range(1, 6), self.executor, 2)
+        self.assertEqual(["1", "2"], [next(items), next(items)])
+        self.assertRaises(IOError, next, items)
+
+
+class TestGetPageExecutor(unittest.TestCase):
+    """
+    Tests for `get_page_executor`.
+    """
+    def test_shared(self):
+        self.assertIs(get_page_executor(), get_page_executor())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from gitlabbuildvariables.backends._gitlab import GitLabBackend
+from gitlabbuildvariables.common import GitLabConfig
+
+
+class _MissingTotalPagesList:
+    """
+    Lazy list of the GitLab library, as given by older versions of it when GitLab leaves out the number of pages.
+    """
+    per_page = 2
+
+    def __init__(self, items):
+        self._items = items
+
+    @property
+    def total_pages(self) -> int:
+        return int(None)
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class _ListManager:
+    """
+    Manager of the GitLab library's models, which records the listings that are requested.
+    """
+    def __init__(self, items):
+        self.items = items
+        self.listings = []
+
+    def list(self, **parameters):
+        self.listings.append(parameters)
+        return _MissingTotalPagesList(self.items)
+
+
+class TestGitLabBackend(unittest.TestCase):
+    """
+    Tests for `GitLabBackend`.
+    """
+    def test_list_when_total_pages_missing(self):
+        manager = _ListManager(["a", "b", "c"])
+        backend = GitLabBackend(GitLabConfig("http://gitlab.example.com", "token"))
+        self.assertEqual(["a", "b", "c"], list(backend._list(manager)))
+        self.assertEqual(1, len(manager.listings))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+import unittest
+
+from gitlabbuildvariables.backends import JsonFileBackend
+from gitlabbuildvariables.models import Variable
+
+_PROJECT = "group/project"
+
+
+class TestJsonFileBackend(unittest.TestCase):
+    """
+    Tests for `JsonFileBackend`.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self._temp_directory.name, "variables.json")
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def test_flush_and_read(self):
+        backend = JsonFileBackend(self.location)
+        backend.create_variable(_PROJECT, Variable("a", "1", protected=True))
+        backend.flush()
+        self.assertEqual([Variable("a", "1", protected=True)],
+                         list(JsonFileBackend(self.location).list_variables(_PROJECT)))
+
+    def test_flush_when_not_modified(self):
+        JsonFileBackend(self.location).flush()
+        self.assertFalse(os.path.exists(self.location))
+
+    def test_read_existing(self):
+        with open(self.location, "w") as file:
+            json.dump({_PROJECT: [{"key": "a", "value": "1", "environment_scope": "production"}]}, file)
+        backend = JsonFileBackend(self.location)
+        self.assertEqual([_PROJECT], list(backend.list_projects()))
+        self.assertEqual([Variable("a", "1", "production")], list(backend.list_variables(_PROJECT)))
+
+
+if __name__ == "__main__":
+    unittest.main()
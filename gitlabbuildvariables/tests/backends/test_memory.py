@@ -0,0 +1,163 @@
+import unittest
+
+from gitlabbuildvariables.backends import InMemoryBackend, get_backend, MEMORY_BACKEND, GITLAB_BACKEND
+from gitlabbuildvariables.common import ApplyConfig
+from gitlabbuildvariables.manager import ProjectVariablesManager
+from gitlabbuildvariables.models import Variable, to_variables, digest_variables, FINGERPRINT_KEY
+
+_PROJECT = "group/project"
+
+
+class _FailingBackend(InMemoryBackend):
+    """
+    In-memory backend that fails to create a particular variable.
+    """
+    def __init__(self, failing_key: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failing_key = failing_key
+
+    def create_variable(self, project: str, variable: Variable):
+        if variable.key == self.failing_key:
+            raise IOError("Failed to create %s" % variable.key)
+        super().create_variable(project, variable)
+
+
+class TestInMemoryBackend(unittest.TestCase):
+    """
+    Tests for `InMemoryBackend`.
+    """
+    def setUp(self):
+        self.backend = InMemoryBackend({_PROJECT: [Variable("a", "1")]})
+
+    def test_list_projects(self):
+        self.backend.create_variable("other", Variable("a", "1"))
+        self.assertEqual([_PROJECT, "other"], list(self.backend.list_projects()))
+
+    def test_create_update_delete(self):
+        self.backend.create_variable(_PROJECT, Variable("b", "2", "production"))
+        self.backend.update_variable(_PROJECT, Variable("a", "2", protected=True))
+        self.backend.delete_variable(_PROJECT, Variable("b", "2", "production"))
+        self.assertEqual([Variable("a", "2", protected=True)], list(self.backend.list_variables(_PROJECT)))
+
+    def test_get_variable(self):
+        self.backend.create_variable(_PROJECT, Variable("b", "2", "production"))
+        self.assertEqual(Variable("a", "1"), self.backend.get_variable(_PROJECT, "a"))
+        self.assertIsNone(self.backend.get_variable(_PROJECT, "b"))
+        self.assertIsNone(self.backend.get_variable("other", "a"))
+
+    def test_create_when_exists(self):
+        self.assertRaises(ValueError, self.backend.create_variable, _PROJECT, Variable("a", "2"))
+
+    def test_update_when_not_exists(self):
+        self.assertRaises(ValueError, self.backend.update_variable, _PROJECT, Variable("a", "2", "production"))
+
+
+class TestProjectVariablesManagerWithInMemoryBackend(unittest.TestCase):
+    """
+    Tests for `ProjectVariablesManager` when using `InMemoryBackend`.
+    """
+    def setUp(self):
+        self.backend = InMemoryBackend({_PROJECT: [Variable("a", "1"), Variable("b", "2")]})
+        self.manager = ProjectVariablesManager(None, _PROJECT, backend=self.backend)
+
+    def test_get(self):
+        self.assertEqual({"a": "1", "b": "2"}, self.manager.get())
+
+    def test_set(self):
+        variables = [Variable("a", "1"), Variable("b", "3", "production"), Variable("c", "4", masked=True)]
+        changes = self.manager.set(variables)
+        self.assertEqual((1, 0, 2), (len(changes.removed), len(changes.changed), len(changes.added)))
+        self.assertEqual(to_variables(variables), to_variables(self.backend.list_variables(_PROJECT)))
+
+    def test_set_rolls_back_on_failure(self):
+        backend = _FailingBackend("c", {_PROJECT: [Variable("a", "1"), Variable("b", "2")]})
+        manager = ProjectVariablesManager(None, _PROJECT, ApplyConfig(max_concurrency=1), backend=backend)
+        self.assertRaises(IOError, manager.set, {"a": "2", "c": "3"})
+        self.assertEqual(to_variables({"a": "1", "b": "2"}), to_variables(backend.list_variables(_PROJECT)))
+
+    def test_clear(self):
+        self.manager.clear()
+        self.assertEqual([], list(self.backend.list_variables(_PROJECT)))
+
+
+class TestProjectVariablesManagerWithFingerprint(unittest.TestCase):
+    """
+    Tests for `ProjectVariablesManager` when fingerprints are configured.
+    """
+    def setUp(self):
+        self.backend = InMemoryBackend({_PROJECT: [Variable("a", "1")]})
+        self.manager = self._create_manager()
+        self.variables = [Variable("a", "1"), Variable("b", "2", "production")]
+
+    def _create_manager(self) -> ProjectVariablesManager:
+        return ProjectVariablesManager(None, _PROJECT, ApplyConfig(fingerprint=True), backend=self.backend)
+
+    def test_set(self):
+        self.manager.set(self.variables)
+        self.assertEqual(Variable(FINGERPRINT_KEY, digest_variables(self.variables)),
+                         self.backend.get_variable(_PROJECT, FINGERPRINT_KEY))
+        self.assertEqual(to_variables(self.variables), to_variables(self.manager.iterate_variables()))
+        self.assertEqual({"a": "1", "b": "2"}, self._create_manager().get())
+
+    def test_set_when_unchanged(self):
+        self.manager.set(self.variables)
+        changes = self._create_manager().set(self.variables)
+        self.assertEqual(0, len(changes))
+        self.assertEqual(3, len(list(self.backend.list_variables(_PROJECT))))
+
+    def test_set_when_changed(self):
+        self.manager.set(self.variables)
+        self._create_manager().set({"c": "3"})
+        self.assertEqual(to_variables({"c": "3", FINGERPRINT_KEY: digest_variables(to_variables({"c": "3"}).values())}),
+                         to_variables(self.backend.list_variables(_PROJECT)))
+
+    def test_set_reserved_key(self):
+        self.assertRaises(ValueError, self.manager.set, {FINGERPRINT_KEY: "1"})
+
+    def test_fingerprint_matches(self):
+        self.assertFalse(self.manager.fingerprint_matches({"a": "1"}))
+        self.manager.set(self.variables)
+        manager = self._create_manager()
+        self.assertTrue(manager.fingerprint_matches(reversed(self.variables)))
+        self.assertFalse(manager.fingerprint_matches({"a": "1"}))
+
+    def test_add(self):
+        self.manager.set(self.variables)
+        self.manager.add({"a": "2"})
+        self.assertEqual(digest_variables(self.variables), self.manager.get_fingerprint())
+        self.manager.add({"c": "3"})
+        self.assertIsNone(self._create_manager().get_fingerprint())
+
+    def test_remove(self):
+        self.manager.set(self.variables)
+        self.manager.remove(["c"])
+        self.assertIsNotNone(self.manager.get_fingerprint())
+        self._create_manager().remove(["a"])
+        self.assertIsNone(self.backend.get_variable(_PROJECT, FINGERPRINT_KEY))
+
+    def test_clear(self):
+        self.manager.set(self.variables)
+        self._create_manager().clear()
+        self.assertEqual([], list(self.backend.list_variables(_PROJECT)))
+
+    def test_without_fingerprint_configured(self):
+        ProjectVariablesManager(None, _PROJECT, backend=self.backend).set(self.variables)
+        self.assertIsNone(self.backend.get_variable(_PROJECT, FINGERPRINT_KEY))
+
+
+class TestGetBackend(unittest.TestCase):
+    """
+    Tests for `get_backend`.
+    """
+    def test_shared(self):
+        self.assertIs(get_backend(MEMORY_BACKEND), get_backend(MEMORY_BACKEND))
+
+    def test_gitlab_requires_config(self):
+        self.assertRaises(ValueError, get_backend, GITLAB_BACKEND)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, get_backend, "unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from gitlabbuildvariables.backends._rest import RestBackend
+from gitlabbuildvariables.common import GitLabConfig
+from gitlabbuildvariables.manager import ProjectVariablesManager
+from gitlabbuildvariables.models import Variable, to_variables
+from gitlabbuildvariables.tests._fake_gitlab import FakeGitLab
+
+_PROJECT = "group/project"
+
+
+class TestRestBackend(unittest.TestCase):
+    """
+    Tests for `RestBackend`.
+    """
+    def setUp(self):
+        self.gitlab = FakeGitLab().__enter__()
+        self.gitlab.projects[_PROJECT] = {}
+        self.backend = RestBackend(GitLabConfig(self.gitlab.location, self.gitlab.token))
+
+    def tearDown(self):
+        self.gitlab.__exit__()
+
+    def test_list_projects(self):
+        self.gitlab.projects.update({str(i): {} for i in range(150)})
+        self.assertEqual(151, len(list(self.backend.list_projects())))
+
+    def test_list_maintained_projects(self):
+        self.gitlab.projects["other"] = {}
+        self.gitlab.guest_projects.add("other")
+        self.assertEqual([_PROJECT, "other"], list(self.backend.list_projects()))
+        self.assertEqual([_PROJECT], list(self.backend.list_projects(maintained=True)))
+
+    def test_check_project(self):
+        self.backend.check_project(_PROJECT)
+        self.assertRaises(ValueError, self.backend.check_project, "other")
+
+    def test_get_project_path(self):
+        self.assertEqual(_PROJECT, self.backend.get_project_path(_PROJECT))
+        self.assertRaises(ValueError, self.backend.get_project_path, "other")
+
+    def test_create_update_delete(self):
+        self.backend.create_variable(_PROJECT, Variable("a", "1"))
+        self.backend.create_variable(_PROJECT, Variable("a", "2", "production"))
+        self.backend.create_variable(_PROJECT, Variable("b/c", "3"))
+        self.backend.update_variable(_PROJECT, Variable("a", "4", "production", protected=True))
+        self.backend.delete_variable(_PROJECT, Variable("a", "1"))
+        self.assertEqual(to_variables([Variable("a", "4", "production", protected=True), Variable("b/c", "3")]),
+                         to_variables(self.backend.list_variables(_PROJECT)))
+
+    def test_get_variable(self):
+        self.backend.create_variable(_PROJECT, Variable("a", "1", masked=True))
+        self.backend.create_variable(_PROJECT, Variable("b", "2", "production"))
+        self.assertEqual(Variable("a", "1", masked=True), self.backend.get_variable(_PROJECT, "a"))
+        self.assertIsNone(self.backend.get_variable(_PROJECT, "b"))
+        self.assertIsNone(self.backend.get_variable(_PROJECT, "c"))
+
+    def test_list_many_variables(self):
+        variables = to_variables({str(i): str(i) for i in range(250)})
+        for variable in variables.values():
+            self.backend.create_variable(_PROJECT, variable)
+        self.assertEqual(variables, to_variables(self.backend.list_variables(_PROJECT)))
+
+    def test_list_many_variables_in_order(self):
+        for i in range(450):
+            self.backend.create_variable(_PROJECT, Variable("%03d" % i, str(i)))
+        self.gitlab.requests.clear()
+        self.assertEqual(["%03d" % i for i in range(450)],
+                         [variable.key for variable in self.backend.list_variables(_PROJECT)])
+        self.assertEqual(5, len(self.gitlab.requests))
+
+    def test_list_many_variables_sequentially(self):
+        backend = RestBackend(GitLabConfig(self.gitlab.location, self.gitlab.token), page_concurrency=1)
+        for i in range(250):
+            backend.create_variable(_PROJECT, Variable("%03d" % i, str(i)))
+        self.assertEqual(["%03d" % i for i in range(250)],
+                         [variable.key for variable in backend.list_variables(_PROJECT)])
+
+    def test_list_group_variables(self):
+        self.gitlab.groups["group"] = [{"key": "a", "value": "1", "environment_scope": "*"}]
+        self.assertEqual([Variable("a", "1")], list(self.backend.list_group_variables("group")))
+        self.assertEqual([], list(self.backend.list_group_variables("user")))
+
+    def test_manager(self):
+        manager = ProjectVariablesManager(None, _PROJECT, backend=self.backend)
+        manager.set({"a": "1", "b": "2"})
+        manager.refresh()
+        self.assertEqual({"a": "1", "b": "2"}, manager.get())
+
+
+if __name__ == "__main__":
+    unittest.main()
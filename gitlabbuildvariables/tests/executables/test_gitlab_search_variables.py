@@ -0,0 +1,42 @@
+import json
+import os
+import tempfile
+import unittest
+
+import gitlabbuildvariables.executables.gitlab_search_variables
+from gitlabbuildvariables.tests._common import EXAMPLE_VARIABLES_1, add_variables_to_project
+from gitlabbuildvariables.tests.executables._common import execute, TestExecutable
+
+
+class TestGitLabSearchVariablesExecutable(TestExecutable):
+    """
+    Tests for the `gitlab-search-variables` executable.
+    """
+    @property
+    def executable(self) -> str:
+        return gitlabbuildvariables.executables.gitlab_search_variables.__file__
+
+    def test_search(self):
+        add_variables_to_project(EXAMPLE_VARIABLES_1, self.project)
+        key, value = next(iter(EXAMPLE_VARIABLES_1.items()))
+        with tempfile.TemporaryDirectory() as temp_directory:
+            index_location = os.path.join(temp_directory, "index.json")
+            result = execute([self.executable, "--token", self.gitlab.private_token, "--url", self.gitlab_location,
+                              "--index", index_location, "--refresh"])
+            self.assertEqual(0, result.exit_code)
+            result = execute([self.executable, "--index", index_location, "--value", value])
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual({self.project.path_with_namespace: [{"key": key, "environment_scope": "*"}]},
+                         json.loads(result.stdout))
+
+    def test_search_when_no_index(self):
+        with tempfile.TemporaryDirectory() as temp_directory:
+            result = execute([self.executable, "--index", os.path.join(temp_directory, "index.json"), "--key", "A"])
+        self.assertNotEqual(0, result.exit_code)
+
+
+del TestExecutable
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import json
+import unittest
+from io import StringIO
+
+from gitlabbuildvariables.backends import InMemoryBackend
+from gitlabbuildvariables.common import ApplyConfig
+from gitlabbuildvariables.executables.gitlab_set_variables import _run_batch
+from gitlabbuildvariables.models import to_variables
+
+
+class TestRunBatch(unittest.TestCase):
+    """
+    Tests for batch mode (`_run_batch`).
+    """
+    def test_run_batch(self):
+        backend = InMemoryBackend({"group/b": {"OLD": "1"}})
+        records = StringIO("\n".join([
+            json.dumps({"project": "group/a", "variables": {"A": "1", "B": "${A}2"}}),
+            "",
+            json.dumps({"project": "group/b", "variables": {"C": {"value": "3", "protected": True}}}),
+            "{invalid"
+        ]))
+        output = StringIO()
+        self.assertFalse(_run_batch(records, output, None, backend, ApplyConfig(), 2))
+        results = {result["project"]: result for result in map(json.loads, output.getvalue().splitlines())}
+        self.assertEqual({"group/a": "updated", "group/b": "updated", "line 4": "failed"},
+                         {project: result["status"] for project, result in results.items()})
+        self.assertEqual(1, results["group/b"]["removed"])
+        self.assertEqual(to_variables({"A": "1", "B": "12"}), to_variables(backend.list_variables("group/a")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+
+from gitlabbuildvariables.executables.gitlab_update_variables import _parse_args
+
+
+class TestParseArguments(unittest.TestCase):
+    """
+    Tests for parsing the arguments of the `gitlab-update-variables` executable.
+    """
+    def _assert_rejected(self, args):
+        with redirect_stderr(StringIO()), self.assertRaises(SystemExit):
+            _parse_args(args)
+
+    def test_monitor_and_serve_are_exclusive(self):
+        self._assert_rejected(["config.json", "--monitor", "60", "--serve", "8080", "--webhook-token", "secret"])
+
+    def test_trace_when_serving(self):
+        self._assert_rejected(["config.json", "--serve", "8080", "--webhook-token", "secret", "--trace", "trace.json"])
+
+    def test_profile_when_monitoring_periodically(self):
+        self._assert_rejected(["config.json", "--monitor", "60", "--profile"])
+
+    def test_trace_when_monitoring_once(self):
+        self.assertEqual("trace.json", _parse_args(["config.json", "--monitor", "0", "--trace", "trace.json"])
+                         .trace_location)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from gitlabbuildvariables.journal import Operation, CREATE_ACTION, DELETE_ACTION
+from gitlabbuildvariables.manager import VariablesCache
+from gitlabbuildvariables.models import Variable
+
+
+class TestVariablesCache(unittest.TestCase):
+    """
+    Tests for `VariablesCache`.
+    """
+    def setUp(self):
+        self.cache = VariablesCache()
+
+    def test_get_when_not_cached(self):
+        self.assertIsNone(self.cache.get("project"))
+
+    def test_apply(self):
+        self.cache.set("project", {("a", "*"): Variable("a", "1")})
+        self.cache.apply("project", Operation(CREATE_ACTION, Variable("b", "2"), None))
+        self.cache.apply("project", Operation(DELETE_ACTION, Variable("a", "1"), Variable("a", "1")))
+        self.assertEqual({("b", "*"): Variable("b", "2")}, self.cache.get("project"))
+
+    def test_apply_when_not_cached(self):
+        self.cache.apply("project", Operation(CREATE_ACTION, Variable("b", "2"), None))
+        self.assertIsNone(self.cache.get("project"))
+
+    def test_invalidate(self):
+        self.cache.set("project", {})
+        self.cache.invalidate("project")
+        self.assertIsNone(self.cache.get("project"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from gitlabbuildvariables.backends import InMemoryBackend
+from gitlabbuildvariables.effective import EffectiveVariablesResolver, get_namespaces
+from gitlabbuildvariables.models import Variable, to_variables
+
+
+class _CountingBackend(InMemoryBackend):
+    """
+    In-memory backend that counts the times that each group's variables are listed.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.group_listings = {}
+
+    def list_group_variables(self, group: str):
+        with self._lock:
+            self.group_listings[group] = self.group_listings.get(group, 0) + 1
+        return super().list_group_variables(group)
+
+    def get_project_path(self, project: str) -> str:
+        return {"42": "a/b/project"}.get(project, project)
+
+
+class TestGetNamespaces(unittest.TestCase):
+    """
+    Tests for `get_namespaces`.
+    """
+    def test_get_namespaces(self):
+        self.assertEqual(["a", "a/b"], get_namespaces("a/b/project"))
+
+    def test_get_namespaces_of_unnamespaced(self):
+        self.assertEqual([], get_namespaces("project"))
+
+
+class TestEffectiveVariablesResolver(unittest.TestCase):
+    """
+    Tests for `EffectiveVariablesResolver`.
+    """
+    def setUp(self):
+        self.backend = _CountingBackend(groups_variables={
+            "a": [Variable("A", "a"), Variable("B", "a"), Variable("C", "a", "production")],
+            "a/b": {"B": "b", "C": "b"}
+        })
+        self.resolver = EffectiveVariablesResolver(self.backend)
+
+    def test_resolve(self):
+        variables = self.resolver.resolve("a/b/project", to_variables({"C": "project"}).values())
+        self.assertEqual(to_variables([Variable("A", "a"), Variable("B", "b"), Variable("C", "project"),
+                                       Variable("C", "a", "production")]), variables)
+
+    def test_resolve_when_not_in_group(self):
+        self.assertEqual(to_variables({"A": "project"}),
+                         self.resolver.resolve("user/project", to_variables({"A": "project"}).values()))
+
+    def test_resolve_by_id(self):
+        self.assertEqual(self.resolver.resolve("a/b/project", ()), self.resolver.resolve("42", ()))
+
+    def test_group_variables_fetched_once(self):
+        projects = ["a/b/project-%d" % i for i in range(50)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda project: self.resolver.resolve(project, ()), projects))
+        self.assertEqual({"a": 1, "a/b": 1}, self.backend.group_listings)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import stat
+import tempfile
+import unittest
+
+from gitlabbuildvariables.backends import InMemoryBackend
+from gitlabbuildvariables.common import ApplyConfig
+from gitlabbuildvariables.index import VariablesIndex, get_default_index_location
+from gitlabbuildvariables.manager import ProjectVariablesManager
+from gitlabbuildvariables.models import Variable, value_digest
+
+
+class _ListCountingBackend(InMemoryBackend):
+    """
+    In-memory backend that records the projects whose variables are listed, and that cannot list those of "broken/d".
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listed = []
+
+    def list_variables(self, project: str):
+        if project == "broken/d":
+            raise IOError("Forbidden")
+        self.listed.append(project)
+        return super().list_variables(project)
+
+
+class TestVariablesIndex(unittest.TestCase):
+    """
+    Tests for `VariablesIndex`.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self._temp_directory.name, "index", "index.json")
+        self.backend = _ListCountingBackend({
+            "team/a": [Variable("TOKEN", "secret"), Variable("TOKEN", "other", "production")],
+            "team/b": {"HOST": "example.com"},
+            "other/c": {"PASSWORD": "secret"}
+        })
+        self.index = VariablesIndex(self.location, "https://gitlab.example.com")
+        self.index.refresh(self.backend, max_concurrency=2)
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def test_find_key(self):
+        self.assertEqual({"team/a": [("TOKEN", "*"), ("TOKEN", "production")]}, self.index.find_key("TOKEN"))
+        self.assertEqual({}, self.index.find_key("MISSING"))
+
+    def test_find_value(self):
+        self.assertEqual({"other/c": [("PASSWORD", "*")], "team/a": [("TOKEN", "*")]}, self.index.find_value("secret"))
+        self.assertEqual(self.index.find_value("secret"), self.index.find_digest(value_digest("secret")))
+
+    def test_save_and_load(self):
+        self.index.save()
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.location).st_mode))
+        with open(self.location, "r") as file:
+            self.assertNotIn("secret", file.read())
+        index = VariablesIndex(self.location)
+        index.load()
+        self.assertEqual(["other/c", "team/a", "team/b"], index.projects)
+        self.assertEqual(self.index.find_value("secret"), index.find_value("secret"))
+
+    def test_load_of_other_url(self):
+        self.index.save()
+        self.assertRaises(ValueError, VariablesIndex(self.location, "https://other.example.com").load)
+        index = VariablesIndex(self.location)
+        index.load()
+        self.assertEqual("https://gitlab.example.com", index.url)
+
+    def test_get_default_index_location(self):
+        location = get_default_index_location("https://gitlab.example.com")
+        self.assertEqual(location, get_default_index_location("https://gitlab.example.com"))
+        self.assertNotEqual(location, get_default_index_location("https://other.example.com"))
+
+    def test_load_when_not_exists(self):
+        index = VariablesIndex(os.path.join(self._temp_directory.name, "missing.json"))
+        index.load()
+        self.assertEqual([], index.projects)
+
+    def test_refresh(self):
+        self.backend.update_variable("other/c", Variable("PASSWORD", "rotated"))
+        self.backend.delete_variable("team/b", Variable("HOST", "example.com"))
+        self.backend.create_variable("team/e", Variable("HOST", "example.com"))
+        refresh = self.index.refresh(self.backend)
+        self.assertEqual((4, 0), (len(refresh.listed), len(refresh.unchanged)))
+        self.assertEqual({"team/a": [("TOKEN", "*")]}, self.index.find_value("secret"))
+        self.assertEqual({"team/e": [("HOST", "*")]}, self.index.find_key("HOST"))
+
+    def test_refresh_removes_projects(self):
+        self.backend = _ListCountingBackend({"team/a": {"TOKEN": "secret"}})
+        refresh = self.index.refresh(self.backend)
+        self.assertEqual(["other/c", "team/b"], sorted(refresh.removed))
+        self.assertEqual({"team/a": [("TOKEN", "*")]}, self.index.find_value("secret"))
+        self.assertEqual({}, self.index.find_key("PASSWORD"))
+
+    def test_refresh_skips_projects_with_unchanged_fingerprints(self):
+        manager = ProjectVariablesManager(None, "team/b", ApplyConfig(fingerprint=True), backend=self.backend)
+        manager.set({"HOST": "example.com"})
+        self.index.refresh(self.backend)
+        self.backend.listed.clear()
+
+        refresh = self.index.refresh(self.backend)
+        self.assertEqual(["team/b"], refresh.unchanged)
+        self.assertNotIn("team/b", self.backend.listed)
+
+        manager.set({"HOST": "new.example.com"})
+        self.assertEqual(["team/b"], self.index.refresh(self.backend).listed[-1:])
+        self.assertEqual({"team/b": [("HOST", "*")]}, self.index.find_value("new.example.com"))
+        self.assertEqual({}, self.index.find_key("GITLAB_BUILD_VARIABLES_FINGERPRINT"))
+
+    def test_refresh_lists_projects_older_than_max_age(self):
+        ProjectVariablesManager(None, "team/b", ApplyConfig(fingerprint=True), backend=self.backend).set({"A": "1"})
+        self.index.refresh(self.backend)
+        self.backend.update_variable("team/b", Variable("A", "edited"))
+        self.assertEqual(["team/b"], self.index.refresh(self.backend).unchanged)
+        self.assertEqual([], self.index.refresh(self.backend, max_age=0).unchanged)
+        self.assertEqual({"team/b": [("A", "*")]}, self.index.find_value("edited"))
+
+    def test_refresh_after_set_without_fingerprint(self):
+        ProjectVariablesManager(None, "team/b", ApplyConfig(fingerprint=True), backend=self.backend).set({"A": "1"})
+        self.index.refresh(self.backend)
+        ProjectVariablesManager(None, "team/b", backend=self.backend).set({"A": "2"})
+        self.assertEqual([], self.index.refresh(self.backend).unchanged)
+        self.assertEqual({"team/b": [("A", "*")]}, self.index.find_value("2"))
+
+    def test_full_refresh(self):
+        ProjectVariablesManager(None, "team/b", ApplyConfig(fingerprint=True), backend=self.backend).set({"A": "1"})
+        self.index.refresh(self.backend)
+        self.assertEqual([], self.index.refresh(self.backend, full=True).unchanged)
+
+    def test_refresh_when_project_fails(self):
+        self.backend.create_variable("broken/d", Variable("TOKEN", "secret"))
+        refresh = self.index.refresh(self.backend)
+        self.assertEqual(["broken/d"], refresh.failed)
+        self.assertNotIn("broken/d", self.index.projects)
+        self.assertEqual(3, len(refresh.listed))
+
+
+if __name__ == "__main__":
+    unittest.main()
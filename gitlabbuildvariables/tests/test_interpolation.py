@@ -0,0 +1,61 @@
+import unittest
+
+from gitlabbuildvariables.interpolation import interpolate, compile_template, InterpolationError
+from gitlabbuildvariables.models import Variable, to_variables
+
+
+class TestCompileTemplate(unittest.TestCase):
+    """
+    Tests for `compile_template`.
+    """
+    def test_compile_without_references(self):
+        self.assertIsNone(compile_template("value $HOME"))
+
+    def test_compile(self):
+        self.assertEqual(("https://", ("HOST", ), "/", ("PATH", )), compile_template("https://${HOST}/${PATH}"))
+
+    def test_compile_escaped(self):
+        self.assertEqual(("${HOST}", ("PATH", )), compile_template("$${HOST}${PATH}"))
+
+
+class TestInterpolate(unittest.TestCase):
+    """
+    Tests for `interpolate`.
+    """
+    def test_interpolate_without_references(self):
+        variables = to_variables({"a": "1", "b": "2"})
+        self.assertIs(variables, interpolate(variables))
+
+    def test_interpolate(self):
+        variables = to_variables({"URL": "https://${HOST}/${BUCKET}", "HOST": "${DOMAIN}:443", "DOMAIN": "example.com",
+                                  "BUCKET": "data"})
+        interpolated = interpolate(variables)
+        self.assertEqual("https://example.com:443/data", interpolated[("URL", "*")].value)
+        self.assertEqual("example.com:443", interpolated[("HOST", "*")].value)
+        self.assertIs(variables[("DOMAIN", "*")], interpolated[("DOMAIN", "*")])
+
+    def test_interpolate_keeps_attributes(self):
+        variables = to_variables([Variable("a", "${b}", protected=True, masked=True), Variable("b", "1")])
+        self.assertEqual(Variable("a", "1", protected=True, masked=True), interpolate(variables)[("a", "*")])
+
+    def test_interpolate_prefers_same_scope(self):
+        variables = to_variables([Variable("a", "${b}"), Variable("a", "${b}${c}", "production"), Variable("b", "1"),
+                                  Variable("b", "2", "production"), Variable("c", "3"),
+                                  Variable("d", "${b}", "staging")])
+        interpolated = interpolate(variables)
+        self.assertEqual("1", interpolated[("a", "*")].value)
+        self.assertEqual("23", interpolated[("a", "production")].value)
+        self.assertEqual("1", interpolated[("d", "staging")].value)
+
+    def test_interpolate_unknown_and_escaped(self):
+        variables = to_variables({"a": "${CI_PROJECT_NAME}-${b}-$${b}", "b": "1"})
+        self.assertEqual("${CI_PROJECT_NAME}-1-${b}", interpolate(variables)[("a", "*")].value)
+
+    def test_interpolate_cycle(self):
+        variables = to_variables({"a": "${b}", "b": "x${c}", "c": "${a}", "d": "${d}"})
+        self.assertRaises(InterpolationError, interpolate, variables)
+        self.assertRaises(InterpolationError, interpolate, to_variables({"d": "${d}"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+import os
+import stat
+import tempfile
+import unittest
+
+from gitlabbuildvariables.backends import InMemoryBackend
+from gitlabbuildvariables.common import ApplyConfig
+from gitlabbuildvariables.journal import ApplyJournal, RunCheckpoint, Operation, CREATE_ACTION, UPDATE_ACTION, \
+    DELETE_ACTION
+from gitlabbuildvariables.manager import ProjectVariablesManager
+from gitlabbuildvariables.models import Variable, to_variables
+
+_OPERATIONS = [
+    Operation(DELETE_ACTION, Variable("a", "1"), Variable("a", "1")),
+    Operation(UPDATE_ACTION, Variable("b", "2", protected=True), Variable("b", "1")),
+    Operation(CREATE_ACTION, Variable("c", "3", environment_scope="production"), None)
+]
+
+
+class TestApplyJournal(unittest.TestCase):
+    """
+    Tests for `ApplyJournal`.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.journal = ApplyJournal(ApplyJournal.location_for(self._temp_directory.name, "group/project"))
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def test_location_for(self):
+        self.assertEqual(self._temp_directory.name, os.path.dirname(self.journal.location))
+
+    def test_begin(self):
+        self.journal.begin("group/project", _OPERATIONS)
+        self.assertTrue(self.journal.exists())
+
+    def test_only_readable_by_owner(self):
+        self.journal.begin("group/project", _OPERATIONS)
+        self.journal.record_completed(0)
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.journal.location).st_mode))
+
+    def test_load(self):
+        self.journal.begin("group/project", _OPERATIONS)
+        self.journal.record_completed(1)
+        loaded = ApplyJournal(self.journal.location)
+        loaded.load()
+        self.assertEqual({1}, loaded.completed)
+        self.assertEqual([(operation.action, operation.variable, operation.prior) for operation in _OPERATIONS],
+                         [(operation.action, operation.variable, operation.prior) for operation in loaded.operations])
+
+    def test_outstanding(self):
+        self.journal.begin("group/project", _OPERATIONS)
+        self.journal.record_completed(0)
+        self.journal.record_completed(2)
+        self.assertEqual([_OPERATIONS[1]], self.journal.outstanding())
+
+    def test_load_with_torn_write(self):
+        self.journal.begin("group/project", _OPERATIONS)
+        self.journal.record_completed(0)
+        with open(self.journal.location, "a") as file:
+            file.write("{\"compl")
+        loaded = ApplyJournal(self.journal.location)
+        loaded.load()
+        self.assertEqual({0}, loaded.completed)
+
+    def test_load_when_rolling_back(self):
+        self.journal.begin("group/project", _OPERATIONS)
+        self.journal.record_completed(0)
+        self.journal.record_rolling_back()
+        loaded = ApplyJournal(self.journal.location)
+        loaded.load()
+        self.assertEqual(({0}, True), (loaded.completed, loaded.rolling_back))
+
+    def test_finish(self):
+        self.journal.begin("group/project", _OPERATIONS)
+        self.journal.finish()
+        self.assertFalse(self.journal.exists())
+
+
+class _FailingBackend(InMemoryBackend):
+    """
+    In-memory backend that fails to create, update or delete variables with the given values.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failing_values = set()
+
+    def _check(self, variable: Variable):
+        if variable.value in self.failing_values:
+            raise IOError("Failed to change %s" % variable.key)
+
+    def create_variable(self, project: str, variable: Variable):
+        self._check(variable)
+        super().create_variable(project, variable)
+
+    def update_variable(self, project: str, variable: Variable):
+        self._check(variable)
+        super().update_variable(project, variable)
+
+    def delete_variable(self, project: str, variable: Variable):
+        self._check(variable)
+        super().delete_variable(project, variable)
+
+
+class TestProjectVariablesManagerRecovery(unittest.TestCase):
+    """
+    Tests for how `ProjectVariablesManager` rolls back failed applies and recovers those that were interrupted.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.backend = _FailingBackend({"group/project": {"a": "1", "b": "2"}})
+        self.journal = ApplyJournal(ApplyJournal.location_for(self._temp_directory.name, "group/project"))
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def _create_manager(self, **apply_config) -> ProjectVariablesManager:
+        return ProjectVariablesManager(None, "group/project", ApplyConfig(
+            max_concurrency=1, journal_directory=self._temp_directory.name, **apply_config), backend=self.backend)
+
+    def _get_variables(self):
+        return to_variables(self.backend.list_variables("group/project"))
+
+    def test_rollback(self):
+        self.backend.failing_values.add("4")
+        self.assertRaises(IOError, self._create_manager().set, {"a": "3", "c": "4"})
+        self.assertEqual(to_variables({"a": "1", "b": "2"}), self._get_variables())
+        self.assertFalse(self.journal.exists())
+
+    def test_interrupted_rollback_is_not_resumed(self):
+        self.backend.failing_values.update({"2", "4"})
+        self.assertRaises(IOError, self._create_manager().set, {"a": "1", "b": "3", "c": "4"})
+        self.assertTrue(self.journal.exists())
+        self.assertEqual(to_variables({"a": "1", "b": "3"}), self._get_variables())
+        self.backend.failing_values.clear()
+        self._create_manager(resume=True).remove(["unknown"])
+        self.assertEqual(to_variables({"a": "1", "b": "2"}), self._get_variables())
+        self.assertFalse(self.journal.exists())
+
+    def test_failed_rollback_raises_original_error(self):
+        self.backend.failing_values.update({"2", "4"})
+        with self.assertRaisesRegex(IOError, "change c") as context:
+            self._create_manager().set({"a": "1", "b": "3", "c": "4"})
+        self.assertRegex(str(context.exception.__cause__), "change b")
+
+    def test_resume(self):
+        self.backend.failing_values.add("4")
+        self.assertRaises(IOError, self._create_manager(rollback_on_failure=False).set, {"a": "3", "c": "4"})
+        self.assertTrue(self.journal.exists())
+        self.assertRaises(ValueError, self._create_manager().set, {"a": "3", "c": "4"})
+        self.backend.failing_values.clear()
+        self._create_manager(resume=True).remove(["unknown"])
+        self.assertEqual(to_variables({"a": "3", "c": "4"}), self._get_variables())
+        self.assertFalse(self.journal.exists())
+
+
+class TestRunCheckpoint(unittest.TestCase):
+    """
+    Tests for `RunCheckpoint`.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.checkpoint = RunCheckpoint(RunCheckpoint.location_for(self._temp_directory.name, "/config.json#1/2"))
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def test_location_for(self):
+        self.assertEqual(self._temp_directory.name, os.path.dirname(self.checkpoint.location))
+
+    def test_load(self):
+        self.checkpoint.record_completed("group/a", "1")
+        self.checkpoint.record_completed("group/b", "2")
+        with open(self.checkpoint.location, "a") as file:
+            file.write("{\"proj")
+        loaded = RunCheckpoint(self.checkpoint.location)
+        loaded.load()
+        self.assertTrue(loaded.is_completed("group/a", "1"))
+        self.assertFalse(loaded.is_completed("group/b", "3"))
+        self.assertFalse(loaded.is_completed("group/c", "1"))
+
+    def test_only_readable_by_owner(self):
+        self.checkpoint.record_completed("group/a", "1")
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.checkpoint.location).st_mode))
+
+    def test_finish(self):
+        self.checkpoint.record_completed("group/a", "1")
+        self.checkpoint.finish()
+        self.assertFalse(self.checkpoint.exists())
+        self.assertFalse(self.checkpoint.is_completed("group/a", "1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 
+from gitlabbuildvariables.models import Variable
 from gitlabbuildvariables.tests._common import EXAMPLE_VARIABLES_1, EXAMPLE_VARIABLES_2, \
     add_variables_to_project, convert_projects_variables_to_dicts, TestWithGitLabProject
 
@@ -63,6 +64,19 @@ class TestProjectVariablesManager(TestWithGitLabProject):
         self.assertEqual(updated_variables,
                          convert_projects_variables_to_dicts(self.project.variables.list()))
 
+    def test_set_with_scopes(self):
+        variables = [Variable("a", "1"), Variable("a", "2", environment_scope="production", protected=True)]
+        self.manager.set(variables)
+        self.assertEqual({variable.identifier: variable for variable in variables}, self.manager.get_variables())
+
+    def test_set_attributes_only(self):
+        add_variables_to_project(EXAMPLE_VARIABLES_1, self.project)
+        key, value = list(EXAMPLE_VARIABLES_1.items())[0]
+        changes = self.manager.set({**EXAMPLE_VARIABLES_1, key: Variable(key, value, protected=True)})
+        self.assertEqual(([], [], [Variable(key, value, protected=True)]),
+                         (changes.added, changes.removed, changes.changed))
+        self.assertTrue(self.manager.get_variables()[(key, "*")].protected)
+
     def test_add_no_overwrite(self):
         add_variables_to_project(EXAMPLE_VARIABLES_1, self.project)
         variables = {**EXAMPLE_VARIABLES_2, list(EXAMPLE_VARIABLES_1.keys())[0]: "this_value_should_not_be_set"}
@@ -77,6 +91,13 @@ class TestProjectVariablesManager(TestWithGitLabProject):
         self.assertEqual({**EXAMPLE_VARIABLES_1, **variables},
                          convert_projects_variables_to_dicts(self.project.variables.list()))
 
+    def test_get_after_set_uses_cache(self):
+        self.manager.set(EXAMPLE_VARIABLES_1)
+        add_variables_to_project(EXAMPLE_VARIABLES_2, self.project)
+        self.assertEqual(EXAMPLE_VARIABLES_1, self.manager.get())
+        self.manager.refresh()
+        self.assertEqual({**EXAMPLE_VARIABLES_1, **EXAMPLE_VARIABLES_2}, self.manager.get())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from gitlabbuildvariables.models import Variable, diff_variables, to_variables, to_key_values, value_digest, \
+    digest_variables
+
+
+class TestVariable(unittest.TestCase):
+    """
+    Tests for `Variable`.
+    """
+    def test_equal(self):
+        self.assertEqual(Variable("a", "1", protected=True), Variable("a", "1", protected=True))
+
+    def test_not_equal_when_attributes_differ(self):
+        self.assertNotEqual(Variable("a", "1"), Variable("a", "1", masked=True))
+        self.assertNotEqual(Variable("a", "1"), Variable("a", "1", environment_scope="production"))
+
+    def test_equal_to_digest_only(self):
+        variable = Variable("a", "1")
+        digest_only = variable.without_value()
+        self.assertIsNone(digest_only.value)
+        self.assertEqual(value_digest("1"), digest_only.digest)
+        self.assertEqual(variable, digest_only)
+        self.assertNotEqual(Variable("a", "2"), digest_only)
+
+    def test_requires_value_or_digest(self):
+        self.assertRaises(ValueError, Variable, "a", None)
+
+
+class TestFileValueVariable(unittest.TestCase):
+    """
+    Tests for `Variable` with a value in a file.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self._temp_directory.name, "value")
+        self._write("x" * 100000)
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def _write(self, value: str):
+        with open(self.location, "w") as file:
+            file.write(value)
+
+    def test_equal_to_same_value(self):
+        variable = Variable("a", None, value_location=self.location)
+        self.assertEqual(Variable("a", "x" * 100000), variable)
+        self.assertEqual(Variable("a", "x" * 100000).without_value(), variable)
+        self.assertNotEqual(Variable("a", "y"), variable)
+
+    def test_digest_follows_file(self):
+        variable = Variable("a", None, value_location=self.location)
+        self.assertEqual(value_digest("x" * 100000), variable.digest)
+        self._write("y")
+        os.utime(self.location, ns=(0, 0))
+        self.assertEqual(value_digest("y"), variable.digest)
+
+    def test_summarised(self):
+        self.assertEqual({"a": "<sha256:%s>" % value_digest("x" * 100000), "b": "1"}, to_key_values(
+            [Variable("a", None, value_location=self.location), Variable("b", "1")], summarise=True))
+
+
+class TestDiffVariables(unittest.TestCase):
+    """
+    Tests for `diff_variables`.
+    """
+    def test_diff(self):
+        current = [Variable("a", "1"), Variable("b", "2"), Variable("c", "3"), Variable("c", "4", "production")]
+        target = to_variables([Variable("a", "1"), Variable("b", "2", protected=True), Variable("c", "3"),
+                               Variable("d", "5")])
+        changes = diff_variables(target, iter(current))
+        self.assertEqual([Variable("d", "5")], changes.added)
+        self.assertEqual([Variable("b", "2", protected=True)], changes.changed)
+        self.assertEqual([Variable("c", "4", "production")], changes.removed)
+        self.assertEqual({("b", "*"): Variable("b", "2")}, changes.previous)
+
+    def test_diff_when_same(self):
+        variables = [Variable("a", "1"), Variable("a", "2", "production")]
+        self.assertEqual(0, len(diff_variables(to_variables(variables), variables)))
+
+
+class TestToKeyValues(unittest.TestCase):
+    """
+    Tests for `to_key_values`.
+    """
+    def test_prefers_default_scope(self):
+        variables = [Variable("a", "1", "production"), Variable("a", "2"), Variable("a", "3", "staging")]
+        self.assertEqual({"a": "2"}, to_key_values(variables))
+
+
+class TestDigestVariables(unittest.TestCase):
+    """
+    Tests for `digest_variables`.
+    """
+    def test_independent_of_order(self):
+        variables = [Variable("a", "1"), Variable("a", "2", "production"), Variable("b", "3")]
+        self.assertEqual(digest_variables(variables), digest_variables(reversed(variables)))
+
+    def test_changes_with_variables(self):
+        self.assertNotEqual(digest_variables([Variable("a", "1")]), digest_variables([Variable("a", "2")]))
+        self.assertNotEqual(digest_variables([Variable("a", "1")]),
+                            digest_variables([Variable("a", "1", protected=True)]))
+
+
+if __name__ == "__main__":
+    unittest.main()
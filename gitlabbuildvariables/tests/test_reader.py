@@ -0,0 +1,141 @@
+import json
+import os
+import tempfile
+import unittest
+
+from gitlabbuildvariables.models import Variable, FILE_VARIABLE_TYPE
+from gitlabbuildvariables.reader import read_variables, read_scoped_variables
+
+_EXAMPLE_VARIABLES = {"thisKey": "thatValue", "otherKey": "otherValue"}
+
+
+def _read_scoped_variables_from_string(contents: str):
+    """
+    Reads scoped variables from a file with the given contents.
+    :param contents: the contents of the file to read
+    :return: see `read_scoped_variables`
+    """
+    with tempfile.NamedTemporaryFile("w+") as file:
+        file.write(contents)
+        file.flush()
+        return read_scoped_variables(file.name)
+
+
+class TestReadVariables(unittest.TestCase):
+    """
+    Tests for `read_variables` and `read_scoped_variables`.
+    """
+    def test_read_json(self):
+        with tempfile.NamedTemporaryFile("w+") as file:
+            file.write(json.dumps(_EXAMPLE_VARIABLES))
+            file.flush()
+            self.assertEqual(_EXAMPLE_VARIABLES, read_variables(file.name))
+
+    def test_read_json_with_attributes(self):
+        variables = _read_scoped_variables_from_string(json.dumps({
+            "a": "1",
+            "b": {"value": "2", "protected": True, "variable_type": FILE_VARIABLE_TYPE},
+            "c": [{"value": "3"}, {"value": "4", "environment_scope": "production", "masked": True}]
+        }))
+        self.assertEqual({
+            ("a", "*"): Variable("a", "1"),
+            ("b", "*"): Variable("b", "2", protected=True, variable_type=FILE_VARIABLE_TYPE),
+            ("c", "*"): Variable("c", "3"),
+            ("c", "production"): Variable("c", "4", environment_scope="production", masked=True)
+        }, variables)
+
+    def test_read_json_with_non_string_values(self):
+        variables = _read_scoped_variables_from_string(json.dumps({
+            "a": True, "b": {"value": False}, "c": 1, "d": 1.5, "e": None}))
+        self.assertEqual({"a": "true", "b": "false", "c": "1", "d": "1.5", "e": "null"},
+                         {key: variable.value for (key, _), variable in variables.items()})
+
+    def test_read_json_with_list_values(self):
+        variables = _read_scoped_variables_from_string(json.dumps({
+            "a": [1, 2], "b": ["x", {"value": "y"}], "c": [{"other": "z"}], "d": []}))
+        self.assertEqual({"a": "[\"1\", \"2\"]", "b": "[\"x\", {\"value\": \"y\"}]", "c": "[{\"other\": \"z\"}]",
+                          "d": "[]"},
+                         {key: variable.value for (key, _), variable in variables.items()})
+
+    def test_read_json_with_malformed_definition(self):
+        with self.assertRaisesRegex(ValueError, "\"a\""):
+            _read_scoped_variables_from_string(json.dumps({"a": {"x": 1}}))
+
+    def test_read_json_array(self):
+        self.assertRaises(ValueError, _read_scoped_variables_from_string, json.dumps([{"a": "1"}]))
+
+    def test_read_ini_with_attribute_sections(self):
+        variables = _read_scoped_variables_from_string(
+            "a=1\n[gitlab: scope:production protected]\na=2\n[gitlab: type:file]\nb=3\n[other]\nc=4\n")
+        self.assertEqual({
+            ("a", "*"): Variable("a", "1"),
+            ("a", "production"): Variable("a", "2", environment_scope="production", protected=True),
+            ("b", "*"): Variable("b", "3", variable_type=FILE_VARIABLE_TYPE),
+            ("c", "*"): Variable("c", "4")
+        }, variables)
+
+    def test_read_ini_with_sections_named_like_attributes(self):
+        variables = _read_scoped_variables_from_string("[protected]\na=1\n[masked]\nb=2\n[scope:production]\nc=3\n")
+        self.assertEqual({
+            ("a", "*"): Variable("a", "1"),
+            ("b", "*"): Variable("b", "2"),
+            ("c", "*"): Variable("c", "3")
+        }, variables)
+
+    def test_read_ini_with_unrecognised_attribute(self):
+        self.assertRaises(ValueError, _read_scoped_variables_from_string, "[gitlab: protected secret]\na=1\n")
+
+    def test_read_shell_with_attribute_directives(self):
+        variables = _read_scoped_variables_from_string(
+            "#!/usr/bin/env bash\nexport a=1\n# gitlab: scope:staging masked\nexport a=2\nexport b=3\n")
+        self.assertEqual({
+            ("a", "*"): Variable("a", "1"),
+            ("a", "staging"): Variable("a", "2", environment_scope="staging", masked=True),
+            ("b", "*"): Variable("b", "3")
+        }, variables)
+
+    def test_read_variables_prefers_default_scope(self):
+        with tempfile.NamedTemporaryFile("w+") as file:
+            file.write(json.dumps({"a": [{"value": "1", "environment_scope": "production"}, {"value": "2"}]}))
+            file.flush()
+            self.assertEqual({"a": "2"}, read_variables(file.name))
+
+
+class TestReadFileValues(unittest.TestCase):
+    """
+    Tests for reading variables with values in files.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.value_location = os.path.join(self._temp_directory.name, "certificate.pem")
+        with open(self.value_location, "w", newline="") as file:
+            file.write("-----BEGIN CERTIFICATE-----\r\nabc\n")
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def _read(self, contents: str):
+        location = os.path.join(self._temp_directory.name, "settings")
+        with open(location, "w") as file:
+            file.write(contents)
+        return read_scoped_variables(location)
+
+    def test_read_json(self):
+        variable = self._read(json.dumps({"a": {"file": "certificate.pem", "variable_type": FILE_VARIABLE_TYPE}}))[
+            ("a", "*")]
+        self.assertEqual(self.value_location, variable.value_location)
+        self.assertEqual("-----BEGIN CERTIFICATE-----\r\nabc\n", variable.value)
+        self.assertEqual(FILE_VARIABLE_TYPE, variable.variable_type)
+
+    def test_read_shell(self):
+        variables = self._read("# gitlab: from-file protected\nexport a=certificate.pem\nexport b=1\n")
+        self.assertEqual(Variable("a", "-----BEGIN CERTIFICATE-----\r\nabc\n", protected=True), variables[("a", "*")])
+        self.assertEqual(self.value_location, variables[("a", "*")].value_location)
+        self.assertIsNone(variables[("b", "*")].value_location)
+
+    def test_read_when_file_missing(self):
+        self.assertRaises(ValueError, self._read, json.dumps({"a": {"file": "missing.pem"}}))
+
+
+if __name__ == "__main__":
+    unittest.main()
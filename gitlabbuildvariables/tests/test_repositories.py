@@ -0,0 +1,126 @@
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+
+from gitlabbuildvariables.models import to_variables, Variable
+from gitlabbuildvariables.repositories import GitSettingsRepository, DirectorySettingsRepository, \
+    get_settings_repository, close_settings_repositories, forget_settings_repositories
+
+_SETTINGS = {
+    "common.json": json.dumps({"a": "1", "b": {"value": "2", "protected": True}}),
+    "team/s3.sh": "export c=3\n"
+}
+
+
+def _git(git_directory: str, *arguments: str, input: bytes=None, environment: dict=None) -> str:
+    """
+    Runs the given git command against the given git directory.
+    :return: the output of the command
+    """
+    return subprocess.run(["git", "--git-dir", git_directory] + list(arguments), input=input, env=environment,
+                          check=True, stdout=subprocess.PIPE).stdout.decode().strip()
+
+
+def _commit(git_directory: str, files: dict, parent: str=None) -> str:
+    """
+    Commits the given files (paths mapped to contents) to the given bare repository, without a working tree.
+    :return: the SHA of the commit
+    """
+    environment = dict(os.environ, GIT_INDEX_FILE=os.path.join(git_directory, "test-index"),
+                       GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+                       GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+    for path, contents in files.items():
+        blob = _git(git_directory, "hash-object", "-w", "--stdin", input=contents.encode())
+        _git(git_directory, "update-index", "--add", "--cacheinfo", "100644,%s,%s" % (blob, path),
+             environment=environment)
+    tree = _git(git_directory, "write-tree", environment=environment)
+    parents = ["-p", parent] if parent is not None else []
+    return _git(git_directory, "commit-tree", tree, "-m", "settings", *parents, environment=environment)
+
+
+class TestGitSettingsRepository(unittest.TestCase):
+    """
+    Tests for `GitSettingsRepository`.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.git_directory = os.path.join(self._temp_directory.name, "settings.git")
+        self.cache_directory = os.path.join(self._temp_directory.name, "cache")
+        subprocess.run(["git", "init", "-q", "--bare", self.git_directory], check=True)
+        self.commit = _commit(self.git_directory, _SETTINGS)
+        self.repository = GitSettingsRepository(self.git_directory, self.commit, self.cache_directory)
+
+    def tearDown(self):
+        self.repository.close()
+        self._temp_directory.cleanup()
+
+    def test_contains(self):
+        self.assertTrue(self.repository.contains("common.json"))
+        self.assertTrue(self.repository.contains("./team/s3.sh"))
+        self.assertFalse(self.repository.contains("common"))
+        self.assertFalse(self.repository.contains("team"))
+
+    def test_read(self):
+        self.assertEqual(to_variables([Variable("a", "1"), Variable("b", "2", protected=True)]),
+                         self.repository.read("common.json"))
+        self.assertEqual(to_variables({"c": "3"}), self.repository.read("team/s3.sh"))
+
+    def test_read_from_cache(self):
+        self.repository.read("common.json")
+        cached = GitSettingsRepository(self.git_directory, self.commit, self.cache_directory)
+        cached._read_blob = None
+        self.assertEqual(self.repository.read("common.json"), cached.read("common.json"))
+
+    def test_read_at_ref(self):
+        later = _commit(self.git_directory, {"common.json": json.dumps({"a": "changed"})}, self.commit)
+        with GitSettingsRepository(self.git_directory, later) as repository:
+            self.assertEqual(to_variables({"a": "changed"}), repository.read("common.json"))
+        self.assertEqual("1", self.repository.read("common.json")[("a", "*")].value)
+
+    def test_close(self):
+        self.repository.read("common.json")
+        cat_file = self.repository._cat_file
+        self.repository.close()
+        self.assertIsNotNone(cat_file.poll())
+        self.assertIsNone(self.repository._cat_file)
+        self.assertEqual(to_variables({"c": "3"}), self.repository.read("team/s3.sh"))
+
+    def test_read_relative_value_file(self):
+        commit = _commit(self.git_directory, {"files.json": json.dumps({"a": {"file": "a.pem"}})}, self.commit)
+        with GitSettingsRepository(self.git_directory, commit) as repository:
+            self.assertRaises(ValueError, repository.read, "files.json")
+
+    def test_invalid_ref(self):
+        self.assertRaises(ValueError, GitSettingsRepository(self.git_directory, "missing").contains, "common.json")
+
+
+class TestGetSettingsRepository(unittest.TestCase):
+    """
+    Tests for `get_settings_repository`.
+    """
+    def test_directory(self):
+        repository = get_settings_repository("/settings")
+        self.assertIsInstance(repository, DirectorySettingsRepository)
+        self.assertIs(repository, get_settings_repository("/settings"))
+
+    def test_git(self):
+        repository = get_settings_repository("git:/settings.git#production")
+        self.assertIsInstance(repository, GitSettingsRepository)
+        self.assertEqual(("/settings.git", "production"), (repository.git_directory, repository.ref))
+        self.assertEqual("HEAD", get_settings_repository("git:/settings.git").ref)
+
+    def test_close_settings_repositories(self):
+        repository = get_settings_repository("/settings")
+        close_settings_repositories()
+        self.assertIsNot(repository, get_settings_repository("/settings"))
+
+    def test_forget_settings_repositories(self):
+        repository = get_settings_repository("/settings")
+        forget_settings_repositories()
+        self.assertIsNot(repository, get_settings_repository("/settings"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import tempfile
+import time
+import unittest
+
+from gitlabbuildvariables.tracing import Tracer, PROJECT_CATEGORY, STAGE_CATEGORY
+
+
+class TestTracer(unittest.TestCase):
+    """
+    Tests for `Tracer`.
+    """
+    def setUp(self):
+        self.tracer = Tracer()
+        self.tracer.enabled = True
+
+    def test_span_when_disabled(self):
+        self.tracer.enabled = False
+        with self.tracer.span("project", PROJECT_CATEGORY):
+            pass
+        self.assertEqual([], self.tracer.summarise())
+
+    def test_nested_spans(self):
+        with self.tracer.span("group/project", PROJECT_CATEGORY):
+            with self.tracer.span("list", project="group/project"):
+                pass
+            with self.tracer.span("list", project="group/project"):
+                pass
+        summary = {(category, name): count for category, name, count, _ in self.tracer.summarise()}
+        self.assertEqual({(PROJECT_CATEGORY, "group/project"): 1, (STAGE_CATEGORY, "list"): 2}, summary)
+        self.assertEqual((PROJECT_CATEGORY, "group/project"), self.tracer.summarise()[0][:2])
+
+    def test_iterate(self):
+        def slowly(items):
+            for item in items:
+                time.sleep(0.01)
+                yield item
+
+        items = []
+        for item in self.tracer.iterate(slowly([1, 2]), "list", project="group/project"):
+            time.sleep(0.1)
+            items.append(item)
+        self.assertEqual([1, 2], items)
+        _, name, count, duration = self.tracer.summarise()[0]
+        self.assertEqual(("list", 1), (name, count))
+        self.assertLess(duration, 0.1)
+
+    def test_write(self):
+        with self.tracer.span("list", project="group/project"):
+            pass
+        with tempfile.NamedTemporaryFile("w+") as file:
+            self.tracer.write(file.name)
+            events = json.load(file)["traceEvents"]
+        self.assertEqual(1, len(events))
+        self.assertEqual("X", events[0]["ph"])
+        self.assertEqual({"project": "group/project"}, events[0]["args"])
+
+
+if __name__ == "__main__":
+    unittest.main()
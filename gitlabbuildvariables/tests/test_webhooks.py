@@ -0,0 +1,258 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import urlopen, Request
+
+from typing import Any, Dict
+
+from gitlabbuildvariables.backends import InMemoryBackend
+from gitlabbuildvariables.models import to_variables
+from gitlabbuildvariables.update import FileBasedProjectsVariablesUpdater, FileBasedProjectVariablesUpdaterBuilder, \
+    UPDATED_STATUS
+from gitlabbuildvariables.models import Variable
+from gitlabbuildvariables.webhooks import get_changed_paths, get_changed_groups, locate_settings_groups, \
+    WebhookReconciler, WebhookServer, PUSH_EVENT
+
+_TOKEN = "secret"
+
+
+def _push(*paths: str, ref: str="refs/heads/master") -> Dict[str, Any]:
+    return {"ref": ref, "total_commits_count": 1, "commits": [{"added": [], "modified": list(paths), "removed": []}]}
+
+
+class TestGetChangedPaths(unittest.TestCase):
+    """
+    Tests for `get_changed_paths`.
+    """
+    def test_get_changed_paths(self):
+        event = {"total_commits_count": 2, "commits": [
+            {"added": ["a.json"], "modified": ["b.json"], "removed": []},
+            {"added": [], "modified": ["b.json"], "removed": ["c/d.ini"]}]}
+        self.assertEqual({"a.json", "b.json", "c/d.ini"}, get_changed_paths(event))
+
+    def test_get_changed_paths_when_commits_truncated(self):
+        self.assertIsNone(get_changed_paths(dict(_push("a.json"), total_commits_count=21)))
+
+
+class TestGetChangedGroups(unittest.TestCase):
+    """
+    Tests for `get_changed_groups`.
+    """
+    def test_get_changed_groups(self):
+        self.assertEqual({"team/common"}, get_changed_groups(["./team/common.json", "README.md"], {
+            "team/common": "team/common.json", "common": "other.json"}))
+
+    def test_get_changed_groups_in_subdirectory(self):
+        self.assertEqual({"common"}, get_changed_groups(["settings/common.json"], {
+            "common": "common.json", "other": "other.json"}))
+
+    def test_get_changed_groups_by_absolute_location(self):
+        self.assertEqual({"/srv/settings/common.json"}, get_changed_groups(["settings/common.json"], {
+            "/srv/settings/common.json": "/srv/settings/common.json", "/srv/mon.json": "/srv/mon.json"}))
+
+
+class TestLocateSettingsGroups(unittest.TestCase):
+    """
+    Tests for `locate_settings_groups`.
+    """
+    def test_locate_settings_groups(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            for directory, path in ((first, "a.json"), (second, "a.json"), (second, "b.ini")):
+                open(os.path.join(directory, path), "w").close()
+            self.assertEqual({"a": "a.json", "b": "b.ini"},
+                             locate_settings_groups(["a", "b", "missing"], [first, second], ["json", "ini"]))
+
+
+class _WebhooksTest(unittest.TestCase):
+    """
+    Base class for tests that reconcile the projects of a configuration, set from settings files in a directory.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        self.directory = self._temp_directory.name
+        self._write("common.json", {"HOST": "example.com"})
+        self._write("team.json", {"TEAM": "a"})
+        self._write("config.json", {"other/c": ["common"], "team/*": ["common", "team"]})
+        self.backend = InMemoryBackend({"team/a": {}, "team/b": {}, "other/c": {}})
+        builder = FileBasedProjectVariablesUpdaterBuilder(
+            setting_repositories=[self.directory], default_setting_extensions=["json"], precheck_processes=1)
+        self.updater = FileBasedProjectsVariablesUpdater(
+            os.path.join(self.directory, "config.json"), builder, gitlab_config=None, backend=self.backend)
+        self.reconciler = WebhookReconciler(self.updater, ref="refs/heads/master")
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def _write(self, path: str, contents: Dict[str, Any]):
+        with open(os.path.join(self.directory, path), "w") as file:
+            json.dump(contents, file)
+
+
+class TestWebhookReconciler(_WebhooksTest):
+    """
+    Tests for `WebhookReconciler`.
+    """
+    def test_reconcile_all(self):
+        results = self.reconciler.reconcile(None)
+        self.assertEqual(3, len(results))
+        self.assertEqual(to_variables({"HOST": "example.com", "TEAM": "a"}),
+                         to_variables(self.backend.list_variables("team/b")))
+
+    def test_reconcile_changed(self):
+        self.reconciler.reconcile(None)
+        self._write("team.json", {"TEAM": "b"})
+        self._write("common.json", {"HOST": "unapplied.example.com"})
+        results = self.reconciler.reconcile({"team.json"})
+        self.assertEqual({"team/a": UPDATED_STATUS, "team/b": UPDATED_STATUS},
+                         {result.project: result.status for result in results})
+        self.assertEqual(to_variables({"HOST": "example.com", "TEAM": "b"}),
+                         to_variables(self.backend.list_variables("team/a")))
+
+    def test_reconcile_changed_in_other_repository(self):
+        with tempfile.TemporaryDirectory() as other_directory:
+            self.updater.project_variables_updater_builder.setting_repositories.insert(0, other_directory)
+            self.reconciler.reconcile(None)
+            with open(os.path.join(other_directory, "team.json"), "w") as file:
+                json.dump({"TEAM": "other"}, file)
+            results = self.reconciler.reconcile({"team.json"})
+        self.assertEqual({"team/a", "team/b"}, {result.project for result in results})
+        self.assertEqual(to_variables({"HOST": "example.com", "TEAM": "other"}),
+                         to_variables(self.backend.list_variables("team/a")))
+
+    def test_reconcile_removed(self):
+        with tempfile.TemporaryDirectory() as other_directory:
+            self.updater.project_variables_updater_builder.setting_repositories.insert(0, other_directory)
+            with open(os.path.join(other_directory, "team.json"), "w") as file:
+                json.dump({"TEAM": "other"}, file)
+            self.reconciler.reconcile(None)
+            os.remove(os.path.join(other_directory, "team.json"))
+            self.reconciler.reconcile({"team.json"})
+        self.assertEqual(to_variables({"HOST": "example.com", "TEAM": "a"}),
+                         to_variables(self.backend.list_variables("team/a")))
+
+    def test_reconcile_all_sees_changes_made_by_hand(self):
+        self.reconciler.reconcile(None)
+        self.assertFalse(self.updater.update_required())
+        self.backend.update_variable("team/a", Variable("TEAM", "edited"))
+        self.reconciler.reconcile(None)
+        self.assertEqual(to_variables({"HOST": "example.com", "TEAM": "a"}),
+                         to_variables(self.backend.list_variables("team/a")))
+
+    def test_reconcile_unrelated(self):
+        self.reconciler.reconcile(None)
+        self.assertEqual([], self.reconciler.reconcile({"README.md"}))
+
+    def test_reconcile_when_config_changed(self):
+        self.reconciler.reconcile(None)
+        self._write("config.json", {"other/c": ["team"]})
+        os.utime(os.path.join(self.directory, "config.json"), ns=(0, 0))
+        self.reconciler.reconcile({"README.md"})
+        self.assertEqual(to_variables({"TEAM": "a"}), to_variables(self.backend.list_variables("other/c")))
+
+    def test_reconcile_pending(self):
+        self.assertTrue(self.reconciler.reconcile_pending())
+        self.assertFalse(self.reconciler.reconcile_pending())
+        self._write("team.json", {"TEAM": "b"})
+        self._write("common.json", {"HOST": "new.example.com"})
+        self.assertFalse(self.reconciler.submit(_push("team.json", ref="refs/heads/other")))
+        self.assertFalse(self.reconciler.pending)
+        self.assertTrue(self.reconciler.submit(_push("team.json")))
+        self.assertTrue(self.reconciler.submit(_push("common.json")))
+        self.assertTrue(self.reconciler.reconcile_pending())
+        self.assertEqual(2, self.reconciler.reconciliations)
+        self.assertEqual(to_variables({"HOST": "new.example.com", "TEAM": "b"}),
+                         to_variables(self.backend.list_variables("team/a")))
+
+    def test_reconcile_pending_when_invalid(self):
+        self.reconciler.reconcile_pending()
+        self._write("team.json", {"A": "${B}", "B": "${A}"})
+        self.reconciler.submit(_push("team.json"))
+        self.assertTrue(self.reconciler.reconcile_pending())
+        self.assertEqual(1, self.reconciler.reconciliations)
+        self._write("team.json", {"TEAM": "b"})
+        self.reconciler.submit(_push("README.md"))
+        self.reconciler.reconcile_pending()
+        self.assertEqual(to_variables({"HOST": "example.com", "TEAM": "b"}),
+                         to_variables(self.backend.list_variables("team/a")))
+
+    def test_run(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=self.reconciler.run, args=(stop, ))
+        thread.start()
+        try:
+            self._wait_for(lambda: self.reconciler.reconciliations == 1)
+            self._write("team.json", {"TEAM": "b"})
+            self.reconciler.submit(_push("team.json"))
+            self._wait_for(lambda: self.reconciler.reconciliations == 2)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(to_variables({"HOST": "example.com", "TEAM": "b"}),
+                         to_variables(self.backend.list_variables("team/b")))
+
+    def _wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("Timed out")
+
+
+class TestWebhookServer(_WebhooksTest):
+    """
+    Tests for `WebhookServer`.
+    """
+    def setUp(self):
+        super().setUp()
+        self.server = WebhookServer(("127.0.0.1", 0), self.reconciler, _TOKEN)
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.location = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.reconciler.reconcile_pending()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def _post(self, body: Any, token: str=_TOKEN, event: str=PUSH_EVENT) -> Dict[str, Any]:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        request = Request(self.location, data=data, method="POST",
+                          headers={"X-Gitlab-Token": token, "X-Gitlab-Event": event})
+        with urlopen(request) as response:
+            self.assertEqual(202, response.status)
+            return json.loads(response.read().decode())
+
+    def test_push(self):
+        self.assertEqual({"accepted": True}, self._post(_push("team.json")))
+        self.assertTrue(self.reconciler.pending)
+
+    def test_other_event(self):
+        self.assertEqual({"accepted": False}, self._post({}, event="Merge Request Hook"))
+        self.assertFalse(self.reconciler.pending)
+
+    def test_invalid_token(self):
+        with self.assertRaises(HTTPError) as context:
+            self._post(_push("team.json"), token="other")
+        self.assertEqual(401, context.exception.code)
+        self.assertFalse(self.reconciler.pending)
+
+    def test_too_large(self):
+        with mock.patch("gitlabbuildvariables.webhooks._MAX_BODY_SIZE", 10):
+            with self.assertRaises(HTTPError) as context:
+                self._post(_push("team.json"))
+        self.assertEqual(413, context.exception.code)
+        self.assertFalse(self.reconciler.pending)
+
+    def test_status(self):
+        with urlopen(self.location) as response:
+            status = json.loads(response.read().decode())
+        self.assertEqual((False, 1, 0), (status["pending"], status["reconciliations"], status["last_failed"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from collections import Counter
+
+from gitlabbuildvariables.models import Variable, to_variables
+from gitlabbuildvariables.update._composition import SettingsComposer
+
+_GROUPS = {
+    "common": to_variables({"a": "common", "b": "common"}),
+    "s3": to_variables({"b": "s3", "c": "s3"}),
+    "team": to_variables({"c": "team", "d": "team"}),
+    "urls": to_variables({"url": "https://${c}/${b}"})
+}
+
+
+class TestSettingsComposer(unittest.TestCase):
+    """
+    Tests for `SettingsComposer`.
+    """
+    def setUp(self):
+        self.composer = SettingsComposer()
+        self.reads = Counter()
+
+    def _read_group(self, group: str):
+        self.reads[group] += 1
+        return _GROUPS[group]
+
+    def test_compose(self):
+        variables = self.composer.compose(["common", "s3", "team"], self._read_group)
+        self.assertEqual(to_variables({"a": "common", "b": "s3", "c": "team", "d": "team"}), dict(variables))
+
+    def test_compose_no_groups(self):
+        self.assertEqual({}, dict(self.composer.compose([], self._read_group)))
+
+    def test_compose_is_read_only(self):
+        variables = self.composer.compose(["common"], self._read_group)
+        with self.assertRaises(TypeError):
+            variables[("e", "*")] = Variable("e", "1")
+
+    def test_compose_reads_groups_once(self):
+        self.composer.compose(["common", "s3"], self._read_group)
+        self.composer.compose(["common", "team"], self._read_group)
+        self.composer.compose(["s3", "common"], self._read_group)
+        self.assertEqual({"common": 1, "s3": 1, "team": 1}, dict(self.reads))
+
+    def test_compose_shares_results(self):
+        first = self.composer.compose(["common", "s3"], self._read_group)
+        second = self.composer.compose(["common", "s3"], self._read_group)
+        self.assertIs(first, second)
+        self.assertIs(first[("a", "*")], self.composer.compose(["common"], self._read_group)[("a", "*")])
+
+    def test_compose_does_not_copy_groups(self):
+        self.composer.compose(["common", "s3"], self._read_group)
+        self.composer.compose(["team", "common"], self._read_group)
+        common_s3 = self.composer._root.children["common"].children["s3"].variables
+        team_common = self.composer._root.children["team"].children["common"].variables
+        self.assertIs(_GROUPS["common"], common_s3.maps[1])
+        self.assertIs(_GROUPS["common"], team_common.maps[0])
+
+    def test_compose_interpolates(self):
+        variables = self.composer.compose(["common", "s3", "urls"], self._read_group)
+        self.assertEqual("https://s3/s3", variables[("url", "*")].value)
+        self.assertIs(variables, self.composer.compose(["common", "s3", "urls"], self._read_group))
+        variables = self.composer.compose(["common", "s3", "team", "urls"], self._read_group)
+        self.assertEqual("https://team/s3", variables[("url", "*")].value)
+
+    def test_clear(self):
+        self.composer.compose(["common"], self._read_group)
+        self.composer.clear()
+        self.composer.compose(["common"], self._read_group)
+        self.assertEqual(2, self.reads["common"])
+
+    def test_discard(self):
+        common_s3 = self.composer.compose(["common", "s3"], self._read_group)
+        common_team = self.composer.compose(["common", "team"], self._read_group)
+        self.composer.discard(["s3"])
+        self.assertIs(common_team, self.composer.compose(["common", "team"], self._read_group))
+        self.assertIsNot(common_s3, self.composer.compose(["common", "s3"], self._read_group))
+        self.assertEqual({"common": 1, "s3": 2, "team": 1}, dict(self.reads))
+
+
+if __name__ == "__main__":
+    unittest.main()
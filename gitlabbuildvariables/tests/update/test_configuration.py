@@ -0,0 +1,84 @@
+import io
+import json
+import unittest
+
+from gitlabbuildvariables.update._configuration import ProjectsConfiguration, iterate_json_object
+
+_CONFIGURATION = {
+    "team/special": ["common", "special"],
+    "team/*": ["common", "team"],
+    "/other/.*-service/": ["common", "service"],
+    "other/project": ["common"]
+}
+_PROJECTS = ["team/special", "team/a", "team/b", "other/a-service", "other/project", "unmatched/project"]
+
+
+class _ReadCountingStringIO(io.StringIO):
+    """
+    In-memory text file that counts how many times it is read from.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+
+    def read(self, *args, **kwargs):
+        self.reads += 1
+        return super().read(*args, **kwargs)
+
+
+class TestIterateJsonObject(unittest.TestCase):
+    """
+    Tests for `iterate_json_object`.
+    """
+    def test_iterate_with_small_chunks(self):
+        config = {**_CONFIGURATION, "number": 12345678, "nested": {"a": [1, {"b": "}"}]}}
+        for chunk_size in (1, 2, 7, 1000):
+            items = list(iterate_json_object(io.StringIO(json.dumps(config, indent=4)), chunk_size))
+            self.assertEqual(list(config.items()), items)
+
+    def test_iterate_empty(self):
+        self.assertEqual([], list(iterate_json_object(io.StringIO(" { } "), 1)))
+
+    def test_iterate_invalid(self):
+        self.assertRaises(ValueError, list, iterate_json_object(io.StringIO("{\"a\": [1, 2}"), 3))
+        self.assertRaises(ValueError, list, iterate_json_object(io.StringIO("[1, 2]"), 3))
+
+    def test_iterate_with_trailing_content(self):
+        self.assertEqual([("a", 1)], list(iterate_json_object(io.StringIO("{\"a\": 1}  \n"), 2)))
+        for contents in ("{\"a\": 1} x", "{} {}", "{\"a\": 1}" + " " * 100 + "]"):
+            self.assertRaises(ValueError, list, iterate_json_object(io.StringIO(contents), 2))
+
+    def test_iterate_reads_large_value_in_few_attempts(self):
+        file = _ReadCountingStringIO(json.dumps({"a": ["x" * 10] * 10000}))
+        list(iterate_json_object(file, 16))
+        self.assertLess(file.reads, 100)
+
+
+class TestProjectsConfiguration(unittest.TestCase):
+    """
+    Tests for `ProjectsConfiguration`.
+    """
+    def setUp(self):
+        self.configuration = ProjectsConfiguration(_CONFIGURATION.items())
+
+    def test_items(self):
+        self.assertEqual([("team/special", ("common", "special")), ("other/project", ("common", ))],
+                         list(self.configuration.items()))
+
+    def test_expand(self):
+        self.assertEqual({
+            "team/special": ("common", "special"),
+            "team/a": ("common", "team"),
+            "team/b": ("common", "team"),
+            "other/a-service": ("common", "service"),
+            "other/project": ("common", )
+        }, dict(self.configuration.expand(_PROJECTS)))
+
+    def test_expand_without_patterns(self):
+        configuration = ProjectsConfiguration([("team/a", ["common"])])
+        self.assertFalse(configuration.has_patterns)
+        self.assertEqual([("team/a", ("common", ))], list(configuration.expand(_PROJECTS)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+
+from gitlabbuildvariables.backends import InMemoryBackend
+from gitlabbuildvariables.common import ApplyConfig
+from gitlabbuildvariables.manager import ProjectVariablesManager
+from gitlabbuildvariables.models import Variable, FINGERPRINT_KEY
+from gitlabbuildvariables.update import DictBasedProjectsVariablesUpdater, DictBasedProjectVariablesUpdaterBuilder, \
+    DriftReport, ProjectDrift
+
+
+class TestDriftReport(unittest.TestCase):
+    """
+    Tests for `DriftReport`.
+    """
+    def setUp(self):
+        self.report = DriftReport([ProjectDrift("group/b", changed=["A"], removed=["A", "B"]), ProjectDrift("group/a"),
+                                   ProjectDrift("group/\"c\"", error="ValueError: not found")], 1.5, 1000.0)
+
+    def test_to_prometheus(self):
+        metrics = self.report.to_prometheus().splitlines()
+        self.assertIn("gitlab_variables_projects 3", metrics)
+        self.assertIn("gitlab_variables_drifted_projects 1", metrics)
+        self.assertIn("gitlab_variables_drifted_keys 2", metrics)
+        self.assertIn("gitlab_variables_project_drifted_keys{project=\"group/b\"} 2", metrics)
+        self.assertIn("gitlab_variables_failed_projects 1", metrics)
+        self.assertIn("gitlab_variables_check_duration_seconds 1.500000", metrics)
+        self.assertIn("gitlab_variables_check_failed 0", metrics)
+
+    def test_to_prometheus_when_check_failed(self):
+        metrics = DriftReport([], 0.5, 1000.0, error="PrecheckError: broken").to_prometheus().splitlines()
+        self.assertIn("gitlab_variables_check_failed 1", metrics)
+        self.assertIn("gitlab_variables_last_check_timestamp_seconds 1000.000", metrics)
+        self.assertFalse(any(metric.startswith("gitlab_variables_drifted_projects") for metric in metrics))
+
+    def test_write_prometheus(self):
+        with tempfile.TemporaryDirectory() as temp_directory:
+            location = os.path.join(temp_directory, "drift.prom")
+            self.report.write_prometheus(location)
+            with open(location, "r") as file:
+                self.assertEqual(self.report.to_prometheus(), file.read())
+            self.assertEqual(["drift.prom"], os.listdir(temp_directory))
+
+
+class TestCheckDrift(unittest.TestCase):
+    """
+    Tests for `ProjectsVariablesUpdater.check_drift`.
+    """
+    def setUp(self):
+        self.backend = InMemoryBackend({"team/a": {}, "team/b": {}})
+        self.updater = DictBasedProjectsVariablesUpdater(
+            {"team/*": ["common"]}, DictBasedProjectVariablesUpdaterBuilder({"common": {"A": "1", "B": "2"}}),
+            gitlab_config=None, backend=self.backend)
+
+    def test_check_drift(self):
+        self.updater.update()
+        self.assertEqual([], self.updater.check_drift(2).drifted)
+        self.backend.update_variable("team/b", Variable("A", "edited"))
+        self.backend.create_variable("team/b", Variable("C", "3"))
+        drifted = self.updater.check_drift(2).drifted
+        self.assertEqual([("team/b", [], ["A"], ["C"])],
+                         [(drift.project, drift.added, drift.changed, drift.removed) for drift in drifted])
+
+    def test_check_drift_sees_new_settings_after_refresh(self):
+        self.updater.update()
+        self.updater.project_variables_updater_builder.settings["common"] = {"A": "1"}
+        self.assertEqual(0, len(self.updater.check_drift().drifted))
+        self.updater.refresh()
+        self.assertEqual(2, len(self.updater.check_drift().drifted))
+
+    def test_refresh_discards_kept_updaters(self):
+        self.updater.update()
+        self.assertFalse(self.updater.update_required())
+        self.backend.create_variable("team/a", Variable("C", "3"))
+        self.updater.refresh()
+        self.assertTrue(self.updater.update_required())
+
+
+class _ListCountingBackend(InMemoryBackend):
+    """
+    In-memory backend that counts how many times the variables of projects are listed.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listings = 0
+
+    def list_variables(self, project: str):
+        self.listings += 1
+        return super().list_variables(project)
+
+
+class TestCheckDriftWithFingerprint(unittest.TestCase):
+    """
+    Tests for `ProjectsVariablesUpdater.check_drift` when fingerprints are configured.
+    """
+    def setUp(self):
+        self.backend = _ListCountingBackend({"team/a": {}, "team/b": {}})
+        self.updater = DictBasedProjectsVariablesUpdater(
+            {"team/*": ["common"]}, DictBasedProjectVariablesUpdaterBuilder({"common": {"A": "1", "B": "2"}}),
+            gitlab_config=None, apply_config=ApplyConfig(fingerprint=True), backend=self.backend)
+        self.updater.update()
+        self.backend.listings = 0
+
+    def test_check_drift_when_fingerprints_match(self):
+        self.assertEqual([], self.updater.check_drift(2).drifted)
+        self.assertFalse(self.updater.update_required())
+        self.assertEqual(0, self.backend.listings)
+
+    def test_check_drift_when_fingerprint_removed(self):
+        self.backend.delete_variable("team/b", self.backend.get_variable("team/b", FINGERPRINT_KEY))
+        self.backend.create_variable("team/b", Variable("C", "3"))
+        drifted = self.updater.check_drift(2).drifted
+        self.assertEqual([("team/b", [], [], ["C"])],
+                         [(drift.project, drift.added, drift.changed, drift.removed) for drift in drifted])
+        self.assertEqual(1, self.backend.listings)
+
+    def test_check_drift_sees_new_settings_after_refresh(self):
+        self.updater.project_variables_updater_builder.settings["common"] = {"A": "1"}
+        self.updater.refresh()
+        self.assertEqual(2, len(self.updater.check_drift().drifted))
+        self.assertTrue(self.updater.update_required())
+
+    def test_update_required_after_set_without_fingerprint(self):
+        ProjectVariablesManager(None, "team/b", backend=self.backend).set({"A": "1"})
+        self.assertIsNone(self.backend.get_variable("team/b", FINGERPRINT_KEY))
+        self.assertTrue(self.updater.update_required())
+
+
+if __name__ == "__main__":
+    unittest.main()
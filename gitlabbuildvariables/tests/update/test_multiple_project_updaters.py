@@ -0,0 +1,162 @@
+import tempfile
+import threading
+import time
+import unittest
+
+from gitlabbuildvariables.backends import InMemoryBackend
+from gitlabbuildvariables.common import ApplyConfig
+from gitlabbuildvariables.journal import RunCheckpoint
+from gitlabbuildvariables.models import to_variables, Variable
+from gitlabbuildvariables.update import DictBasedProjectsVariablesUpdater, DictBasedProjectVariablesUpdaterBuilder, \
+    Shard, PrecheckError, UPDATED_STATUS, FAILED_STATUS, SKIPPED_STATUS
+
+_SETTINGS = {
+    "common": {"URL": "https://${HOST}/", "HOST": "example.com"},
+    "team": {"HOST": "team.example.com"}
+}
+
+
+class _BrokenProjectBackend(InMemoryBackend):
+    """
+    In-memory backend in which the project "broken/d" does not exist.
+    """
+    def check_project(self, project: str):
+        if project == "broken/d":
+            raise ValueError("Project '%s' not found" % project)
+
+
+class _ConcurrencyRecordingBackend(InMemoryBackend):
+    """
+    In-memory backend that records the projects whose variables are listed and the most listings that are in progress
+    at once.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listed = []
+        self.max_listing = 0
+        self._listing = 0
+        self._listing_lock = threading.Lock()
+
+    def list_variables(self, project: str):
+        with self._listing_lock:
+            self.listed.append(project)
+            self._listing += 1
+            self.max_listing = max(self.max_listing, self._listing)
+        time.sleep(0.05)
+        with self._listing_lock:
+            self._listing -= 1
+        return super().list_variables(project)
+
+
+class TestDictBasedProjectsVariablesUpdater(unittest.TestCase):
+    """
+    Tests for `DictBasedProjectsVariablesUpdater`.
+    """
+    def setUp(self):
+        self.backend = _BrokenProjectBackend({"team/a": {}, "team/b": {"OLD": "1"}, "other/c": {}})
+        self.updater = DictBasedProjectsVariablesUpdater(
+            {"other/c": ["common"], "team/*": ["common", "team"]}, DictBasedProjectVariablesUpdaterBuilder(_SETTINGS),
+            gitlab_config=None, backend=self.backend)
+
+    def test_update(self):
+        self.assertTrue(self.updater.update_required())
+        self.updater.update()
+        self.assertFalse(self.updater.update_required())
+        self.assertEqual(to_variables({"URL": "https://example.com/", "HOST": "example.com"}),
+                         to_variables(self.backend.list_variables("other/c")))
+        for project in ("team/a", "team/b"):
+            self.assertEqual(to_variables({"URL": "https://team.example.com/", "HOST": "team.example.com"}),
+                             to_variables(self.backend.list_variables(project)))
+
+    def test_update_required_concurrently(self):
+        backend = _ConcurrencyRecordingBackend({"team/%d" % i: {"A": "1"} for i in range(4)})
+        updater = DictBasedProjectsVariablesUpdater(
+            {"team/*": ["common"]}, DictBasedProjectVariablesUpdaterBuilder({"common": {"A": "1"}}),
+            gitlab_config=None, backend=backend)
+        self.assertFalse(updater.update_required(max_concurrency=4))
+        self.assertEqual(4, backend.max_listing)
+
+    def test_update_required_stops_when_one_is_required(self):
+        backend = _ConcurrencyRecordingBackend({"team/%d" % i: {} for i in range(4)})
+        updater = DictBasedProjectsVariablesUpdater(
+            {"team/*": ["common"]}, DictBasedProjectVariablesUpdaterBuilder({"common": {"A": "1"}}),
+            gitlab_config=None, backend=backend)
+        self.assertTrue(updater.update_required(max_concurrency=1))
+        self.assertLess(len(backend.listed), 4)
+
+    def test_update_again(self):
+        self.updater.update()
+        self.backend.update_variable("team/a", Variable("HOST", "edited.example.com"))
+        self.assertTrue(self.updater.update_required())
+        self.updater.update()
+        self.assertEqual(to_variables({"URL": "https://team.example.com/", "HOST": "team.example.com"}),
+                         to_variables(self.backend.list_variables("team/a")))
+
+    def test_update_projects(self):
+        self.updater.configuration["broken/d"] = ["common"]
+        results = {result.project: result for result in self.updater.update_projects()}
+        self.assertEqual(FAILED_STATUS, results["broken/d"].status)
+        self.assertEqual((UPDATED_STATUS, 2, 0, 1),
+                         (results["team/b"].status, results["team/b"].added, results["team/b"].changed,
+                          results["team/b"].removed))
+
+    def test_update_shards(self):
+        updated = []
+        for index in (1, 2):
+            self.updater.shard = Shard(index, 2)
+            updated.extend(result.project for result in self.updater.update_projects())
+        self.assertEqual(["other/c", "team/a", "team/b"], sorted(updated))
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as temp_directory:
+            checkpoint = RunCheckpoint(RunCheckpoint.location_for(temp_directory, "run"))
+            self.updater.checkpoint = checkpoint
+            self.updater.configuration["broken/d"] = ["common"]
+            list(self.updater.update_projects())
+            self.assertTrue(checkpoint.exists())
+
+            settings = dict(_SETTINGS, team=dict(_SETTINGS["team"], EXTRA="1"))
+            updater = DictBasedProjectsVariablesUpdater(
+                {"other/c": ["common"], "team/*": ["common", "team"]},
+                DictBasedProjectVariablesUpdaterBuilder(settings), gitlab_config=None,
+                apply_config=ApplyConfig(resume=True), backend=self.backend, checkpoint=checkpoint)
+            results = {result.project: result.status for result in updater.update_projects()}
+            self.assertEqual({"other/c": SKIPPED_STATUS, "team/a": UPDATED_STATUS, "team/b": UPDATED_STATUS}, results)
+            self.assertFalse(checkpoint.exists())
+
+    def test_update_groups(self):
+        settings = dict(_SETTINGS)
+        self.updater.project_variables_updater_builder = DictBasedProjectVariablesUpdaterBuilder(settings)
+        self.updater.update()
+        settings["team"] = {"HOST": "new.example.com"}
+        settings["common"] = {"UNAPPLIED": "1"}
+        self.backend.create_variable("team/a", Variable("EDITED", "1"))
+        results = {result.project: result.status for result in self.updater.update_groups(["team"])}
+        self.assertEqual({"team/a": UPDATED_STATUS, "team/b": UPDATED_STATUS}, results)
+        self.assertEqual(to_variables({"URL": "https://new.example.com/", "HOST": "new.example.com"}),
+                         to_variables(self.backend.list_variables("team/a")))
+        self.assertEqual(to_variables({"URL": "https://example.com/", "HOST": "example.com"}),
+                         to_variables(self.backend.list_variables("other/c")))
+
+    def test_update_groups_when_invalid(self):
+        settings = dict(_SETTINGS)
+        self.updater.project_variables_updater_builder = DictBasedProjectVariablesUpdaterBuilder(settings)
+        settings["team"] = {"A": "${B}", "B": "${A}"}
+        self.assertRaises(PrecheckError, self.updater.update_groups, ["team"])
+        self.assertEqual([], list(self.updater.update_groups(["unused"])))
+
+    def test_update_when_settings_groups_invalid(self):
+        self.updater.configuration["other/e"] = ["missing", "common"]
+        self.updater.configuration["team/[f]"] = ["cycle"]
+        self.updater.project_variables_updater_builder.settings["cycle"] = {"A": "${B}", "B": "${A}"}
+        try:
+            with self.assertRaises(PrecheckError) as context:
+                list(self.updater.update_projects())
+        finally:
+            del self.updater.project_variables_updater_builder.settings["cycle"]
+        self.assertEqual({"missing", "cycle"}, set(context.exception.errors.keys()))
+        self.assertEqual({}, to_variables(self.backend.list_variables("other/c")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+from functools import partial
+
+from gitlabbuildvariables.models import to_variables
+from gitlabbuildvariables.update import FileBasedProjectVariablesUpdaterBuilder, PrecheckError
+from gitlabbuildvariables.update._precheck import read_groups
+from gitlabbuildvariables.update._single_project_updaters import read_settings_group
+
+
+class TestReadGroups(unittest.TestCase):
+    """
+    Tests for `read_groups`.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        for i in range(8):
+            with open(os.path.join(self._temp_directory.name, "%d.json" % i), "w") as file:
+                json.dump({"GROUP": str(i)}, file)
+        with open(os.path.join(self._temp_directory.name, "invalid.json"), "w") as file:
+            json.dump({"INVALID": {"protected": True}}, file)
+        self.read_group = partial(read_settings_group, setting_repositories=[self._temp_directory.name],
+                                  default_setting_extensions=["json"])
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def test_read_groups_in_processes(self):
+        groups_variables, errors = read_groups([str(i) for i in range(8)] + ["invalid", "missing"], self.read_group,
+                                               processes=2)
+        self.assertEqual({str(i): to_variables({"GROUP": str(i)}) for i in range(8)}, groups_variables)
+        self.assertEqual({"invalid", "missing"}, set(errors.keys()))
+
+    def test_read_groups_in_process(self):
+        groups_variables, errors = read_groups(["0", "missing"], self.read_group, processes=1)
+        self.assertEqual({"0": to_variables({"GROUP": "0"})}, groups_variables)
+        self.assertEqual(["missing"], list(errors.keys()))
+
+
+class TestFileBasedProjectVariablesUpdaterBuilderPrecheck(unittest.TestCase):
+    """
+    Tests for `FileBasedProjectVariablesUpdaterBuilder.precheck`.
+    """
+    def setUp(self):
+        self._temp_directory = tempfile.TemporaryDirectory()
+        for group, variables in (("a", {"A": "${B}"}), ("b", {"B": "${A}"}), ("c", {"C": "c"})):
+            with open(os.path.join(self._temp_directory.name, "%s.json" % group), "w") as file:
+                json.dump(variables, file)
+        self.builder = FileBasedProjectVariablesUpdaterBuilder([self._temp_directory.name], ["json"],
+                                                               precheck_processes=2)
+
+    def tearDown(self):
+        self._temp_directory.cleanup()
+
+    def test_precheck(self):
+        self.builder.precheck([("a", "c"), ("b", "c")])
+
+    def test_precheck_reports_all_errors(self):
+        with self.assertRaises(PrecheckError) as context:
+            self.builder.precheck([("a", "b"), ("c", "missing"), ("other",)])
+        self.assertEqual({"a + b", "missing", "other"}, set(context.exception.errors.keys()))
+
+
+if __name__ == "__main__":
+    unittest.main()
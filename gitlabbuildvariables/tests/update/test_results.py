@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from gitlabbuildvariables.models import VariableChanges, Variable
+from gitlabbuildvariables.update._results import ProjectUpdateResult, UpdateResults, merge_results, UPDATED_STATUS, \
+    UNCHANGED_STATUS, FAILED_STATUS, SKIPPED_STATUS
+
+
+class TestUpdateResults(unittest.TestCase):
+    """
+    Tests for `UpdateResults`.
+    """
+    def test_write_and_read(self):
+        results = UpdateResults([ProjectUpdateResult.from_changes("a", VariableChanges(added=[Variable("a", "1")])),
+                                 ProjectUpdateResult.from_error("b", IOError("failed"))], "1/2")
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, "results.json")
+            results.write(location)
+            self.assertEqual(0o644, os.stat(location).st_mode & 0o777)
+            read = UpdateResults.read(location)
+        self.assertEqual("1/2", read.shard)
+        self.assertFalse(read.succeeded)
+        self.assertEqual([r.to_json() for r in results.results], [r.to_json() for r in read.results])
+
+
+class TestMergeResults(unittest.TestCase):
+    """
+    Tests for `merge_results`.
+    """
+    def test_merge(self):
+        report = merge_results([
+            UpdateResults([ProjectUpdateResult("b", UPDATED_STATUS, added=1)], "2/2"),
+            UpdateResults([ProjectUpdateResult("a", UNCHANGED_STATUS)], "1/2")])
+        self.assertTrue(report["succeeded"])
+        self.assertEqual({UPDATED_STATUS: 1, UNCHANGED_STATUS: 1, FAILED_STATUS: 0, SKIPPED_STATUS: 0},
+                         report["totals"])
+        self.assertEqual(["a", "b"], [result["project"] for result in report["projects"]])
+
+    def test_merge_with_failure(self):
+        report = merge_results([UpdateResults([ProjectUpdateResult("a", FAILED_STATUS, error="Error")])])
+        self.assertFalse(report["succeeded"])
+        self.assertEqual(["a"], [result["project"] for result in report["failed"]])
+
+    def test_merge_with_missing_shard(self):
+        report = merge_results([UpdateResults([], "1/3"), UpdateResults([], "3/3")])
+        self.assertFalse(report["succeeded"])
+        self.assertEqual(["2/3"], report["missing_shards"])
+
+    def test_merge_repeated_shard(self):
+        self.assertRaises(ValueError, merge_results, [UpdateResults([], "1/2"), UpdateResults([], "1/2")])
+
+    def test_merge_repeated_project(self):
+        self.assertRaises(ValueError, merge_results, [
+            UpdateResults([ProjectUpdateResult("a", UPDATED_STATUS)], "1/2"),
+            UpdateResults([ProjectUpdateResult("a", UPDATED_STATUS)], "2/2")])
+
+    def test_merge_different_shard_counts(self):
+        self.assertRaises(ValueError, merge_results, [UpdateResults([], "1/3"), UpdateResults([], "1/2")])
+
+
+if __name__ == "__main__":
+    unittest.main()
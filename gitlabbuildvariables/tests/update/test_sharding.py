@@ -0,0 +1,38 @@
+import unittest
+from collections import Counter
+
+from gitlabbuildvariables.update._sharding import Shard, assign_shard
+
+_PROJECTS = ["group-%d/project-%d" % (i % 7, i) for i in range(1000)]
+
+
+class TestShard(unittest.TestCase):
+    """
+    Tests for `Shard`.
+    """
+    def test_parse(self):
+        self.assertEqual(Shard(2, 4), Shard.parse("2/4"))
+        self.assertEqual("2/4", str(Shard.parse("2/4")))
+
+    def test_parse_invalid(self):
+        for specification in ("2", "0/4", "5/4", "a/b", "1/0"):
+            self.assertRaises(ValueError, Shard.parse, specification)
+
+    def test_shards_partition_projects(self):
+        shards = [Shard(index, 4) for index in range(1, 5)]
+        for project in _PROJECTS:
+            self.assertEqual(1, sum(shard.contains(project) for shard in shards))
+
+    def test_shards_balanced(self):
+        counts = Counter(assign_shard(project, 4) for project in _PROJECTS)
+        self.assertEqual({1, 2, 3, 4}, set(counts.keys()))
+        self.assertTrue(all(counts[index] > len(_PROJECTS) / 4 * 0.8 for index in counts))
+
+    def test_assignment_stable_when_shards_added(self):
+        moved = [project for project in _PROJECTS if assign_shard(project, 4) != assign_shard(project, 5)]
+        self.assertTrue(all(assign_shard(project, 5) == 5 for project in moved))
+        self.assertLess(len(moved), len(_PROJECTS) / 5 * 1.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from threading import Lock
+
+from typing import Dict, Any, List, Tuple, Iterable, Iterator, TypeVar
+
+PROJECT_CATEGORY = "project"
+GROUP_CATEGORY = "group"
+STAGE_CATEGORY = "stage"
+HTTP_CATEGORY = "http"
+
+_MICROSECONDS_IN_SECOND = 1000000
+
+Item = TypeVar("Item")
+
+
+class _Span:
+    """
+    Context manager that records a span in a tracer when exited.
+    """
+    def __init__(self, tracer: "Tracer", name: str, category: str, arguments: Dict[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._arguments = arguments
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._tracer.record(self._name, self._category, self._start, time.perf_counter() - self._start,
+                            self._arguments)
+
+
+class _NullSpan:
+    """
+    Context manager that records nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Records nested spans of time, which can be written in the Chrome trace event format (viewable in
+    chrome://tracing or Perfetto). Spans are only recorded when the tracer is enabled.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._events = []   # type: List[Dict[str, Any]]
+        self._lock = Lock()
+        self._origin = time.perf_counter()
+
+    def span(self, name: str, category: str=STAGE_CATEGORY, **arguments) -> _Span:
+        """
+        Creates a context manager that records the time spent within it as a span.
+        :param name: the name of the span
+        :param category: the category of the span (e.g. `STAGE_CATEGORY`)
+        :param arguments: details to attach to the span
+        :return: the span context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, arguments)
+
+    def iterate(self, items: Iterable[Item], name: str, category: str=STAGE_CATEGORY, **arguments) -> Iterator[Item]:
+        """
+        Iterates over the given items (e.g. a lazy listing), recording the time spent getting them as a span. Only the
+        time spent getting the items is recorded, not the time that the consumer of the items spends between them.
+        :param items: the items to iterate over
+        :param name: the name of the span
+        :param category: the category of the span
+        :param arguments: details to attach to the span
+        :return: iterator of the items
+        """
+        if not self.enabled:
+            yield from items
+            return
+        iterator = iter(items)
+        start = time.perf_counter()
+        duration = 0.0
+        count = 0
+        try:
+            while True:
+                fetch_start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    duration += time.perf_counter() - fetch_start
+                count += 1
+                yield item
+        finally:
+            self.record(name, category, start, duration, dict(arguments, items=count))
+
+    def record(self, name: str, category: str, start: float, duration: float, arguments: Dict[str, Any]=None):
+        """
+        Records a span that has completed.
+        :param name: the name of the span
+        :param category: the category of the span
+        :param start: when the span started (in seconds, from `time.perf_counter`)
+        :param duration: the length of the span in seconds
+        :param arguments: details to attach to the span
+        """
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) * _MICROSECONDS_IN_SECOND,
+            "dur": duration * _MICROSECONDS_IN_SECOND,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": arguments if arguments is not None else {}
+        }
+        with self._lock:
+            self._events.append(event)
+
+    def write(self, location: str):
+        """
+        Writes the recorded spans to the given location in the Chrome trace event format.
+        :param location: the location to write to
+        """
+        with self._lock:
+            events = list(self._events)
+        with open(location, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def summarise(self) -> List[Tuple[str, str, int, float]]:
+        """
+        Summarises the recorded spans by category and name, with those that took the most time in total first.
+        :return: list of tuples of category, name, number of spans and the total time spent in them (in seconds)
+        """
+        totals = defaultdict(lambda: [0, 0.0])   # type: Dict[Tuple[str, str], List]
+        with self._lock:
+            for event in self._events:
+                total = totals[(event["cat"], event["name"])]
+                total[0] += 1
+                total[1] += event["dur"] / _MICROSECONDS_IN_SECOND
+        return sorted(((category, name, count, duration) for (category, name), (count, duration) in totals.items()),
+                      key=lambda summary: summary[3], reverse=True)
+
+    def clear(self):
+        """
+        Removes all recorded spans.
+        """
+        with self._lock:
+            self._events.clear()
+
+
+tracer = Tracer()
+
+
+def trace_http_response(response, *args, **kwargs):
+    """
+    `requests` response hook that records the HTTP call that produced the response as a span in the tracer.
+    :param response: the response to the HTTP call
+    """
+    if tracer.enabled:
+        duration = response.elapsed.total_seconds()
+        request = response.request
+        tracer.record("%s %s" % (request.method, request.path_url.split("?")[0]), HTTP_CATEGORY,
+                      time.perf_counter() - duration, duration, {"status": response.status_code})
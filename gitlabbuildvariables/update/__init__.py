@@ -3,5 +3,11 @@ from gitlabbuildvariables.update._builders import DictBasedProjectVariablesUpdat
 from gitlabbuildvariables.update._multiple_project_updaters import FileBasedProjectsVariablesUpdater, \
     DictBasedProjectsVariablesUpdater
 from gitlabbuildvariables.update._single_project_updaters import ProjectVariablesUpdater, logger, \
-    DictBasedProjectVariablesUpdater, FileBasedProjectVariablesUpdater
+    DictBasedProjectVariablesUpdater, FileBasedProjectVariablesUpdater, resolve_settings_group
 from gitlabbuildvariables.update._common import VariablesUpdater
+from gitlabbuildvariables.update._configuration import ProjectsConfiguration, read_projects_configuration
+from gitlabbuildvariables.update._results import ProjectUpdateResult, UpdateResults, merge_results, UPDATED_STATUS, \
+    UNCHANGED_STATUS, FAILED_STATUS, SKIPPED_STATUS
+from gitlabbuildvariables.update._sharding import Shard, assign_shard
+from gitlabbuildvariables.update._precheck import PrecheckError
+from gitlabbuildvariables.update._drift import DriftReport, ProjectDrift
@@ -1,9 +1,15 @@
 from abc import ABCMeta, abstractmethod
-from typing import TypeVar, Generic, Iterable, List, Dict
+from functools import partial
+from typing import TypeVar, Generic, Iterable, List, Dict, Union, Tuple
 
-from gitlabbuildvariables.common import GitLabConfig
+from gitlabbuildvariables.backends import VariablesBackend
+from gitlabbuildvariables.common import GitLabConfig, ApplyConfig
+from gitlabbuildvariables.models import Variable, VariableMap, to_variables
+from gitlabbuildvariables.repositories import get_settings_repository
+from gitlabbuildvariables.update._composition import SettingsComposer
+from gitlabbuildvariables.update._precheck import precheck_settings_groups, read_groups
 from gitlabbuildvariables.update._single_project_updaters import ProjectVariablesUpdater, \
-    FileBasedProjectVariablesUpdater, DictBasedProjectVariablesUpdater
+    FileBasedProjectVariablesUpdater, DictBasedProjectVariablesUpdater, read_settings_group
 
 ProjectVariablesUpdaterType = TypeVar("ProjectVariablesUpdater", bound=ProjectVariablesUpdater)
 
@@ -13,49 +19,111 @@ class ProjectVariablesUpdaterBuilder(Generic[ProjectVariablesUpdaterType], metac
     Builder of `ProjectVariablesUpdater` instances.
     """
     @abstractmethod
-    def build(self, project: str, groups: Iterable[str], gitlab_config: GitLabConfig) \
-            -> ProjectVariablesUpdaterType:
+    def build(self, project: str, groups: Iterable[str], gitlab_config: GitLabConfig, apply_config: ApplyConfig=None,
+              backend: VariablesBackend=None) -> ProjectVariablesUpdaterType:
         """
         Builds a `ProjectVariablesUpdater` instance using the given arguments.
         :param project: the project that variables are to be updated for
         :param groups: the groups of settings that should be set for the project
         :param gitlab_config: the configuration required to access GitLab
+        :param apply_config: the configuration of how changes are applied
+        :param backend: the store of the project's variables (the GitLab backend is used if `None`)
         :return: the project variable updater
         """
 
+    def refresh(self, groups: Iterable[str]=None):
+        """
+        Discards the settings that have been read, so that changes to them are seen by the updaters that are built.
+        :param groups: the settings groups to discard (all are discarded if `None`)
+        """
+
+    def precheck(self, settings_groups: Iterable[Tuple[str, ...]]):
+        """
+        Checks that the given sequences of settings groups can be read and composed by the updaters that are built,
+        without accessing GitLab. Builders that cannot check settings groups in advance do nothing.
+        :param settings_groups: sequences of settings groups (lowest preference first)
+        :raises PrecheckError: if any of the groups cannot be read or composed, describing all of the problems
+        """
+
 
 class FileBasedProjectVariablesUpdaterBuilder(ProjectVariablesUpdaterBuilder[FileBasedProjectVariablesUpdater]):
     """
-    Builder of `FileBasedProjectVariablesUpdater` instances.
+    Builder of `FileBasedProjectVariablesUpdater` instances. The updaters that are built share a settings composer, so
+    each group is read, and each distinct sequence of groups is composed, only once.
     """
-    def __init__(self, setting_repositories: List[str]=None, default_setting_extensions: List[str]=None):
+    def __init__(self, setting_repositories: List[str]=None, default_setting_extensions: List[str]=None,
+                 precheck_processes: int=None):
         """
         Constructor.
         :param setting_repositories: see `FileBasedProjectVariablesUpdater.__init__`
         :param default_setting_extensions: see `FileBasedProjectVariablesUpdater.__init__`
+        :param precheck_processes: maximum number of processes to read settings files with when prechecking (the
+        number of CPUs if `None`)
         """
         self.setting_repositories = setting_repositories if setting_repositories is not None else []
         self.default_setting_extensions = default_setting_extensions if default_setting_extensions is not None else []
+        self.precheck_processes = precheck_processes
+        self._composer = SettingsComposer()
 
-    def build(self, project: str, groups: Iterable[str], gitlab_config: GitLabConfig) \
-            -> FileBasedProjectVariablesUpdater:
+    def build(self, project: str, groups: Iterable[str], gitlab_config: GitLabConfig, apply_config: ApplyConfig=None,
+              backend: VariablesBackend=None) -> FileBasedProjectVariablesUpdater:
         return FileBasedProjectVariablesUpdater(
-            project=project, groups=groups, gitlab_config=gitlab_config, setting_repositories=self.setting_repositories,
+            project=project, groups=groups, gitlab_config=gitlab_config, apply_config=apply_config, backend=backend,
+            composer=self._composer, setting_repositories=self.setting_repositories,
             default_setting_extensions=self.default_setting_extensions)
 
+    def refresh(self, groups: Iterable[str]=None):
+        for setting_repository in self.setting_repositories:
+            get_settings_repository(setting_repository).refresh()
+        if groups is None:
+            self._composer.clear()
+        else:
+            self._composer.discard(groups)
+
+    def precheck(self, settings_groups: Iterable[Tuple[str, ...]]):
+        """
+        Checks that the settings files of the given sequences of settings groups can be found, parsed and composed.
+        Files are parsed in parallel by a pool of processes and the variables that are read are kept, so they are not
+        read again when the updaters compose them.
+        :param settings_groups: see `ProjectVariablesUpdaterBuilder.precheck`
+        :raises PrecheckError: see `ProjectVariablesUpdaterBuilder.precheck`
+        """
+        read_group = partial(read_settings_group, setting_repositories=self.setting_repositories,
+                             default_setting_extensions=self.default_setting_extensions)
+        precheck_settings_groups(settings_groups, self._composer,
+                                 lambda groups: read_groups(groups, read_group, self.precheck_processes))
+
 
 class DictBasedProjectVariablesUpdaterBuilder(ProjectVariablesUpdaterBuilder[DictBasedProjectVariablesUpdater]):
     """
-    Builder of `DictBasedProjectVariablesUpdater` instances.
+    Builder of `DictBasedProjectVariablesUpdater` instances. The updaters that are built share a settings composer, so
+    each group is read, and each distinct sequence of groups is composed, only once.
     """
-    def __init__(self, settings: Dict[str, Dict[str, str]]):
+    def __init__(self, settings: Dict[str, Union[Dict[str, str], Iterable[Variable]]]):
         """
         Constructor.
         :param settings: see `DictBasedProjectVariablesUpdater.__init__`
         """
         self.settings = settings
+        self._composer = SettingsComposer()
 
-    def build(self, project: str, groups: Iterable[str], gitlab_config: GitLabConfig) \
-            -> DictBasedProjectVariablesUpdater:
+    def build(self, project: str, groups: Iterable[str], gitlab_config: GitLabConfig, apply_config: ApplyConfig=None,
+              backend: VariablesBackend=None) -> DictBasedProjectVariablesUpdater:
         return DictBasedProjectVariablesUpdater(
-            project=project, groups=groups, gitlab_config=gitlab_config, settings=self.settings)
+            project=project, groups=groups, gitlab_config=gitlab_config, apply_config=apply_config, backend=backend,
+            composer=self._composer, settings=self.settings)
+
+    def refresh(self, groups: Iterable[str]=None):
+        if groups is None:
+            self._composer.clear()
+        else:
+            self._composer.discard(groups)
+
+    def precheck(self, settings_groups: Iterable[Tuple[str, ...]]):
+        precheck_settings_groups(settings_groups, self._composer,
+                                 lambda groups: read_groups(groups, self._read_group, processes=1))
+
+    def _read_group(self, group: str) -> VariableMap:
+        if group not in self.settings:
+            raise ValueError("Unknown settings group: \"%s\"" % group)
+        return to_variables(self.settings[group])
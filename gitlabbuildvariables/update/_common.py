@@ -1,6 +1,9 @@
 from abc import ABCMeta, abstractmethod
 
-from gitlabbuildvariables.common import GitLabConfig
+from typing import Optional
+
+from gitlabbuildvariables.backends import VariablesBackend, get_backend, GITLAB_BACKEND
+from gitlabbuildvariables.common import GitLabConfig, ApplyConfig
 
 
 class VariablesUpdater(metaclass=ABCMeta):
@@ -20,9 +23,14 @@ class VariablesUpdater(metaclass=ABCMeta):
         :return:
         """
 
-    def __init__(self, gitlab_config: GitLabConfig):
+    def __init__(self, gitlab_config: Optional[GitLabConfig], apply_config: ApplyConfig=None,
+                 backend: VariablesBackend=None):
         """
         Constructor.
-        :param gitlab_config: configuration required to access GitLab
+        :param gitlab_config: configuration required to access GitLab (only required if the GitLab backend is used)
+        :param apply_config: configuration of how changes are applied (defaults used if `None`)
+        :param backend: store of the projects' variables (the GitLab backend is used if `None`)
         """
-        self.gitlab_config = gitlab_config
\ No newline at end of file
+        self.gitlab_config = gitlab_config
+        self.apply_config = apply_config if apply_config is not None else ApplyConfig()
+        self.backend = backend if backend is not None else get_backend(GITLAB_BACKEND, gitlab_config)
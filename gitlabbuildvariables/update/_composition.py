@@ -0,0 +1,107 @@
+from collections import ChainMap
+from threading import RLock
+from types import MappingProxyType
+
+from typing import Callable, Dict, Iterable, Mapping, Set
+
+from gitlabbuildvariables.interpolation import interpolate
+from gitlabbuildvariables.models import VariableIdentifier, Variable, VariableMap
+
+ComposedVariables = Mapping[VariableIdentifier, Variable]
+GroupReader = Callable[[str], VariableMap]
+
+
+class _PrefixNode:
+    """
+    Node in a trie of settings group sequences, holding the variables composed from the groups on the path to it and,
+    once they have been needed, those variables with references to other variables resolved. The composed variables
+    are a chain of the variables of the groups on the path, so nodes share their ancestors' groups rather than copying
+    them.
+    """
+    __slots__ = ("variables", "resolved", "children")
+
+    def __init__(self, variables: ChainMap):
+        self.variables = variables
+        self.resolved = None    # type: ComposedVariables
+        self.children = {}  # type: Dict[str, _PrefixNode]
+
+
+class SettingsComposer:
+    """
+    Composes the variables of sequences of settings groups (later groups taking precedence).
+
+    Composed variables are memoised in a trie keyed by group, so each distinct prefix of a group sequence is composed
+    only once and projects with the same groups share the same (read-only) composed variables. Each node chains the
+    variables of its group onto those of its parent, so the memory used grows with the number of nodes and the depth of
+    the trie, not with the number of nodes and the number of keys. Each group is read only once.
+    References between variables (e.g. `${OTHER_VAR}`) are resolved once for each distinct composition.
+    A composer should only be used with group readers that give the same variables for the same group.
+    """
+    def __init__(self):
+        self._root = _PrefixNode(ChainMap())
+        self._groups_variables = {}     # type: Dict[str, VariableMap]
+        self._lock = RLock()
+
+    def compose(self, groups: Iterable[str], read_group: GroupReader) -> ComposedVariables:
+        """
+        Composes the variables of the given settings groups, resolving references between the composed variables.
+        :param groups: the settings groups (lowest preference first)
+        :param read_group: reader of the variables of a settings group, used when a group has not been read before
+        :return: read-only mapping of the composed variables, keyed by their identifiers
+        :raises InterpolationError: if the composed variables reference each other in a cycle
+        """
+        with self._lock:
+            node = self._root
+            for group in groups:
+                child = node.children.get(group)
+                if child is None:
+                    child = _PrefixNode(node.variables.new_child(self._read(group, read_group)))
+                    node.children[group] = child
+                node = child
+            if node.resolved is None:
+                node.resolved = interpolate(MappingProxyType(node.variables))
+            return node.resolved
+
+    def clear(self):
+        """
+        Discards all memoised group variables and compositions.
+        """
+        with self._lock:
+            self._root = _PrefixNode(ChainMap())
+            self._groups_variables.clear()
+
+    def discard(self, groups: Iterable[str]):
+        """
+        Discards the memoised variables of the given groups, along with the compositions that include them, so that
+        they are read and composed again when next needed. The compositions of other groups are kept.
+        :param groups: the settings groups to discard
+        """
+        groups = set(groups)
+        with self._lock:
+            for group in groups:
+                self._groups_variables.pop(group, None)
+            _prune(self._root, groups)
+
+    def _read(self, group: str, read_group: GroupReader) -> VariableMap:
+        """
+        Reads the variables of the given group, if they have not been read before.
+        :param group: the settings group
+        :param read_group: reader of the variables of a settings group
+        :return: the group's variables
+        """
+        if group not in self._groups_variables:
+            self._groups_variables[group] = read_group(group)
+        return self._groups_variables[group]
+
+
+def _prune(node: _PrefixNode, groups: Set[str]):
+    """
+    Removes the descendants of the given node that are composed from any of the given groups.
+    :param node: the node to prune from
+    :param groups: the settings groups to remove the compositions of
+    """
+    for group, child in list(node.children.items()):
+        if group in groups:
+            del node.children[group]
+        else:
+            _prune(child, groups)
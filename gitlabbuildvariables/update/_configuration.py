@@ -0,0 +1,228 @@
+import fnmatch
+import json
+import re
+from json import JSONDecodeError
+
+from typing import Iterable, Tuple, Iterator, Any, Dict, Pattern, List, TextIO, Optional
+
+_GLOB_CHARACTERS = "*?["
+_REGEX_DELIMITER = "/"
+_WHITESPACE = re.compile(r"\s*")
+_DEFAULT_CHUNK_SIZE = 64 * 1024
+_EXCERPT_LENGTH = 20
+
+ProjectSettingsGroups = Tuple[str, Tuple[str, ...]]
+
+
+class ProjectsConfiguration:
+    """
+    Immutable configuration of the settings groups of projects.
+
+    Projects may be identified by name or by pattern. A glob pattern (e.g. "team/*") is any identifier containing one
+    of "*", "?" or "[", and a regular expression is an identifier enclosed in "/" (e.g. "/team/.*-service/"). A project
+    that is named explicitly uses the groups given with its name; otherwise it uses the groups of the first pattern
+    that it matches.
+    """
+    def __init__(self, projects_settings_groups: Iterable[Tuple[str, Iterable[str]]]):
+        """
+        Constructor.
+        :param projects_settings_groups: tuples of project identifiers (names or patterns) and their settings groups
+        """
+        explicit = {}   # type: Dict[str, Tuple[str, ...]]
+        patterns = []   # type: List[Tuple[str, Pattern, Tuple[str, ...]]]
+        for identifier, groups in projects_settings_groups:
+            groups = tuple(groups)
+            pattern = _compile_pattern(identifier)
+            if pattern is None:
+                explicit[identifier] = groups
+            else:
+                patterns.append((identifier, pattern, groups))
+        self._explicit = explicit
+        self._patterns = tuple(patterns)
+
+    @property
+    def has_patterns(self) -> bool:
+        """
+        Whether any of the projects are identified by a pattern.
+        :return: whether there are patterns
+        """
+        return len(self._patterns) > 0
+
+    def items(self) -> Iterator[ProjectSettingsGroups]:
+        """
+        Iterates through the explicitly named projects and their settings groups.
+        :return: iterator of tuples of project name and settings groups
+        """
+        return iter(self._explicit.items())
+
+    def settings_groups(self) -> List[Tuple[str, ...]]:
+        """
+        Gets the distinct sequences of settings groups that projects (named or matched by a pattern) are to be set
+        from, which does not require the projects that patterns match to be known.
+        :return: the sequences of settings groups, in the order that they are configured
+        """
+        sequences = dict.fromkeys(self._explicit.values())
+        sequences.update(dict.fromkeys(groups for _, _, groups in self._patterns))
+        return list(sequences)
+
+    def expand(self, projects: Iterable[str]) -> Iterator[ProjectSettingsGroups]:
+        """
+        Iterates through the explicitly named projects, followed by the given projects that match a pattern, along
+        with their settings groups.
+        :param projects: all of the projects that patterns could match (e.g. from a namespace listing)
+        :return: iterator of tuples of project name and settings groups
+        """
+        yield from self._explicit.items()
+        if not self.has_patterns:
+            return
+        for project in projects:
+            if project in self._explicit:
+                continue
+            for _, pattern, groups in self._patterns:
+                if pattern.fullmatch(project) is not None:
+                    yield project, groups
+                    break
+
+    def __len__(self) -> int:
+        return len(self._explicit) + len(self._patterns)
+
+
+def read_projects_configuration(config_location: str, chunk_size: int=_DEFAULT_CHUNK_SIZE) -> ProjectsConfiguration:
+    """
+    Reads the projects configuration in the given JSON file, where keys identify projects and values are lists of
+    settings groups. The file is parsed incrementally so the whole of a very large configuration is never held as text.
+    :param config_location: the location of the configuration file
+    :param chunk_size: number of characters to read from the file at a time
+    :return: the projects configuration
+    """
+    with open(config_location, "r") as config_file:
+        return ProjectsConfiguration(iterate_json_object(config_file, chunk_size))
+
+
+def iterate_json_object(file: TextIO, chunk_size: int=_DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally parses the JSON object in the given file, yielding each of its items as soon as it has been read.
+    Nothing but whitespace may follow the object.
+    :param file: the file containing a JSON object
+    :param chunk_size: number of characters to read from the file at a time (more is read at once to complete a
+    value that is larger than this)
+    :return: iterator of the object's keys and values
+    :raises ValueError: if the file does not contain just a valid JSON object
+    """
+    return _JsonObjectStream(file, chunk_size).items()
+
+
+class _JsonObjectStream:
+    """
+    Incremental parser of a JSON object in a file.
+    """
+    def __init__(self, file: TextIO, chunk_size: int):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._end_of_file = False
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            self._position += 1
+            self._expect_end()
+            return
+        while True:
+            key = self._decode()
+            if not isinstance(key, str):
+                raise ValueError("Expected a string key in JSON object but got: %r" % key)
+            self._expect(":")
+            yield key, self._decode()
+            if self._expect(",}") == "}":
+                self._expect_end()
+                return
+
+    def _fill(self, size: int=0) -> bool:
+        """
+        Reads the next chunk of the file into the buffer, discarding the part of the buffer that has been parsed.
+        :param size: the number of characters to read, if more than the chunk size
+        :return: whether anything was read
+        """
+        chunk = self._file.read(max(self._chunk_size, size))
+        if chunk == "":
+            self._end_of_file = True
+            return False
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+        return True
+
+    def _peek(self) -> str:
+        """
+        Gets the next non-whitespace character, without consuming it.
+        :return: the next character
+        :raises ValueError: if the end of the file has been reached
+        """
+        while True:
+            self._position = _WHITESPACE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON object")
+
+    def _expect(self, characters: str) -> str:
+        """
+        Consumes the next non-whitespace character, which must be one of those given.
+        :param characters: the allowed characters
+        :return: the consumed character
+        :raises ValueError: if the next character is not allowed
+        """
+        character = self._peek()
+        if character not in characters:
+            raise ValueError("Expected one of %r in JSON object but got %r" % (characters, character))
+        self._position += 1
+        return character
+
+    def _expect_end(self):
+        """
+        Consumes the rest of the file, which must only be whitespace.
+        :raises ValueError: if there is anything else after the JSON object
+        """
+        while True:
+            self._position = _WHITESPACE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer):
+                raise ValueError("Unexpected content after JSON object: %r"
+                                 % self._buffer[self._position:self._position + _EXCERPT_LENGTH])
+            if not self._fill():
+                return
+
+    def _decode(self) -> Any:
+        """
+        Decodes the next JSON value, reading more of the file until the value is complete. Each time that the value is
+        found to be incomplete, at least as much again as has been read of it is read, so that a large (or malformed)
+        value is parsed a number of times that grows only logarithmically with its size.
+        :return: the decoded value
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except JSONDecodeError:
+                if not self._fill(len(self._buffer) - self._position):
+                    raise
+                continue
+            if end == len(self._buffer) and not self._end_of_file and self._fill(len(self._buffer) - self._position):
+                # The value (e.g. a number) may continue in the next chunk
+                continue
+            self._position = end
+            return value
+
+
+def _compile_pattern(identifier: str) -> Optional[Pattern]:
+    """
+    Compiles the given project identifier into a regular expression, if it is a pattern.
+    :param identifier: the project identifier
+    :return: the compiled pattern or `None` if the identifier is a plain project name
+    """
+    if len(identifier) > 2 and identifier.startswith(_REGEX_DELIMITER) and identifier.endswith(_REGEX_DELIMITER):
+        return re.compile(identifier[1:-1])
+    if any(character in identifier for character in _GLOB_CHARACTERS):
+        return re.compile(fnmatch.translate(identifier))
+    return None
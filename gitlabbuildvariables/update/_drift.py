@@ -0,0 +1,154 @@
+import os
+import tempfile
+
+from typing import List, Iterable
+
+from gitlabbuildvariables.models import VariableChanges
+
+_METRIC_PREFIX = "gitlab_variables_"
+
+
+class ProjectDrift:
+    """
+    How a project's variables have drifted from those that its settings define.
+    """
+    __slots__ = ("project", "added", "changed", "removed", "error")
+
+    def __init__(self, project: str, added: Iterable[str]=(), changed: Iterable[str]=(), removed: Iterable[str]=(),
+                 error: str=None):
+        """
+        Constructor.
+        :param project: the project that was checked
+        :param added: keys of variables in the settings that the project does not have
+        :param changed: keys of variables that the project has with different values or attributes
+        :param removed: keys of variables that the project has that are not in the settings
+        :param error: description of why the project could not be checked
+        """
+        self.project = project
+        self.added = sorted(set(added))
+        self.changed = sorted(set(changed))
+        self.removed = sorted(set(removed))
+        self.error = error
+
+    @staticmethod
+    def from_changes(project: str, changes: VariableChanges) -> "ProjectDrift":
+        """
+        Creates the drift of a project from the changes that would be required to update its variables.
+        :param project: the project that was checked
+        :param changes: the changes required to update the project's variables
+        :return: the drift
+        """
+        return ProjectDrift(project, (variable.key for variable in changes.added),
+                            (variable.key for variable in changes.changed),
+                            (variable.key for variable in changes.removed))
+
+    @property
+    def drifted(self) -> bool:
+        """
+        Whether the project's variables differ from its settings.
+        :return: whether drifted
+        """
+        return len(self.added) + len(self.changed) + len(self.removed) > 0
+
+    @property
+    def drifted_keys(self) -> int:
+        """
+        Gets the number of distinct keys whose variables differ from the settings.
+        :return: the number of keys
+        """
+        return len(set(self.added) | set(self.changed) | set(self.removed))
+
+    def __repr__(self) -> str:
+        return "ProjectDrift(project=%r, added=%r, changed=%r, removed=%r, error=%r)" \
+               % (self.project, self.added, self.changed, self.removed, self.error)
+
+
+class DriftReport:
+    """
+    Report of a check of whether the variables of projects have drifted from their settings.
+    """
+    def __init__(self, drifts: Iterable[ProjectDrift], duration: float, timestamp: float, error: str=None):
+        """
+        Constructor.
+        :param drifts: the drift of each project that was checked
+        :param duration: the time taken to check the projects, in seconds
+        :param timestamp: the (Unix) time at which the check finished
+        :param error: description of why the check as a whole failed (e.g. if the settings could not be read), in
+        which case no projects were checked
+        """
+        self.drifts = sorted(drifts, key=lambda drift: drift.project)  # type: List[ProjectDrift]
+        self.duration = duration
+        self.timestamp = timestamp
+        self.error = error
+
+    @property
+    def drifted(self) -> List[ProjectDrift]:
+        """
+        Gets the drift of the projects whose variables have drifted.
+        :return: the drifts of the drifted projects
+        """
+        return [drift for drift in self.drifts if drift.drifted]
+
+    @property
+    def failed(self) -> List[ProjectDrift]:
+        """
+        Gets the drift of the projects that could not be checked.
+        :return: the drifts of the projects that failed to be checked
+        """
+        return [drift for drift in self.drifts if drift.error is not None]
+
+    def to_prometheus(self) -> str:
+        """
+        Gets the report as metrics in the Prometheus text exposition format. The metrics of the drift are left out if
+        the check failed, so that a failed check is not taken to have found no drift.
+        :return: the metrics
+        """
+        lines = []  # type: List[str]
+
+        def add_metric(name: str, description: str, samples: Iterable[str]):
+            lines.append("# HELP %s%s %s" % (_METRIC_PREFIX, name, description))
+            lines.append("# TYPE %s%s gauge" % (_METRIC_PREFIX, name))
+            lines.extend("%s%s%s" % (_METRIC_PREFIX, name, sample) for sample in samples)
+
+        add_metric("check_failed", "Whether the last check failed as a whole (1) or not (0)",
+                   [" %d" % (self.error is not None)])
+        add_metric("check_duration_seconds", "Time taken to check the variables of the projects",
+                   [" %.6f" % self.duration])
+        add_metric("last_check_timestamp_seconds", "Time at which the variables of the projects were last checked",
+                   [" %.3f" % self.timestamp])
+        if self.error is not None:
+            return "\n".join(lines) + "\n"
+
+        drifted = self.drifted
+        add_metric("projects", "Number of projects whose variables were checked",
+                   [" %d" % len(self.drifts)])
+        add_metric("drifted_projects", "Number of projects whose variables differ from their settings",
+                   [" %d" % len(drifted)])
+        add_metric("drifted_keys", "Number of keys whose variables differ from their settings",
+                   [" %d" % sum(drift.drifted_keys for drift in drifted)])
+        add_metric("project_drifted_keys", "Number of keys whose variables differ from their settings, by project",
+                   ["{project=\"%s\"} %d" % (_escape_label(drift.project), drift.drifted_keys) for drift in drifted])
+        add_metric("failed_projects", "Number of projects whose variables could not be checked",
+                   [" %d" % len(self.failed)])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, location: str):
+        """
+        Writes the report as Prometheus metrics (e.g. for the node exporter's textfile collector) to the given location.
+        The file is replaced atomically, so it is never seen partly written.
+        :param location: the location to write to
+        """
+        directory = os.path.dirname(os.path.abspath(location))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as file:
+            file.write(self.to_prometheus())
+        os.chmod(file.name, 0o644)
+        os.replace(file.name, location)
+
+
+def _escape_label(value: str) -> str:
+    """
+    Escapes the given label value for the Prometheus text format.
+    :param value: the label value
+    :return: the escaped value
+    """
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
@@ -1,10 +1,20 @@
-import json
+import time
 from abc import ABCMeta, abstractmethod
-from typing import Iterable, Tuple, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from gitlabbuildvariables.common import GitLabConfig
+from typing import Iterable, Tuple, Dict, Optional, Iterator, Set
+
+from gitlabbuildvariables.backends import VariablesBackend
+from gitlabbuildvariables.common import GitLabConfig, ApplyConfig, DEFAULT_MAX_CONCURRENCY
+from gitlabbuildvariables.journal import RunCheckpoint
+from gitlabbuildvariables.tracing import tracer
 from gitlabbuildvariables.update._builders import ProjectVariablesUpdaterBuilder
-from gitlabbuildvariables.update._single_project_updaters import logger
+from gitlabbuildvariables.update._drift import DriftReport, ProjectDrift
+from gitlabbuildvariables.update._configuration import ProjectsConfiguration, ProjectSettingsGroups, \
+    read_projects_configuration
+from gitlabbuildvariables.update._results import ProjectUpdateResult, SKIPPED_STATUS
+from gitlabbuildvariables.update._sharding import Shard
+from gitlabbuildvariables.update._single_project_updaters import logger, ProjectVariablesUpdater
 from gitlabbuildvariables.update._common import VariablesUpdater
 
 
@@ -20,28 +30,240 @@ class ProjectsVariablesUpdater(VariablesUpdater, metaclass=ABCMeta):
         settings groups
         """
 
-    def __init__(self, project_variables_updater_builder: ProjectVariablesUpdaterBuilder, gitlab_config: GitLabConfig):
+    @abstractmethod
+    def _get_settings_groups(self) -> Iterable[Tuple[str, ...]]:
+        """
+        Gets the distinct sequences of settings groups that projects are configured with, without accessing GitLab.
+        :return: iterable of sequences of settings groups
+        """
+
+    def __init__(self, project_variables_updater_builder: ProjectVariablesUpdaterBuilder, gitlab_config: GitLabConfig,
+                 apply_config: ApplyConfig=None, backend: VariablesBackend=None, shard: Shard=None,
+                 checkpoint: RunCheckpoint=None):
         """
         Constructor.
         :param project_variables_updater_builder: builder for project variables updaters
         :param gitlab_config: the configuration required to access GitLab
+        :param apply_config: the configuration of how changes are applied
+        :param backend: the store of the projects' variables (the GitLab backend is used if `None`)
+        :param shard: the shard of the projects to update (all projects are updated if `None`)
+        :param checkpoint: checkpoint in which to record each project as it is updated (not recorded if `None`). If
+        resuming is configured, projects recorded in the checkpoint as updated to the same variables are skipped
         """
-        super().__init__(gitlab_config)
+        super().__init__(gitlab_config, apply_config, backend)
         self.project_variables_updater_builder = project_variables_updater_builder
+        self.shard = shard
+        self.checkpoint = checkpoint
+        self._projects = None           # type: Optional[Tuple[str, ...]]
+        self._prechecked = False
+
+    def precheck(self):
+        """
+        Checks that the settings groups of all of the configured projects (in any shard) can be read and composed,
+        before GitLab is accessed, so that a broken configuration fails before any project has been changed. Called
+        before projects are updated (the check is only made once).
+        :raises PrecheckError: if any of the groups cannot be read or composed, describing all of the problems
+        """
+        if self._prechecked:
+            return
+        with tracer.span("precheck"):
+            self.project_variables_updater_builder.precheck(self._get_settings_groups())
+        self._prechecked = True
 
     def update(self):
-        for project, settings_group in self._get_projects_and_settings_groups():
-            project_updater = self.project_variables_updater_builder.build(
-                project=project, groups=settings_group, gitlab_config=self.gitlab_config)
-            project_updater.update()
+        for _ in self._update_projects(carry_on=False):
+            pass
+
+    def update_projects(self) -> Iterator[ProjectUpdateResult]:
+        """
+        Updates the build variables of each project in turn, carrying on if updating a project fails.
+        :return: iterator of the result of updating each project, given as each project is updated
+        """
+        return self._update_projects(carry_on=True)
+
+    def _update_projects(self, carry_on: bool) -> Iterator[ProjectUpdateResult]:
+        """
+        Updates the build variables of each project in turn, recording each project that is updated in the checkpoint
+        (if there is one). The checkpoint is removed once all of the projects have been updated.
+        :param carry_on: whether to carry on if updating a project fails, rather than raising the error
+        :return: iterator of the result of updating each project, given as each project is updated
+        :raises PrecheckError: if any of the settings groups cannot be read or composed (before any project is updated)
+        """
+        self.precheck()
+        if self.checkpoint is not None:
+            if self.apply_config.resume:
+                self.checkpoint.load()
+            else:
+                self.checkpoint.finish()
+        succeeded = True
+        for project, settings_group in self._get_sharded_projects_and_settings_groups():
+            updater = self._build_project_updater(project, tuple(settings_group))
+            try:
+                inputs_digest = updater.inputs_digest() if self.checkpoint is not None else None
+                if inputs_digest is not None and self.checkpoint.is_completed(project, inputs_digest):
+                    logger.info("Skipping \"%s\", which has already been updated" % project)
+                    yield ProjectUpdateResult(project, SKIPPED_STATUS)
+                    continue
+                changes = updater.update()
+            except Exception as e:
+                if not carry_on:
+                    raise
+                succeeded = False
+                logger.error("Failed to set variables for \"%s\": %s" % (project, e))
+                yield ProjectUpdateResult.from_error(project, e)
+                continue
+            if self.checkpoint is not None:
+                self.checkpoint.record_completed(project, inputs_digest)
+            yield ProjectUpdateResult.from_changes(project, changes)
+        if self.checkpoint is not None and succeeded:
+            self.checkpoint.finish()
+
+    def update_required(self, max_concurrency: int=DEFAULT_MAX_CONCURRENCY) -> bool:
+        """
+        Whether the build variables of any of the projects need to be updated, checking projects concurrently and
+        stopping as soon as one needs to be. If fingerprints are configured, only the fingerprints of projects are
+        fetched, unless they do not match.
+        :param max_concurrency: the maximum number of projects to check concurrently
+        :return: whether an update is required
+        :raises PrecheckError: if any of the settings groups cannot be read or composed
+        """
+        self.precheck()
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = [executor.submit(self._build_project_updater(project, tuple(settings_group)).update_required)
+                       for project, settings_group in self._get_sharded_projects_and_settings_groups()]
+            try:
+                for future in as_completed(futures):
+                    if future.result():
+                        return True
+                return False
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def check_drift(self, max_concurrency: int=1) -> DriftReport:
+        """
+        Checks whether the variables of the projects have drifted from those that their settings define (e.g. because
+        they have been edited in GitLab), without changing them. The projects' variables are listed again on each
+        check, unless fingerprints are configured, in which case only the fingerprints of projects are fetched (so
+        edits that do not change a fingerprint are not seen) and variables are only listed if they do not match.
+        :param max_concurrency: the maximum number of projects to check concurrently
+        :return: report of the drift of each project
+        :raises PrecheckError: if any of the settings groups cannot be read or composed
+        """
+        started = time.monotonic()
+        self.precheck()
+        updaters = (self._build_project_updater(project, tuple(settings_group))
+                    for project, settings_group in self._get_sharded_projects_and_settings_groups())
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            drifts = list(executor.map(_check_drift, updaters))
+        return DriftReport(drifts, time.monotonic() - started, time.time())
+
+    def get_settings_groups(self) -> Set[str]:
+        """
+        Gets the settings groups that the configured projects (in any shard) are set from, without accessing GitLab.
+        :return: the settings groups
+        """
+        return {group for settings_groups in self._get_settings_groups() for group in settings_groups}
+
+    def update_groups(self, groups: Iterable[str]) -> Iterator[ProjectUpdateResult]:
+        """
+        Updates only the projects that are set from any of the given settings groups (e.g. because they have changed),
+        carrying on if updating a project fails. Just the given groups are read again: the other settings, the
+        configuration and the projects that patterns match are kept. The projects' variables are listed again before
+        they are updated, to see any changes made by others.
+        :param groups: the settings groups
+        :return: iterator of the result of updating each affected project, given as each project is updated
+        :raises PrecheckError: if any of the affected settings groups cannot be read or composed (before any project is
+        updated)
+        """
+        groups = set(groups)
+        self.refresh(groups)
+        affected = [sequence for sequence in self._get_settings_groups() if not groups.isdisjoint(sequence)]
+        with tracer.span("precheck"):
+            self.project_variables_updater_builder.precheck(affected)
+        return self._update_affected_projects(groups)
 
-    def update_required(self) -> bool:
-        for project, settings_group in self._get_projects_and_settings_groups():
-            project_updater = self.project_variables_updater_builder.build(
-                project=project, groups=settings_group, gitlab_config=self.gitlab_config)
-            if project_updater.update_required():
-                return True
-        return False
+    def refresh(self, groups: Iterable[str]=None):
+        """
+        Discards the configuration, settings and projects that have been read, so that changes to them are seen when
+        they are next needed (e.g. between drift checks).
+        :param groups: the only settings groups to discard, keeping everything else that has been read (everything is
+        discarded if `None`)
+        """
+        if groups is None:
+            self.project_variables_updater_builder.refresh()
+            self._projects = None
+        else:
+            self.project_variables_updater_builder.refresh(set(groups))
+        self._prechecked = False
+
+    def _update_affected_projects(self, groups: Set[str]) -> Iterator[ProjectUpdateResult]:
+        """
+        Updates the projects that are set from any of the given settings groups, carrying on if updating a project
+        fails.
+        :param groups: the settings groups
+        :return: iterator of the result of updating each affected project
+        """
+        for project, settings_groups in self._get_sharded_projects_and_settings_groups():
+            if groups.isdisjoint(settings_groups):
+                continue
+            try:
+                changes = self._build_project_updater(project, tuple(settings_groups)).update(refresh=True)
+            except Exception as e:
+                logger.error("Failed to set variables for \"%s\": %s" % (project, e))
+                yield ProjectUpdateResult.from_error(project, e)
+                continue
+            yield ProjectUpdateResult.from_changes(project, changes)
+
+    def _get_sharded_projects_and_settings_groups(self) -> Iterable[Tuple[str, Iterable[str]]]:
+        """
+        Gets the projects in this updater's shard and their associated settings groups.
+        :return: iterable of tuples where the first item is the project identifier and the second is a list of their
+        settings groups
+        """
+        projects_and_settings_groups = self._get_projects_and_settings_groups()
+        if self.shard is None:
+            return projects_and_settings_groups
+        return ((project, settings_groups) for project, settings_groups in projects_and_settings_groups
+                if self.shard.contains(project))
+
+    def _build_project_updater(self, project: str, settings_group: Tuple[str, ...]) -> ProjectVariablesUpdater:
+        """
+        Builds an updater for the given project.
+        :param project: the project to build the updater for
+        :param settings_group: the project's settings groups
+        :return: the project's updater
+        """
+        return self.project_variables_updater_builder.build(
+            project=project, groups=settings_group, gitlab_config=self.gitlab_config, apply_config=self.apply_config,
+            backend=self.backend)
+
+    def _expand(self, configuration: ProjectsConfiguration) -> Iterable[ProjectSettingsGroups]:
+        """
+        Expands the projects identified by patterns in the given configuration. The projects in the backend are listed
+        at most once, when a pattern first needs to be expanded.
+        :param configuration: the projects configuration
+        :return: iterable of tuples of project name and settings groups
+        """
+        if configuration.has_patterns and self._projects is None:
+            with tracer.span("list projects"):
+                self._projects = tuple(self.backend.list_projects())
+        return configuration.expand(self._projects if self._projects is not None else ())
+
+
+def _check_drift(updater: ProjectVariablesUpdater) -> ProjectDrift:
+    """
+    Checks whether the variables of the given updater's project have drifted from its settings.
+    :param updater: the project's updater
+    :return: the project's drift (with the error if the project could not be checked)
+    """
+    try:
+        if updater.apply_config.fingerprint and updater.fingerprint_matches():
+            return ProjectDrift(updater.project)
+        return ProjectDrift.from_changes(updater.project, updater.diff(refresh=True))
+    except Exception as e:
+        logger.error("Failed to check variables of \"%s\": %s" % (updater.project, e))
+        return ProjectDrift(updater.project, error="%s: %s" % (type(e).__name__, e))
 
 
 class FileBasedProjectsVariablesUpdater(ProjectsVariablesUpdater):
@@ -49,23 +271,44 @@ class FileBasedProjectsVariablesUpdater(ProjectsVariablesUpdater):
     Updates variables for projects in GitLab CI, as defined by a configuration file.
     """
     def __init__(self, config_location: str, project_variables_updater_builder: ProjectVariablesUpdaterBuilder,
-                 gitlab_config: GitLabConfig):
+                 gitlab_config: GitLabConfig, apply_config: ApplyConfig=None, backend: VariablesBackend=None,
+                 shard: Shard=None, checkpoint: RunCheckpoint=None):
         """
         Constructor.
         :param config_location: the location of the config file for setting project variables from settings groups
         :param project_variables_updater_builder: see `ProjectsVariablesUpdater.__init__`
         :param gitlab_config: see `ProjectsVariablesUpdater.__init__`
+        :param apply_config: see `ProjectsVariablesUpdater.__init__`
+        :param backend: see `ProjectsVariablesUpdater.__init__`
+        :param shard: see `ProjectsVariablesUpdater.__init__`
+        :param checkpoint: see `ProjectsVariablesUpdater.__init__`
         """
-        super().__init__(project_variables_updater_builder, gitlab_config)
+        super().__init__(project_variables_updater_builder, gitlab_config, apply_config, backend, shard, checkpoint)
         self.config_location = config_location
+        self._configuration = None  # type: Optional[ProjectsConfiguration]
 
     def _get_projects_and_settings_groups(self) -> Iterable[Tuple[str, Iterable[str]]]:
-        with open(self.config_location, "r") as config_file:
-            config = config_file.read()
-        config = json.loads(config)
-        logger.info("Read config from \"%s\"" % self.config_location)
-        logger.debug("Config: %s" % config)
-        return config.items()
+        return self._expand(self._get_configuration())
+
+    def _get_settings_groups(self) -> Iterable[Tuple[str, ...]]:
+        return self._get_configuration().settings_groups()
+
+    def refresh(self, groups: Iterable[str]=None):
+        super().refresh(groups)
+        if groups is None:
+            self._configuration = None
+
+    def _get_configuration(self) -> ProjectsConfiguration:
+        """
+        Gets the projects configuration, which is read from the config file only once.
+        :return: the projects configuration
+        """
+        if self._configuration is None:
+            with tracer.span("read config", location=self.config_location):
+                self._configuration = read_projects_configuration(self.config_location)
+            logger.info("Read config from \"%s\"" % self.config_location)
+            logger.debug("Config: %s" % dict(self._configuration.items()))
+        return self._configuration
 
 
 class DictBasedProjectsVariablesUpdater(ProjectsVariablesUpdater):
@@ -73,15 +316,24 @@ class DictBasedProjectsVariablesUpdater(ProjectsVariablesUpdater):
     Updates variables for projects in GitLab CI, as defined by a configuration Python dictionary.
     """
     def __init__(self, configuration: Dict[str, Dict[str, str]],
-                 project_variables_updater_builder: ProjectVariablesUpdaterBuilder, gitlab_config: GitLabConfig):
+                 project_variables_updater_builder: ProjectVariablesUpdaterBuilder, gitlab_config: GitLabConfig,
+                 apply_config: ApplyConfig=None, backend: VariablesBackend=None, shard: Shard=None,
+                 checkpoint: RunCheckpoint=None):
         """
         Constructor.
         :param configuration: project variables configuration
         :param project_variables_updater_builder: see `ProjectsVariablesUpdater.__init__`
         :param gitlab_config: see `ProjectsVariablesUpdater.__init__`
+        :param apply_config: see `ProjectsVariablesUpdater.__init__`
+        :param backend: see `ProjectsVariablesUpdater.__init__`
+        :param shard: see `ProjectsVariablesUpdater.__init__`
+        :param checkpoint: see `ProjectsVariablesUpdater.__init__`
         """
-        super().__init__(project_variables_updater_builder, gitlab_config)
+        super().__init__(project_variables_updater_builder, gitlab_config, apply_config, backend, shard, checkpoint)
         self.configuration = configuration
 
     def _get_projects_and_settings_groups(self) -> Iterable[Tuple[str, Iterable[str]]]:
-        return self.configuration.items()
+        return self._expand(ProjectsConfiguration(self.configuration.items()))
+
+    def _get_settings_groups(self) -> Iterable[Tuple[str, ...]]:
+        return ProjectsConfiguration(self.configuration.items()).settings_groups()
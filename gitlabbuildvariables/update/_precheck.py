@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+from gitlabbuildvariables.interpolation import InterpolationError
+from gitlabbuildvariables.models import VariableMap
+from gitlabbuildvariables.repositories import close_settings_repositories, forget_settings_repositories
+from gitlabbuildvariables.update._composition import SettingsComposer, GroupReader
+
+GroupsReadResults = Tuple[Dict[str, VariableMap], Dict[str, str]]
+
+
+class PrecheckError(ValueError):
+    """
+    Raised if settings groups cannot be read or composed.
+    """
+    def __init__(self, errors: Dict[str, str]):
+        """
+        Constructor.
+        :param errors: descriptions of what is wrong, keyed by the settings group (or sequence of groups) that is wrong
+        """
+        super().__init__("%d problem(s) found in the settings groups:\n%s" % (
+            len(errors), "\n".join("  %s: %s" % (groups, error) for groups, error in sorted(errors.items()))))
+        self.errors = errors
+
+
+def read_groups(groups: Iterable[str], read_group: GroupReader, processes: int=None) -> GroupsReadResults:
+    """
+    Reads all of the given settings groups, carrying on past groups that cannot be read. If there are many groups, they
+    are read (and parsed) in parallel by a pool of processes, so the reader must be picklable (e.g. a module-level
+    function or a `functools.partial` of one).
+    :param groups: the settings groups to read
+    :param read_group: reader of the variables of a settings group
+    :param processes: maximum number of processes to read groups with (the number of CPUs if `None`)
+    :return: tuple of the variables of the groups that were read, keyed by group, and descriptions of why the other
+    groups could not be read, keyed by group
+    """
+    groups = list(dict.fromkeys(groups))
+    processes = min(len(groups), processes if processes is not None else os.cpu_count() or 1)
+    if processes <= 1:
+        results = map(_ReadGroupCarryingOn(read_group), groups)
+        return _split_results(zip(groups, results))
+    with ProcessPoolExecutor(max_workers=processes, initializer=_initialise_worker) as executor:
+        results = executor.map(_ReadGroupCarryingOn(read_group), groups,
+                               chunksize=max(1, len(groups) // (processes * 4)))
+        return _split_results(zip(groups, results))
+
+
+def precheck_settings_groups(settings_groups: Iterable[Tuple[str, ...]], composer: SettingsComposer,
+                             read_groups_function: Callable[[List[str]], GroupsReadResults]):
+    """
+    Checks that every one of the given sequences of settings groups can be read and composed, before anything is
+    changed. The groups that are read, and the compositions, are kept by the given composer so they are not read again.
+    :param settings_groups: sequences of settings groups (lowest preference first)
+    :param composer: composer that will later compose the sequences
+    :param read_groups_function: reader of all of the given groups (see `read_groups`)
+    :raises PrecheckError: if any of the groups cannot be read or composed, describing all of the problems
+    """
+    settings_groups = list(settings_groups)
+    groups_variables, errors = read_groups_function(
+        list(dict.fromkeys(group for groups in settings_groups for group in groups)))
+    for groups in settings_groups:
+        if any(group in errors for group in groups):
+            continue
+        try:
+            composer.compose(groups, groups_variables.__getitem__)
+        except InterpolationError as e:
+            errors[" + ".join(groups)] = _describe(e)
+    if len(errors) > 0:
+        raise PrecheckError(errors)
+
+
+class _ReadGroupCarryingOn:
+    """
+    Picklable wrapper of a group reader, which gives the description of the error instead of raising it (so that
+    errors that cannot be pickled are not lost).
+    """
+    def __init__(self, read_group: GroupReader):
+        self.read_group = read_group
+
+    def __call__(self, group: str) -> Union[VariableMap, str]:
+        try:
+            return self.read_group(group)
+        except Exception as e:
+            return _describe(e)
+
+
+def _initialise_worker():
+    """
+    Initialises a process that reads groups, so that it opens its own settings repositories rather than using those
+    that it may have inherited from its parent, and closes them (e.g. stopping their git processes) when it exits.
+    """
+    forget_settings_repositories()
+    # Unlike atexit handlers, finalisers with an exit priority are run when a pool's worker process exits
+    Finalize(None, close_settings_repositories, exitpriority=0)
+
+
+def _split_results(results: Iterable[Tuple[str, Union[VariableMap, str]]]) -> GroupsReadResults:
+    """
+    Splits the results of reading groups into the variables of the groups and the errors.
+    :param results: tuples of group and either its variables or a description of why it could not be read
+    :return: see `read_groups`
+    """
+    groups_variables = {}   # type: Dict[str, VariableMap]
+    errors = {}             # type: Dict[str, str]
+    for group, result in results:
+        if isinstance(result, str):
+            errors[group] = result
+        else:
+            groups_variables[group] = result
+    return groups_variables, errors
+
+
+def _describe(error: Exception) -> str:
+    return "%s: %s" % (type(error).__name__, error)
@@ -0,0 +1,180 @@
+import json
+import os
+import tempfile
+from collections import Counter
+
+from typing import List, Dict, Any, Iterable, Optional
+
+from gitlabbuildvariables.models import VariableChanges
+from gitlabbuildvariables.update._sharding import Shard
+
+UPDATED_STATUS = "updated"
+UNCHANGED_STATUS = "unchanged"
+FAILED_STATUS = "failed"
+SKIPPED_STATUS = "skipped"
+
+_SHARD_PROPERTY = "shard"
+_PROJECTS_PROPERTY = "projects"
+_PROJECT_PROPERTY = "project"
+_STATUS_PROPERTY = "status"
+_ADDED_PROPERTY = "added"
+_CHANGED_PROPERTY = "changed"
+_REMOVED_PROPERTY = "removed"
+_ERROR_PROPERTY = "error"
+
+
+class ProjectUpdateResult:
+    """
+    The result of updating a project's variables.
+    """
+    __slots__ = ("project", "status", "added", "changed", "removed", "error")
+
+    def __init__(self, project: str, status: str, added: int=0, changed: int=0, removed: int=0, error: str=None):
+        """
+        Constructor.
+        :param project: the project that was updated
+        :param status: the outcome (one of `UPDATED_STATUS`, `UNCHANGED_STATUS`, `FAILED_STATUS` or `SKIPPED_STATUS`,
+        if the project had already been updated by a run that was resumed)
+        :param added: the number of variables that were added
+        :param changed: the number of variables that were changed
+        :param removed: the number of variables that were removed
+        :param error: description of why the update failed
+        """
+        self.project = project
+        self.status = status
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.error = error
+
+    @staticmethod
+    def from_changes(project: str, changes: VariableChanges) -> "ProjectUpdateResult":
+        """
+        Creates the result of a successful update that made the given changes.
+        :param project: the project that was updated
+        :param changes: the changes that were made
+        :return: the result
+        """
+        return ProjectUpdateResult(project, UPDATED_STATUS if len(changes) > 0 else UNCHANGED_STATUS,
+                                   len(changes.added), len(changes.changed), len(changes.removed))
+
+    @staticmethod
+    def from_error(project: str, error: Exception) -> "ProjectUpdateResult":
+        """
+        Creates the result of an update that failed with the given error.
+        :param project: the project that failed to update
+        :param error: the error
+        :return: the result
+        """
+        return ProjectUpdateResult(project, FAILED_STATUS, error="%s: %s" % (type(error).__name__, error))
+
+    def to_json(self) -> Dict[str, Any]:
+        json_result = {_PROJECT_PROPERTY: self.project, _STATUS_PROPERTY: self.status, _ADDED_PROPERTY: self.added,
+                       _CHANGED_PROPERTY: self.changed, _REMOVED_PROPERTY: self.removed}
+        if self.error is not None:
+            json_result[_ERROR_PROPERTY] = self.error
+        return json_result
+
+    @staticmethod
+    def from_json(json_result: Dict[str, Any]) -> "ProjectUpdateResult":
+        return ProjectUpdateResult(
+            json_result[_PROJECT_PROPERTY], json_result[_STATUS_PROPERTY], json_result.get(_ADDED_PROPERTY, 0),
+            json_result.get(_CHANGED_PROPERTY, 0), json_result.get(_REMOVED_PROPERTY, 0),
+            json_result.get(_ERROR_PROPERTY))
+
+    def __repr__(self) -> str:
+        return "ProjectUpdateResult(project=%r, status=%r)" % (self.project, self.status)
+
+
+class UpdateResults:
+    """
+    The results of updating the variables of projects (e.g. those in a shard).
+    """
+    def __init__(self, results: Iterable[ProjectUpdateResult]=(), shard: str=None):
+        """
+        Constructor.
+        :param results: the results of updating each project
+        :param shard: the shard of projects that was updated (e.g. "1/4"), if sharded
+        """
+        self.results = list(results)    # type: List[ProjectUpdateResult]
+        self.shard = shard
+
+    @property
+    def succeeded(self) -> bool:
+        """
+        Whether all of the projects were updated successfully.
+        :return: whether successful
+        """
+        return all(result.status != FAILED_STATUS for result in self.results)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {_SHARD_PROPERTY: self.shard, _PROJECTS_PROPERTY: [result.to_json() for result in self.results]}
+
+    @staticmethod
+    def from_json(json_results: Dict[str, Any]) -> "UpdateResults":
+        return UpdateResults((ProjectUpdateResult.from_json(json_result)
+                              for json_result in json_results[_PROJECTS_PROPERTY]), json_results.get(_SHARD_PROPERTY))
+
+    def write(self, location: str):
+        """
+        Writes the results to the given location as JSON. The file is replaced atomically, so it is never seen partly
+        written, and is readable by everyone (e.g. by the CI job that merges the results of shards).
+        :param location: the location to write to
+        """
+        directory = os.path.dirname(os.path.abspath(location))
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as file:
+            json.dump(self.to_json(), file, indent=4)
+        os.chmod(file.name, 0o644)
+        os.replace(file.name, location)
+
+    @staticmethod
+    def read(location: str) -> "UpdateResults":
+        """
+        Reads results from the given location.
+        :param location: the location of results written by `write`
+        :return: the results
+        """
+        with open(location, "r") as file:
+            return UpdateResults.from_json(json.load(file))
+
+
+def merge_results(shards_results: Iterable[UpdateResults]) -> Dict[str, Any]:
+    """
+    Merges the results of updating shards of projects into a single report.
+    :param shards_results: the results of each shard
+    :return: report of the status of each project, the number of projects with each status, the shards that are missing
+    (if the results are of shards) and whether everything succeeded
+    :raises ValueError: if the results are of shards of different counts, or if a shard or project has more than one
+    result (e.g. because the same results were given twice)
+    """
+    results = []    # type: List[ProjectUpdateResult]
+    projects = set()
+    shards = set()
+    shard_count = None  # type: Optional[int]
+    for shard_results in shards_results:
+        if shard_results.shard is not None:
+            shard = Shard.parse(shard_results.shard)
+            if shard_count is not None and shard.count != shard_count:
+                raise ValueError("Cannot merge the results of shards of different counts (%d and %d)"
+                                 % (shard_count, shard.count))
+            if shard.index in shards:
+                raise ValueError("The results of shard %s are given more than once" % shard)
+            shard_count = shard.count
+            shards.add(shard.index)
+        for result in shard_results.results:
+            if result.project in projects:
+                raise ValueError("The results of project \"%s\" are given more than once" % result.project)
+            projects.add(result.project)
+        results.extend(shard_results.results)
+    missing_shards = [str(Shard(index, shard_count)) for index in range(1, shard_count + 1) if index not in shards] \
+        if shard_count is not None else []
+    results.sort(key=lambda result: result.project)
+    statuses = Counter(result.status for result in results)
+    return {
+        "succeeded": statuses[FAILED_STATUS] == 0 and len(missing_shards) == 0,
+        "totals": {status: statuses[status]
+                   for status in (UPDATED_STATUS, UNCHANGED_STATUS, FAILED_STATUS, SKIPPED_STATUS)},
+        "missing_shards": missing_shards,
+        "failed": [result.to_json() for result in results if result.status == FAILED_STATUS],
+        _PROJECTS_PROPERTY: [result.to_json() for result in results]
+    }
@@ -0,0 +1,81 @@
+import hashlib
+import re
+
+_SHARD_SPECIFICATION = re.compile(r"^(?P<index>\d+)/(?P<count>\d+)$")
+
+
+class Shard:
+    """
+    One of a number of disjoint shards that projects are partitioned into, so that the projects can be updated by
+    separate jobs (e.g. with `Shard(os.environ["CI_NODE_INDEX"], os.environ["CI_NODE_TOTAL"])` in parallel CI jobs).
+
+    Projects are assigned to shards by rendezvous hashing: each project is in the shard for which the hash of the
+    project and shard is highest. A project's shard depends only on its name and the number of shards, so adding or
+    removing projects does not move any other project, and changing the number of shards moves as few projects as
+    possible.
+    """
+    def __init__(self, index: int, count: int):
+        """
+        Constructor.
+        :param index: the index of the shard (from 1)
+        :param count: the number of shards
+        :raises ValueError: if the index is not within the shards
+        """
+        index, count = int(index), int(count)
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError("Shard %d/%d does not exist" % (index, count))
+        self.index = index
+        self.count = count
+
+    @staticmethod
+    def parse(specification: str) -> "Shard":
+        """
+        Parses the given specification of a shard, e.g. "2/4" for the second of four shards.
+        :param specification: the specification
+        :return: the shard
+        :raises ValueError: if the specification is not valid
+        """
+        match = _SHARD_SPECIFICATION.match(specification.strip())
+        if match is None:
+            raise ValueError("Invalid shard \"%s\": expected <index>/<count> (e.g. \"1/4\")" % specification)
+        return Shard(int(match.group("index")), int(match.group("count")))
+
+    def contains(self, project: str) -> bool:
+        """
+        Gets whether the given project is in this shard.
+        :param project: the project of interest
+        :return: whether the project is in the shard
+        """
+        return assign_shard(project, self.count) == self.index
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Shard) and (self.index, self.count) == (other.index, other.count)
+
+    def __hash__(self) -> int:
+        return hash((self.index, self.count))
+
+    def __str__(self) -> str:
+        return "%d/%d" % (self.index, self.count)
+
+    def __repr__(self) -> str:
+        return "Shard(%d, %d)" % (self.index, self.count)
+
+
+def assign_shard(project: str, count: int) -> int:
+    """
+    Assigns the given project to one of the given number of shards, using rendezvous hashing.
+    :param project: the project to assign
+    :param count: the number of shards
+    :return: the index of the project's shard (from 1)
+    """
+    return max(range(1, count + 1), key=lambda index: _weight(project, index))
+
+
+def _weight(project: str, index: int) -> bytes:
+    """
+    Gets the weight of the given project in the shard with the given index, which is stable across processes.
+    :param project: the project
+    :param index: the index of the shard
+    :return: the weight
+    """
+    return hashlib.blake2b(("%d\0%s" % (index, project)).encode(), digest_size=8).digest()
@@ -1,58 +1,123 @@
 import logging
 import os
 from abc import ABCMeta, abstractmethod
-from typing import List, Dict, Iterable
+from typing import List, Dict, Iterable, Union, Tuple, Optional
 
 from gitlabbuildvariables.manager import ProjectVariablesManager
-from gitlabbuildvariables.reader import read_variables
+from gitlabbuildvariables.models import Variable, VariableMap, VariableChanges, to_variables, to_key_values, \
+    digest_variables
+from gitlabbuildvariables.repositories import SettingsRepository, DirectorySettingsRepository, \
+    get_settings_repository
+from gitlabbuildvariables.tracing import tracer, PROJECT_CATEGORY
 from gitlabbuildvariables.update._common import VariablesUpdater
+from gitlabbuildvariables.update._composition import SettingsComposer, ComposedVariables
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 
+_FILE_SYSTEM = DirectorySettingsRepository("")
+
 
 class ProjectVariablesUpdater(VariablesUpdater, metaclass=ABCMeta):
     """
     Updates variables for a project in GitLab CI.
     """
     @abstractmethod
-    def _read_group_variables(self, group: str) -> Dict[str, str]:
+    def _read_group_variables(self, group: str) -> VariableMap:
         """
         Reads the setting variables associated to the given group identifier.
         :param group: the identifier of the group
-        :return: the setting variables associated to the given group
+        :return: the setting variables associated to the given group, keyed by their identifiers
         """
 
-    def __init__(self, project: str, groups: Iterable[str], **kwargs):
+    def __init__(self, project: str, groups: Iterable[str], composer: SettingsComposer=None, **kwargs):
         """
         Constructor.
         :param project: name or ID of the project to update variables for
         :param groups: lgroups of settings variables that are to be set (lowest preference first)
+        :param composer: composer of settings groups, which may be shared by updaters that read groups in the same way
+        (a composer private to this updater is used if `None`)
         :param kwargs: named arguments required in `VariablesUpdater` constructor
         """
         super().__init__(**kwargs)
         self.project = project
         self.groups = groups
-        self._variables_manager = ProjectVariablesManager(self.gitlab_config, project)
+        self._composer = composer if composer is not None else SettingsComposer()
+        self._manager = None    # type: Optional[ProjectVariablesManager]
 
-    def update(self):
-        variables = self._get_variables()
-        self._variables_manager.set(variables)
-        logger.info("Set variables for \"%s\": %s" % (self.project, variables))
+    @property
+    def _variables_manager(self) -> ProjectVariablesManager:
+        """
+        Gets the manager of the project's variables, which is only created (and so only checks that the project exists)
+        when the project's variables are first needed.
+        :return: the project's variables manager
+        """
+        if self._manager is None:
+            self._manager = ProjectVariablesManager(self.gitlab_config, self.project, self.apply_config,
+                                                    backend=self.backend)
+        return self._manager
+
+    def update(self, refresh: bool=False) -> VariableChanges:
+        """
+        Updates the project's build variables in GitLab CI.
+        :param refresh: whether to list the project's variables again, rather than use those already listed (e.g. to
+        see changes made by others)
+        :return: the changes that were made
+        """
+        with tracer.span(self.project, PROJECT_CATEGORY):
+            if refresh:
+                self._variables_manager.refresh()
+            variables = self._get_variables()
+            changes = self._variables_manager.set(variables.values())
+        logger.info("Set variables for \"%s\": %s" % (self.project, to_key_values(variables.values(), summarise=True)))
+        return changes
 
     def update_required(self) -> bool:
-        return self._variables_manager.get() != self._get_variables()
+        """
+        Whether the project's build variables need to be updated. If fingerprints are configured and the project's
+        fingerprint is that of its settings, the project's variables are not listed.
+        :return: whether an update is required
+        """
+        if self.apply_config.fingerprint and self.fingerprint_matches():
+            return False
+        return len(self.diff()) > 0
+
+    def fingerprint_matches(self) -> bool:
+        """
+        Whether the fingerprint written when the project's variables were last set is that of the variables that
+        should be set, which is checked by fetching just the variable that holds the fingerprint.
+        :return: whether the fingerprint matches
+        """
+        with tracer.span(self.project, PROJECT_CATEGORY):
+            return self._variables_manager.fingerprint_matches(self._get_variables().values())
+
+    def diff(self, refresh: bool=False) -> VariableChanges:
+        """
+        Works out the changes required to update the project's build variables, without making them.
+        :param refresh: whether to list the project's variables again, rather than use those already listed (e.g. to
+        see changes made by others)
+        :return: the required changes
+        """
+        with tracer.span(self.project, PROJECT_CATEGORY):
+            if refresh:
+                self._variables_manager.refresh()
+            return self._variables_manager.diff(self._get_variables().values())
+
+    def inputs_digest(self) -> str:
+        """
+        Gets a digest of the variables that should be set for this project, which changes if the settings that they
+        are composed from change.
+        :return: the hex digest of the variables
+        """
+        return digest_variables(self._get_variables().values())
 
-    def _get_variables(self) -> Dict[str, str]:
+    def _get_variables(self) -> ComposedVariables:
         """
         Gets the variables that should be set for this project.
-        :return: the variables
+        :return: read-only mapping of the variables, keyed by their identifiers
         """
-        variables = {}  # type: Dict[str, str]
-        for group in self.groups:
-            setting_variables = self._read_group_variables(group)
-            variables.update(setting_variables)
-        return variables
+        with tracer.span("compose", project=self.project):
+            return self._composer.compose(self.groups, self._read_group_variables)
 
 
 class FileBasedProjectVariablesUpdater(ProjectVariablesUpdater):
@@ -62,7 +127,8 @@ class FileBasedProjectVariablesUpdater(ProjectVariablesUpdater):
     def __init__(self, setting_repositories: List[str]=None, default_setting_extensions: List[str]=None, **kwargs):
         """
         Constructor.
-        :param setting_repositories: directories that may contain variable source files (highest preference first)
+        :param setting_repositories: directories or git repositories (given as `git:<git directory>#<ref>`, see
+        `get_settings_repository`) that may contain variable source files (highest preference first)
         :param default_setting_extensions: file extensions that variable source files could have if that given is not
         found(highest preference first, e.g. ["json", "init"])
         :param kwargs: named arguments required for `ProjectVariablesUpdater`
@@ -71,48 +137,68 @@ class FileBasedProjectVariablesUpdater(ProjectVariablesUpdater):
         self.setting_repositories = setting_repositories if setting_repositories is not None else []
         self.default_setting_extensions = default_setting_extensions if default_setting_extensions is not None else []
 
-    def _read_group_variables(self, group: str) -> Dict[str, str]:
-        setting_location = self._resolve_group_location(group)
-        return read_variables(setting_location)
+    def _read_group_variables(self, group: str) -> VariableMap:
+        return read_settings_group(group, self.setting_repositories, self.default_setting_extensions)
 
-    def _resolve_group_location(self, group: str) -> str:
-        """
-        Resolves the location of a setting file based on the given identifier.
-        :param group: the identifier for the group's settings file (~its location)
-        :return: the absolute path of the settings location
-        """
-        if os.path.isabs(group):
-            possible_paths = [group]
-        else:
-            possible_paths = []
-            for repository in self.setting_repositories:
-                possible_paths.append(os.path.join(repository, group))
 
-        for default_setting_extension in self.default_setting_extensions:
-            number_of_paths = len(possible_paths)
-            for i in range(number_of_paths):
-                path_with_extension = "%s.%s" % (possible_paths[i], default_setting_extension)
-                possible_paths.append(path_with_extension)
+def read_settings_group(group: str, setting_repositories: List[str],
+                        default_setting_extensions: List[str]) -> VariableMap:
+    """
+    Reads the variables of the settings group with the given identifier from the file that it resolves to.
+    :param group: the identifier for the group's settings file (~its location)
+    :param setting_repositories: see `FileBasedProjectVariablesUpdater.__init__`
+    :param default_setting_extensions: see `FileBasedProjectVariablesUpdater.__init__`
+    :return: the group's variables, keyed by their identifiers
+    :raises ValueError: if the group's settings file cannot be found or is not valid
+    """
+    with tracer.span("resolve groups", group=group):
+        repository, path = resolve_settings_group(group, setting_repositories, default_setting_extensions)
+    with tracer.span("read files", location=repository.locate(path)):
+        return repository.read(path)
+
+
+def resolve_settings_group(group: str, setting_repositories: List[str],
+                           default_setting_extensions: List[str]) -> Tuple[SettingsRepository, str]:
+    """
+    Resolves the repository and path of a setting file based on the given identifier.
+    :param group: the identifier for the group's settings file (~its location)
+    :param setting_repositories: see `FileBasedProjectVariablesUpdater.__init__`
+    :param default_setting_extensions: see `FileBasedProjectVariablesUpdater.__init__`
+    :return: tuple of the repository containing the settings file and the file's path within it
+    :raises ValueError: if the settings file cannot be found
+    """
+    if os.path.isabs(group):
+        possible_paths = [(_FILE_SYSTEM, group)]
+    else:
+        possible_paths = []
+        for repository in setting_repositories:
+            possible_paths.append((get_settings_repository(repository), group))
+
+    for default_setting_extension in default_setting_extensions:
+        number_of_paths = len(possible_paths)
+        for i in range(number_of_paths):
+            repository, path = possible_paths[i]
+            possible_paths.append((repository, "%s.%s" % (path, default_setting_extension)))
 
-        for path in possible_paths:
-            if os.path.exists(path):
-                return path
-        raise ValueError("Could not resolve location of settings identified by: \"%s\"" % group)
+    for repository, path in possible_paths:
+        if repository.contains(path):
+            return repository, path
+    raise ValueError("Could not resolve location of settings identified by: \"%s\"" % group)
 
 
 class DictBasedProjectVariablesUpdater(ProjectVariablesUpdater):
     """
     Updates variables for a project in GitLab CI based on the values in a Python dictionary object.
     """
-    def __init__(self, settings: Dict[str, Dict[str, str]], **kwargs):
+    def __init__(self, settings: Dict[str, Union[Dict[str, str], Iterable[Variable]]], **kwargs):
         """
         Constructor.
         :param settings: settings dictionary where projects names or identifiers are keys and their values are
-        key-value pairs representing variable names and values
+        key-value pairs representing variable names and values (or variable models)
         :param kwargs: named arguments required for `ProjectVariablesUpdater`
         """
         super().__init__(**kwargs)
         self.settings = settings
 
-    def _read_group_variables(self, group: str) -> Dict[str, str]:
-        return self.settings[group]
+    def _read_group_variables(self, group: str) -> VariableMap:
+        return to_variables(self.settings[group])
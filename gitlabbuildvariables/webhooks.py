@@ -0,0 +1,292 @@
+import hmac
+import json
+import os
+import posixpath
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Condition, Event
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Mapping
+
+from gitlabbuildvariables.repositories import get_settings_repository
+from gitlabbuildvariables.update import logger, FileBasedProjectsVariablesUpdater, ProjectUpdateResult, \
+    FAILED_STATUS, UPDATED_STATUS, resolve_settings_group
+
+PUSH_EVENT = "Push Hook"
+
+_TOKEN_HEADER = "X-Gitlab-Token"
+_EVENT_HEADER = "X-Gitlab-Event"
+_CHANGE_TYPES = ("added", "modified", "removed")
+_POLL_INTERVAL = 1.0
+_MAX_BODY_SIZE = 16 * 1024 * 1024
+
+
+def get_changed_paths(event: Dict[str, Any]) -> Optional[Set[str]]:
+    """
+    Gets the paths of the files that the commits of the given push event added, modified or removed.
+    :param event: the push event, as given by a GitLab webhook
+    :return: the paths, relative to the root of the repository, or `None` if they cannot be known (GitLab only gives
+    the first 20 commits of a large push)
+    """
+    commits = event.get("commits") or []
+    if event.get("total_commits_count", len(commits)) > len(commits):
+        return None
+    paths = set()   # type: Set[str]
+    for commit in commits:
+        for change_type in _CHANGE_TYPES:
+            paths.update(commit.get(change_type) or ())
+    return paths
+
+
+def locate_settings_groups(groups: Iterable[str], setting_repositories: List[str],
+                           default_setting_extensions: List[str]) -> Dict[str, str]:
+    """
+    Gets the paths of the settings files that the given settings groups are read from, within their repositories.
+    :param groups: the settings groups
+    :param setting_repositories: see `FileBasedProjectVariablesUpdater.__init__`
+    :param default_setting_extensions: see `FileBasedProjectVariablesUpdater.__init__`
+    :return: the path of the settings file of each group (groups whose settings files cannot be found are left out)
+    """
+    locations = {}  # type: Dict[str, str]
+    for group in groups:
+        try:
+            _, path = resolve_settings_group(group, setting_repositories, default_setting_extensions)
+        except ValueError:
+            continue
+        locations[group] = path
+    return locations
+
+
+def get_changed_groups(paths: Iterable[str], groups_locations: Mapping[str, str]) -> Set[str]:
+    """
+    Gets the settings groups whose settings files are at any of the given paths. As a settings repository may be a
+    subdirectory of the repository that was pushed to, and a group may be given by an absolute location, a file
+    matches a path if either ends with the other (taking whole path components). This may match more groups than
+    were changed (e.g. "common.json" is matched by a change to "team/common.json"), which only means that more projects
+    are checked than need to be.
+    :param paths: the paths of the changed files, relative to the root of the repository that was pushed to
+    :param groups_locations: the path of the settings file of each group, within its repository (see
+    `locate_settings_groups`)
+    :return: the settings groups
+    """
+    paths = {posixpath.normpath(path) for path in paths}
+    return {group for group, location in groups_locations.items()
+            if any(_is_same_file(posixpath.normpath(location), path) for path in paths)}
+
+
+class WebhookReconciler:
+    """
+    Applies the changes that pushes to the settings repository make, to only the projects that they affect.
+
+    The updater (along with its backend's connection, the projects that it has looked up and the settings that it has
+    read) is kept between pushes, so each push only reads the settings groups that it changed. The settings groups that
+    a push changed are found by resolving the settings file of each group, as the groups are read, both before and after
+    the settings repositories are fetched (so files that were added, and those that were removed, are both seen). All of
+    the projects are updated if the configuration file has changed or if the files that a push changed cannot be known,
+    listing the variables of every project again. Pushes are queued and applied one at a time, with those that arrive
+    while changes are being applied coalesced. The first reconciliation updates all of the projects, to catch up with
+    any pushes that were missed.
+    """
+    def __init__(self, updater: FileBasedProjectsVariablesUpdater, ref: str=None):
+        """
+        Constructor.
+        :param updater: updater of the configured projects
+        :param ref: the only ref to apply pushes to (e.g. "refs/heads/master"; pushes to any ref are applied if `None`)
+        """
+        self.updater = updater
+        self.ref = ref
+        self.reconciliations = 0
+        self.last_reconciled = None     # type: Optional[float]
+        self.last_failed = []   # type: List[str]
+        self._pending = True
+        self._pending_paths = None  # type: Optional[Set[str]]
+        self._config_signature = None   # type: Optional[Tuple[int, int]]
+        self._condition = Condition()
+
+    def submit(self, event: Dict[str, Any]) -> bool:
+        """
+        Queues the changes made by the given push event to be applied.
+        :param event: the push event, as given by a GitLab webhook
+        :return: whether the push was to a ref that is applied
+        """
+        if self.ref is not None and event.get("ref") != self.ref:
+            return False
+        paths = get_changed_paths(event)
+        with self._condition:
+            # Pending paths of `None` mean that all of the projects are to be updated
+            if paths is None:
+                self._pending_paths = None
+            elif self._pending_paths is not None:
+                self._pending_paths |= paths
+            self._pending = True
+            self._condition.notify()
+        return True
+
+    @property
+    def pending(self) -> bool:
+        """
+        Whether there are pushes waiting to be applied.
+        :return: whether there are pending pushes
+        """
+        with self._condition:
+            return self._pending
+
+    def run(self, stop: Event=None):
+        """
+        Applies pushes as they are queued, until stopped.
+        :param stop: event that stops the reconciler when set (runs forever if `None`)
+        """
+        while stop is None or not stop.is_set():
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending, timeout=_POLL_INTERVAL)
+            self.reconcile_pending()
+
+    def reconcile_pending(self) -> bool:
+        """
+        Applies the pushes that are waiting to be applied, if there are any. A reconciliation that fails as a whole
+        (e.g. because the settings are not valid) is logged and tried again along with the next push.
+        :return: whether there were pushes to apply
+        """
+        with self._condition:
+            if not self._pending:
+                return False
+            paths = self._pending_paths
+            self._pending = False
+            self._pending_paths = set()
+        try:
+            self.reconcile(paths)
+        except Exception as e:
+            logger.error("Failed to apply changes to settings: %s" % e)
+            with self._condition:
+                self._pending_paths = None if paths is None or self._pending_paths is None \
+                    else self._pending_paths | paths
+        return True
+
+    def reconcile(self, paths: Optional[Set[str]]) -> List[ProjectUpdateResult]:
+        """
+        Applies the changes to the files at the given paths, fetching the settings repositories first.
+        :param paths: the paths of the changed files, relative to the root of the settings repository (all of the
+        projects are updated if `None`)
+        :return: the result of updating each affected project
+        :raises PrecheckError: if any of the affected settings groups cannot be read or composed
+        """
+        started = time.monotonic()
+        config_signature = _get_signature(self.updater.config_location)
+        full = paths is None or config_signature != self._config_signature
+        previous_locations = {} if full else self._locate_groups()
+        for setting_repository in self.updater.project_variables_updater_builder.setting_repositories:
+            get_settings_repository(setting_repository).fetch()
+        try:
+            if full:
+                self.updater.refresh()
+                results = list(self.updater.update_projects())
+            else:
+                groups = get_changed_groups(paths, previous_locations) | get_changed_groups(
+                    paths, self._locate_groups())
+                results = list(self.updater.update_groups(groups))
+        finally:
+            self.updater.backend.flush()
+        self._config_signature = config_signature
+        self.reconciliations += 1
+        self.last_reconciled = time.time()
+        self.last_failed = [result.project for result in results if result.status == FAILED_STATUS]
+        logger.info("Applied changes to %s in %.1fs: %d project(s) affected, %d updated, %d failed" % (
+            "all settings" if paths is None else "%d file(s)" % len(paths), time.monotonic() - started, len(results),
+            sum(result.status == UPDATED_STATUS for result in results), len(self.last_failed)))
+        return results
+
+    def _locate_groups(self) -> Dict[str, str]:
+        """
+        Gets the paths of the settings files of the settings groups that the configured projects are set from.
+        :return: the path of the settings file of each group, within its repository (see `locate_settings_groups`)
+        """
+        builder = self.updater.project_variables_updater_builder
+        return locate_settings_groups(self.updater.get_settings_groups(), builder.setting_repositories,
+                                      builder.default_setting_extensions)
+
+
+class WebhookServer(ThreadingMixIn, HTTPServer):
+    """
+    Receives push events from GitLab webhooks (authenticated by their secret token) and queues them with a reconciler.
+    Requests are answered as soon as the events are queued, so GitLab is not kept waiting while changes are applied.
+    A GET request gives the status of the reconciler (e.g. for health checks), which only gives counts of projects, so
+    that it does not disclose their names.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], reconciler: WebhookReconciler, token: str):
+        """
+        Constructor.
+        :param address: tuple of the host and port to listen on (any free port if 0)
+        :param reconciler: reconciler to queue push events with
+        :param token: the secret token that webhooks must give
+        """
+        super().__init__(address, _WebhookRequestHandler)
+        self.reconciler = reconciler
+        self.token = token
+
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles requests to `WebhookServer`.
+    """
+    server = None   # type: WebhookServer
+
+    def log_message(self, format: str, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def do_GET(self):
+        reconciler = self.server.reconciler
+        self._respond(200, {"pending": reconciler.pending, "reconciliations": reconciler.reconciliations,
+                            "last_reconciled": reconciler.last_reconciled, "last_failed": len(reconciler.last_failed)})
+
+    def do_POST(self):
+        # The token is checked, and the size of the body limited, before the body is read
+        if not hmac.compare_digest(self.headers.get(_TOKEN_HEADER, "").encode(), self.server.token.encode()):
+            return self._respond(401, {"message": "Invalid token"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            return self._respond(400, {"message": "Invalid Content-Length"})
+        if length < 0 or length > _MAX_BODY_SIZE:
+            return self._respond(413, {"message": "Body must be at most %d bytes" % _MAX_BODY_SIZE})
+        body = self.rfile.read(length)
+        if self.headers.get(_EVENT_HEADER) != PUSH_EVENT:
+            return self._respond(202, {"accepted": False})
+        try:
+            event = json.loads(body.decode())
+        except ValueError:
+            return self._respond(400, {"message": "Invalid JSON"})
+        if not isinstance(event, dict):
+            return self._respond(400, {"message": "Expected a JSON object"})
+        self._respond(202, {"accepted": self.server.reconciler.submit(event)})
+
+    def _respond(self, status: int, body: Dict[str, Any]):
+        contents = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(contents)))
+        self.end_headers()
+        self.wfile.write(contents)
+
+
+def _is_same_file(location: str, path: str) -> bool:
+    """
+    Gets whether the given location of a settings file, within its repository, and the given path of a changed file
+    could be of the same file (see `get_changed_groups`).
+    :param location: the normalised location of the settings file
+    :param path: the normalised path of the changed file
+    :return: whether they could be the same file
+    """
+    return location == path or location.endswith(posixpath.sep + path) or path.endswith(posixpath.sep + location)
+
+
+def _get_signature(location: str) -> Tuple[int, int]:
+    """
+    Gets a signature of the file at the given location that changes when the file does.
+    :param location: the location of the file
+    :return: the signature
+    """
+    stat = os.stat(location)
+    return stat.st_mtime_ns, stat.st_size
@@ -13,7 +13,7 @@ setup(
     author="Colin Nolan",
     author_email="colin.nolan@sanger.ac.uk",
     version="1.1.0",
-    packages=find_packages(exclude=["tests"]),
+    packages=find_packages(exclude=["tests", "benchmarks"]),
     install_requires=open("requirements.txt", "r").readlines(),
     url="https://github.com/wtsi-hgi/gitlab-build-variables",
     license="GPL3",
@@ -23,7 +23,9 @@ setup(
         "console_scripts": [
             "gitlab-set-variables=gitlabbuildvariables.executables.gitlab_set_variables:main",
             "gitlab-get-variables=gitlabbuildvariables.executables.gitlab_get_variables:main",
-            "gitlab-update-variables=gitlabbuildvariables.executables.gitlab_update_variables:main"
+            "gitlab-update-variables=gitlabbuildvariables.executables.gitlab_update_variables:main",
+            "gitlab-merge-update-results=gitlabbuildvariables.executables.gitlab_merge_update_results:main",
+            "gitlab-search-variables=gitlabbuildvariables.executables.gitlab_search_variables:main"
         ]
     },
     classifiers=[